@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import logging
+import multiprocessing
+import traceback
+
+try:
+    from PySide2.QtCore import QObject, QTimer, Signal
+except Exception as e:
+    from PyQt4.QtCore import QObject, QTimer, pyqtSignal as Signal
+
+
+def _run_layout(layout_function, graph, parameters):
+    """
+    Body of a layout job in the pool process. Exceptions are returned as text, as not all of them pickle.
+    """
+    try:
+        return True, layout_function(graph, **parameters)
+    except Exception:
+        return False, traceback.format_exc()
+
+
+class QLayoutJobRunner(QObject):
+    """
+    Runs networkx style layout functions in a process pool without blocking the GUI thread.
+
+    Only one job is active at a time: submitting a new one cancels the previous one. A running job can't
+    be interrupted inside a pool, so cancelling it terminates the pool, which is started again with the
+    next job. The results are polled from the GUI thread every poll_interval milliseconds and delivered
+    with job_finished, together with the id returned by submit and the user data given to it (for
+    example the graph version the positions were computed for).
+
+    The layout function and the graph must be picklable, so the function has to be defined at module
+    level and the graph must not hold graphic items.
+
+    Parameters
+    ----------
+    workers : int
+        Number of processes of the pool.
+    poll_interval : int
+        Milliseconds between two checks of the running job.
+    """
+    job_started = Signal(int, str)
+    job_finished = Signal(int, object, object)
+    job_failed = Signal(int, str)
+    job_cancelled = Signal(int)
+    busy_changed = Signal(bool)
+
+    def __init__(self, parent=None, workers=1, poll_interval=50):
+        super(QLayoutJobRunner, self).__init__(parent)
+        self._logger = logging.getLogger("QNetworkxGraph.QLayoutJobRunner")
+        self._logger.setLevel(logging.CRITICAL)
+        self.workers = workers
+        self.pool = None
+        self._job_id = 0
+        self._job = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(poll_interval)
+        self._timer.timeout.connect(self._poll)
+
+    def is_busy(self):
+        return self._job is not None
+
+    def submit(self, layout_function, graph, name=None, user_data=None, **parameters):
+        """
+        Start computing layout_function(graph, **parameters), cancelling the current job if any.
+
+        Returns
+        -------
+        int
+            Id of the job, sent back with job_finished, job_failed or job_cancelled.
+        """
+        self.cancel()
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers)
+        self._job_id += 1
+        if name is None:
+            name = layout_function.__name__
+        result = self.pool.apply_async(_run_layout, (layout_function, graph, parameters))
+        self._job = (self._job_id, result, user_data)
+        self._logger.debug("Started layout job %d: %s" % (self._job_id, name))
+        self.job_started.emit(self._job_id, name)
+        self.busy_changed.emit(True)
+        self._timer.start()
+        return self._job_id
+
+    def cancel(self):
+        """
+        Cancel the current job. The pool is terminated if the job was still running.
+        """
+        if self._job is None:
+            return
+        job_id, result, user_data = self._job
+        self._job = None
+        self._timer.stop()
+        if not result.ready():
+            self.close()
+        self._logger.debug("Cancelled layout job %d" % job_id)
+        self.job_cancelled.emit(job_id)
+        self.busy_changed.emit(False)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def _poll(self):
+        if self._job is None or not self._job[1].ready():
+            return
+        job_id, result, user_data = self._job
+        self._job = None
+        self._timer.stop()
+        self.busy_changed.emit(False)
+        try:
+            succeeded, value = result.get()
+        except Exception as e:
+            succeeded, value = False, str(e)
+        if succeeded:
+            self.job_finished.emit(job_id, value, user_data)
+        else:
+            self._logger.error("Layout job %d failed: %s" % (job_id, value))
+            self.job_failed.emit(job_id, value)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from QNetworkxBenchmarks import SCENARIO_METRICS
+
+IMPROVED = "improved"
+REGRESSED = "REGRESSED"
+UNCHANGED = "ok"
+MISSING = "missing"
+
+
+def median_iqr(samples):
+    """
+    Median and interquartile range of the samples.
+    """
+    samples = np.asarray(samples, dtype=float)
+    if not len(samples):
+        return float("nan"), float("nan")
+    first, median, third = np.percentile(samples, [25, 50, 75])
+    return float(median), float(third - first)
+
+
+def compare_metric(baseline_samples, current_samples, tolerance=0.1, iqr_factor=1.0, min_difference=0.5):
+    """
+    Compare the samples of a metric of two runs.
+
+    The metric regressed if its median got more than tolerance (relative) slower, and the difference
+    of the medians is also bigger than iqr_factor times the widest of both interquartile ranges and
+    than min_difference milliseconds. The last two conditions keep the noise of short or unstable
+    metrics from being reported. It improved under the same conditions the other way round.
+
+    Returns
+    -------
+    dict
+        baseline and current (median, iqr), change (relative change of the median) and status, one of
+        IMPROVED, REGRESSED or UNCHANGED.
+    """
+    baseline_median, baseline_iqr = median_iqr(baseline_samples)
+    current_median, current_iqr = median_iqr(current_samples)
+    difference = current_median - baseline_median
+    change = difference / baseline_median if baseline_median > 0 else 0.0
+    significant = abs(difference) > max(iqr_factor * max(baseline_iqr, current_iqr), min_difference)
+    status = UNCHANGED
+    if significant and change > tolerance:
+        status = REGRESSED
+    elif significant and change < -tolerance:
+        status = IMPROVED
+    return {
+        "baseline": (baseline_median, baseline_iqr),
+        "current": (current_median, current_iqr),
+        "change": change,
+        "status": status,
+    }
+
+
+def compare_runs(baseline, current, tolerance=0.1, iqr_factor=1.0, min_difference=0.5, metric_tolerances=None):
+    """
+    Compare every metric of every scenario of two runs of QNetworkxBenchmarks.
+
+    Parameters
+    ----------
+    baseline, current : dict
+        Results of run_suite (or their JSON files loaded).
+    tolerance : float
+        Relative slowdown allowed, 0.1 is 10%.
+    metric_tolerances : dict
+        Tolerance of some metrics instead of tolerance, keyed by metric name.
+
+    Returns
+    -------
+    dict
+        The comparison (see compare_metric) of every metric keyed by scenario and metric. Scenarios
+        and metrics of the baseline missing in the current run have the MISSING status.
+    """
+    metric_tolerances = metric_tolerances or {}
+    comparison = {}
+    for scenario_name, scenario in sorted(baseline["scenarios"].items()):
+        current_scenario = current["scenarios"].get(scenario_name)
+        metrics = {}
+        for metric, samples in sorted(scenario["metrics"].items()):
+            if current_scenario is None or metric not in current_scenario["metrics"]:
+                metrics[metric] = {"baseline": median_iqr(samples), "current": None, "change": None,
+                                   "status": MISSING}
+                continue
+            metrics[metric] = compare_metric(samples, current_scenario["metrics"][metric],
+                                             metric_tolerances.get(metric, tolerance), iqr_factor, min_difference)
+        comparison[scenario_name] = metrics
+    return comparison
+
+
+def regressions(comparison):
+    """
+    (scenario, metric) pairs that regressed.
+    """
+    return [(scenario_name, metric) for scenario_name, metrics in sorted(comparison.items())
+            for metric, result in sorted(metrics.items()) if result["status"] == REGRESSED]
+
+
+def _metric_order(metric):
+    if metric in SCENARIO_METRICS:
+        return SCENARIO_METRICS.index(metric), metric
+    return len(SCENARIO_METRICS), metric
+
+
+def format_report(comparison, baseline=None, current=None):
+    """
+    Readable report of a comparison, a table of the metrics of every scenario.
+    """
+    lines = []
+    if baseline is not None and current is not None:
+        baseline_environment = baseline.get("environment", {})
+        current_environment = current.get("environment", {})
+        for name in sorted(set(baseline_environment) | set(current_environment)):
+            if baseline_environment.get(name) != current_environment.get(name):
+                lines.append("Warning: %s differs, %s in the baseline and %s now" % (
+                    name, baseline_environment.get(name), current_environment.get(name)))
+    for scenario_name, metrics in sorted(comparison.items()):
+        lines.append("")
+        lines.append(scenario_name)
+        lines.append("  %-18s %20s %20s %9s  %s" % ("metric (ms)", "baseline (iqr)", "current (iqr)", "change",
+                                                   "status"))
+        for metric in sorted(metrics, key=_metric_order):
+            result = metrics[metric]
+            baseline_text = "%.2f (%.2f)" % result["baseline"]
+            if result["current"] is None:
+                current_text, change_text = "-", "-"
+            else:
+                current_text = "%.2f (%.2f)" % result["current"]
+                change_text = "%+.1f%%" % (result["change"] * 100)
+            lines.append("  %-18s %20s %20s %9s  %s" % (metric, baseline_text, current_text, change_text,
+                                                       result["status"]))
+    regressed = regressions(comparison)
+    lines.append("")
+    if regressed:
+        lines.append("%d regressions: %s" % (len(regressed), ", ".join("%s %s" % pair for pair in regressed)))
+    else:
+        lines.append("No regressions")
+    return "\n".join(lines)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Compare a run of QNetworkxBenchmarks with a baseline run and "
+                                                 "fail if any metric got slower")
+    parser.add_argument("baseline", help="JSON file of the baseline run")
+    parser.add_argument("current", help="JSON file of the run to check")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative slowdown allowed (0.1 is 10%%)")
+    parser.add_argument("--metric-tolerance", nargs=2, action="append", metavar=("METRIC", "TOLERANCE"),
+                        default=[], help="Tolerance of one metric, like tick_ms 0.25")
+    parser.add_argument("--iqr-factor", type=float, default=1.0,
+                        help="A change must be bigger than this times the interquartile range")
+    parser.add_argument("--min-difference", type=float, default=0.5,
+                        help="A change must be bigger than these milliseconds")
+    args = parser.parse_args(arguments)
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.current) as current_file:
+        current = json.load(current_file)
+    metric_tolerances = dict((metric, float(tolerance)) for metric, tolerance in args.metric_tolerance)
+    comparison = compare_runs(baseline, current, args.tolerance, args.iqr_factor, args.min_difference,
+                              metric_tolerances)
+    print format_report(comparison, baseline, current)
+    return 1 if regressions(comparison) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+
+try:
+    from PySide2.QtCore import QRectF, Qt, qVersion
+    from PySide2.QtGui import QImage, QPainter, QPainterPath
+    BINDING = "PySide2"
+except Exception as e:
+    from PyQt4.QtCore import QRectF, Qt, qVersion
+    from PyQt4.QtGui import QImage, QPainter, QPainterPath
+    BINDING = "PyQt4"
+
+from QNetworkxGraph import QNetworkxController, QNetworkxWidget
+from QNetworkxRender import ensure_application
+
+SCENARIO_METRICS = ("set_graph_ms", "tick_ms", "paint_ms", "set_node_size_ms", "rubber_band_ms", "delete_graph_ms")
+
+
+def complete_graph(size, seed):
+    return nx.complete_graph(size)
+
+
+def grid_graph(size, seed):
+    side = max(1, int(round(math.sqrt(size))))
+    return nx.convert_node_labels_to_integers(nx.grid_2d_graph(side, side))
+
+
+def barabasi_albert_graph(size, seed):
+    return nx.barabasi_albert_graph(size, 2, seed=seed)
+
+
+def random_geometric_graph(size, seed):
+    # Radius giving about 6 neighbours per node
+    radius = math.sqrt(6.0 / (math.pi * size))
+    points = np.random.RandomState(seed).uniform(0, 1, (size, 2))
+    graph = nx.random_geometric_graph(size, radius, pos=dict(enumerate(points.tolist())))
+    for node, data in graph.nodes(data=True):
+        data.pop('pos', None)
+    return graph
+
+
+# Graph generators and the sizes (number of nodes) they are measured at. The complete graphs have
+# size * (size - 1) / 2 edges, so they are kept small.
+GENERATORS = {
+    "complete": (complete_graph, (10, 30, 60)),
+    "grid": (grid_graph, (100, 400, 1600)),
+    "barabasi_albert": (barabasi_albert_graph, (100, 500, 2000)),
+    "random_geometric": (random_geometric_graph, (100, 500, 2000)),
+}
+
+
+def environment():
+    """
+    Versions of the libraries the benchmarks ran with, so runs on different setups aren't compared by
+    mistake.
+    """
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "binding": BINDING,
+        "qt": qVersion(),
+        "networkx": nx.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def _milliseconds(function, *args):
+    start = time.time()
+    function(*args)
+    return (time.time() - start) * 1000
+
+
+def _circular_positions(graph):
+    # Fixed positions, so set_graph doesn't include the time of a layout algorithm
+    nodes = sorted(graph.nodes())
+    step = 2 * math.pi / max(1, len(nodes))
+    return dict((node, (math.cos(index * step), math.sin(index * step))) for index, node in enumerate(nodes))
+
+
+def measure_graph(graph, ticks=10, paints=3):
+    """
+    Times of one run of every operation of the scenario on a new widget.
+
+    Returns
+    -------
+    dict
+        Milliseconds keyed by metric (see SCENARIO_METRICS). tick_ms and paint_ms are the mean of ticks
+        force ticks and paints full scene paints.
+    """
+    application = ensure_application()
+    widget = QNetworkxWidget(directed=graph.is_directed())
+    side = 150.0 * max(1.0, math.sqrt(graph.number_of_nodes()))
+    widget.scene.setSceneRect(-side / 2, -side / 2, side, side)
+    widget.resize(800, 800)
+    controller = QNetworkxController(widget)
+    positions = _circular_positions(graph)
+    results = {}
+
+    results["set_graph_ms"] = _milliseconds(controller.set_graph, graph, positions)
+    widget.show()
+    application.processEvents()
+
+    # The ticks are run here instead of by the animation timer
+    widget.animate_nodes(True)
+    if widget.timer_id:
+        widget.killTimer(widget.timer_id)
+        widget.timer_id = 0
+    elapsed = 0.0
+    for tick in range(ticks):
+        start = time.time()
+        widget.update_layout_engine()
+        # Keep every node moving, so each tick costs as much as the first one
+        widget.layout_engine.reheat()
+        moved_rows = widget.layout_engine.step(widget.scene_bounds())
+        if len(moved_rows):
+            widget.apply_layout_positions(moved_rows)
+        elapsed += time.time() - start
+    results["tick_ms"] = elapsed * 1000 / max(1, ticks)
+    widget.animate_nodes(False)
+
+    scene_rect = widget.scene.sceneRect()
+    image = QImage(800, 800, QImage.Format_ARGB32)
+    elapsed = 0.0
+    for paint in range(paints):
+        image.fill(0)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        start = time.time()
+        widget.scene.render(painter, QRectF(0, 0, 800, 800), scene_rect)
+        elapsed += time.time() - start
+        painter.end()
+    results["paint_ms"] = elapsed * 1000 / max(1, paints)
+
+    results["set_node_size_ms"] = _milliseconds(widget.set_node_size, 30)
+
+    selection_area = QPainterPath()
+    selection_area.addRect(scene_rect)
+    results["rubber_band_ms"] = _milliseconds(widget.scene.setSelectionArea, selection_area,
+                                              Qt.IntersectsItemShape)
+    widget.scene.clearSelection()
+
+    results["delete_graph_ms"] = _milliseconds(controller.delete_graph)
+    widget.close()
+    widget.deleteLater()
+    application.processEvents()
+    return results
+
+
+def run_suite(generators=None, sizes=None, repeat=5, ticks=10, paints=3, seed=0, progress=None):
+    """
+    Run every scenario (a generator at a size) repeat times.
+
+    Parameters
+    ----------
+    generators : list
+        Names of the GENERATORS to run, all of them if None.
+    sizes : list
+        Sizes to run every generator at instead of their default ones.
+    repeat : int
+        Runs of every scenario, each one on a new widget.
+    progress : file
+        Where the name of every scenario is written before it runs, if given.
+
+    Returns
+    -------
+    dict
+        The environment, the settings of the run and the scenarios keyed by "<generator>-<size>". Every
+        scenario has the generator, the size, the numbers of nodes and edges and the list of the repeat
+        samples of every metric in "metrics".
+    """
+    if generators is None:
+        generators = sorted(GENERATORS)
+    scenarios = {}
+    for name in generators:
+        if name not in GENERATORS:
+            raise Exception("Unknown graph generator %s, use one of %s" % (name, ", ".join(sorted(GENERATORS))))
+        generator, default_sizes = GENERATORS[name]
+        for size in (sizes or default_sizes):
+            graph = generator(size, seed)
+            scenario_name = "%s-%d" % (name, size)
+            if progress is not None:
+                progress.write("%s (%d nodes, %d edges)\n" % (scenario_name, graph.number_of_nodes(),
+                                                              graph.number_of_edges()))
+            metrics = dict((metric, []) for metric in SCENARIO_METRICS)
+            for run in range(repeat):
+                for metric, value in measure_graph(graph, ticks, paints).items():
+                    metrics[metric].append(value)
+            scenarios[scenario_name] = {
+                "generator": name,
+                "size": size,
+                "nodes": graph.number_of_nodes(),
+                "edges": graph.number_of_edges(),
+                "metrics": metrics,
+            }
+    return {
+        "environment": environment(),
+        "settings": {"repeat": repeat, "ticks": ticks, "paints": paints, "seed": seed},
+        "scenarios": scenarios,
+    }
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Time the graph widget on generated graphs, without display, "
+                                                 "and write the results as JSON")
+    parser.add_argument("--graphs", nargs='+', choices=sorted(GENERATORS), help="Generators to run, all by default")
+    parser.add_argument("--sizes", type=int, nargs='+', help="Sizes instead of the defaults of every generator")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--paints", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", help="JSON file, the standard output if missing")
+    args = parser.parse_args(arguments)
+
+    ensure_application()
+    results = run_suite(args.graphs, args.sizes, args.repeat, args.ticks, args.paints, args.seed,
+                        progress=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from PySide2.QtCore import QLineF, QRectF, Qt
+    from PySide2.QtGui import QBrush, QPainterPath, QPen
+    from PySide2.QtWidgets import QGraphicsItem, QMenu, QStyleOptionGraphicsItem
+except Exception as e:
+    from PyQt4.QtCore import QLineF, QRectF, Qt
+    from PyQt4.QtGui import QBrush, QGraphicsItem, QMenu, QPainterPath, QPen, QStyleOptionGraphicsItem
+
+
+class QEdgeLayerItem(QGraphicsItem):
+    """
+    Single graphics item that draws all the straight edges of a QNetworkxWidget.
+
+    The edges are kept as rows of numpy arrays (source node, destination node) instead of one
+    QEdgeGraphicItem each. The endpoints of all the edges are computed at once from the node positions
+    when the layer is painted after a change, all the visible lines are drawn with one drawLines call and
+    all the arrowheads with one path. Edge labels are not drawn by the layer.
+
+    The item covers the whole scene rect and has an empty shape, so it never hides the nodes from the
+    mouse. Edges are found under a point with edge_at, which looks them up in a uniform grid of the
+    scene. The context menu of the edges is shared by all of them: current_edge holds the key of the
+    edge it was opened for.
+
+    Parameters
+    ----------
+    graph_widget : QNetworkxWidget
+    edge_config : EdgeConfig
+        Style of the lines and the arrowheads.
+    """
+    Type = QGraphicsItem.UserType + 3
+
+    def __init__(self, graph_widget, edge_config):
+        super(QEdgeLayerItem, self).__init__()
+        self._logger = logging.getLogger("QNetworkxGraph.QEdgeLayerItem")
+        self._logger.setLevel(logging.CRITICAL)
+        self.graph = graph_widget
+        self.edge_config = edge_config
+        self.arrowSize = 10.0
+        self.is_directed = graph_widget.is_directed
+        self.menu = QMenu()
+        self.current_edge = None
+        # key -> (source node item, destination node item)
+        self._edges = OrderedDict()
+        self._keys = []
+        self._nodes = []
+        self._sources = np.zeros(0, dtype=np.intp)
+        self._dests = np.zeros(0, dtype=np.intp)
+        self._lines = np.zeros((0, 4))
+        self._grid = None
+        self._structure_dirty = False
+        self._geometry_dirty = False
+
+        self.setAcceptedMouseButtons(Qt.NoButton)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.setZValue(9)
+
+    def __len__(self):
+        return len(self._edges)
+
+    def __contains__(self, key):
+        return key in self._edges
+
+    def type(self):
+        return QEdgeLayerItem.Type
+
+    def add_edge(self, key, source, dest):
+        self._edges[key] = (source, dest)
+        self._invalidate_structure()
+
+    def remove_edge(self, key):
+        if self._edges.pop(key, None) is not None:
+            self._invalidate_structure()
+
+    def remove_node_edges(self, node):
+        """
+        Remove all the edges of a node item.
+        """
+        keys = [key for key, (source, dest) in self._edges.items() if source is node or dest is node]
+        for key in keys:
+            del self._edges[key]
+        if keys:
+            self._invalidate_structure()
+
+    def clear(self):
+        self._edges.clear()
+        self._invalidate_structure()
+
+    def edges(self):
+        """
+        List of (key, source node item, destination node item) of the edges in the layer.
+        """
+        return [(key, source, dest) for key, (source, dest) in self._edges.items()]
+
+    def add_context_menu(self, options):
+        """
+        Add context menus actions to all the edges of the layer.
+
+        Parameters
+        ----------
+        options : dict
+            Dict with the text of the option as key and the name of the method to call if activated.
+            The values of the dict are tuples like (object, method).
+        """
+        for option_string, callback in options.items():
+            instance, method = callback
+            action = self.menu.addAction(option_string)
+            action.triggered.connect(getattr(instance, method))
+
+    def exec_context_menu(self, scene_pos, screen_pos):
+        """
+        Show the edges menu if there is an edge at scene_pos. Returns if the menu was shown.
+        """
+        key = self.edge_at(scene_pos)
+        if key is None or self.menu.isEmpty():
+            return False
+        self.current_edge = key
+        self.menu.exec_(screen_pos)
+        return True
+
+    def invalidate_geometry(self):
+        """
+        Must be called when nodes move or change their size. The endpoints are recomputed on next paint.
+        """
+        self._geometry_dirty = True
+        self._grid = None
+        self.update()
+
+    def _invalidate_structure(self):
+        self._structure_dirty = True
+        self.invalidate_geometry()
+
+    def _update_structure(self):
+        self._keys = list(self._edges.keys())
+        self._nodes = []
+        node_rows = {}
+        sources = []
+        dests = []
+        for source, dest in self._edges.values():
+            for node, rows in ((source, sources), (dest, dests)):
+                row = node_rows.get(node)
+                if row is None:
+                    row = node_rows[node] = len(self._nodes)
+                    self._nodes.append(node)
+                rows.append(row)
+        self._sources = np.array(sources, dtype=np.intp)
+        self._dests = np.array(dests, dtype=np.intp)
+        self._structure_dirty = False
+
+    def _update_geometry(self):
+        """
+        Endpoints of every edge, trimmed by the radius of its nodes as QEdgeGraphicItem.adjust does.
+        """
+        if self._structure_dirty:
+            self._update_structure()
+        count = len(self._nodes)
+        positions = np.zeros((count, 2))
+        radius = np.zeros(count)
+        for row, node in enumerate(self._nodes):
+            position = node.pos()
+            positions[row] = (position.x(), position.y())
+            radius[row] = node.boundingRect().width() / 2
+        start = positions[self._sources]
+        end = positions[self._dests]
+        delta = end - start
+        length = np.sqrt((delta * delta).sum(axis=1))
+        source_radius = radius[self._sources]
+        dest_radius = radius[self._dests]
+        separated = length > source_radius + dest_radius + 6
+        safe_length = np.where(separated, length, 1.0)
+        offset = np.column_stack((delta[:, 0] * source_radius / safe_length,
+                                  delta[:, 1] * dest_radius / safe_length))
+        # Overlapping nodes get a zero length line, which is not drawn
+        self._lines = np.where(separated[:, np.newaxis],
+                               np.hstack((start + offset, end - offset)),
+                               np.hstack((start, start)))
+        self._geometry_dirty = False
+
+    def boundingRect(self):
+        if self.scene() is None:
+            return QRectF()
+        return self.scene().sceneRect()
+
+    def scene_rect_changed(self, rect):
+        self.prepareGeometryChange()
+
+    def shape(self):
+        return QPainterPath()
+
+    def paint(self, painter, option, widget):
+        if self._geometry_dirty:
+            self._update_geometry()
+        if not len(self._lines):
+            return
+        exposed = option.exposedRect
+        lines = self._lines
+        visible = (np.minimum(lines[:, 0], lines[:, 2]) <= exposed.right()) & \
+                  (np.maximum(lines[:, 0], lines[:, 2]) >= exposed.left()) & \
+                  (np.minimum(lines[:, 1], lines[:, 3]) <= exposed.bottom()) & \
+                  (np.maximum(lines[:, 1], lines[:, 3]) >= exposed.top()) & \
+                  ((lines[:, 0] != lines[:, 2]) | (lines[:, 1] != lines[:, 3]))
+        lines = lines[visible]
+        if not len(lines):
+            return
+
+        level_of_detail = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        hairline = level_of_detail < self.graph.lod_hairline_threshold
+        colors = self.edge_config.EdgeColors.Default
+        painter.setPen(QPen(colors.LineColor, 0 if hairline else 1, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
+        painter.drawLines([QLineF(x1, y1, x2, y2) for x1, y1, x2, y2 in lines.tolist()])
+        if hairline:
+            return
+
+        painter.setPen(QPen(colors.ArrowEdgeColor))
+        painter.setBrush(QBrush(colors.ArrowFillColor))
+        painter.drawPath(self._arrows_path(lines))
+
+    def _arrows_path(self, lines):
+        """
+        Path with the arrowheads of lines, same geometry as QEdgeGraphicItem.paint_arrow.
+        """
+        delta = lines[:, 2:] - lines[:, :2]
+        length = np.sqrt((delta * delta).sum(axis=1))
+        angle = np.arccos(np.clip(delta[:, 0] / length, -1, 1))
+        angle = np.where(delta[:, 1] >= 0, 2 * np.pi - angle, angle)
+        tips = [(lines[:, 2:], angle - np.pi / 3, angle - np.pi + np.pi / 3)]
+        if not self.is_directed:
+            tips.append((lines[:, :2], angle + np.pi / 3, angle + np.pi - np.pi / 3))
+        path = QPainterPath()
+        for tip, first_angle, second_angle in tips:
+            first = tip + np.column_stack((np.sin(first_angle), np.cos(first_angle))) * self.arrowSize
+            second = tip + np.column_stack((np.sin(second_angle), np.cos(second_angle))) * self.arrowSize
+            for (x, y), (x1, y1), (x2, y2) in zip(tip.tolist(), first.tolist(), second.tolist()):
+                path.moveTo(x, y)
+                path.lineTo(x1, y1)
+                path.lineTo(x2, y2)
+                path.closeSubpath()
+        return path
+
+    def _build_grid(self):
+        """
+        Uniform grid of the scene: every edge is registered in the cells crossed by its line.
+        """
+        lines = self._lines
+        delta = lines[:, 2:] - lines[:, :2]
+        length = np.sqrt((delta * delta).sum(axis=1))
+        cell = max(float(np.median(length)) if len(length) else 1.0, 1.0)
+        samples = (np.ceil(length / cell) + 1).astype(np.intp)
+        rows = np.repeat(np.arange(len(lines)), samples)
+        steps = np.arange(len(rows)) - np.repeat(np.cumsum(samples) - samples, samples)
+        fraction = steps / np.maximum(samples - 1, 1).astype(float)[rows]
+        points = lines[rows, :2] + delta[rows] * fraction[:, np.newaxis]
+        cells = np.floor(points / cell).astype(np.int64)
+        keys = np.unique(np.column_stack((self._cell_key(cells), rows)), axis=0)
+        self._grid = (cell, keys[:, 0].copy(), keys[:, 1].copy())
+
+    @staticmethod
+    def _cell_key(cells):
+        return cells[:, 0] * 2000003 + cells[:, 1]
+
+    def edge_at(self, scene_pos, tolerance=3.0):
+        """
+        Key of the edge closest to scene_pos, if its line is less than tolerance pixels away.
+        """
+        if self._geometry_dirty:
+            self._update_geometry()
+        if not len(self._lines):
+            return None
+        if self._grid is None:
+            self._build_grid()
+        cell, cell_keys, cell_rows = self._grid
+        point = np.array([scene_pos.x(), scene_pos.y()])
+        center = np.floor(point / cell).astype(np.int64)
+        # Cells sampled along the lines can miss the corner of a neighbour cell, so the 3x3 block is searched
+        around = center + np.array([(x, y) for x in (-1, 0, 1) for y in (-1, 0, 1)])
+        candidates = []
+        for key in self._cell_key(around):
+            start, stop = np.searchsorted(cell_keys, [key, key + 1])
+            candidates.append(cell_rows[start:stop])
+        candidates = np.unique(np.concatenate(candidates))
+        if not len(candidates):
+            return None
+
+        lines = self._lines[candidates]
+        start = lines[:, :2]
+        delta = lines[:, 2:] - start
+        squared = np.maximum((delta * delta).sum(axis=1), 1e-12)
+        fraction = np.clip(((point - start) * delta).sum(axis=1) / squared, 0, 1)
+        closest = start + delta * fraction[:, np.newaxis]
+        distance = np.sqrt(((closest - point) ** 2).sum(axis=1))
+        best = np.argmin(distance)
+        if distance[best] > tolerance:
+            return None
+        return self._keys[candidates[best]]
@@ -27,35 +27,52 @@
 
 import logging
 import math
+import time
+from collections import OrderedDict
 from random import uniform
 
 import networkx as nx
 import networkx.drawing.layout as ly
+import numpy as np
 
 
 
-from enum import Enum
 from scipy.interpolate import interp1d
 try:
-    from PySide2.QtCore import QPointF, Qt, QLineF, QRectF, QSizeF, qAbs, qsrand, QTime, Signal
+    from PySide2.QtCore import QPointF, Qt, QLineF, QRectF, QSizeF, qAbs, qsrand, QTime, QTimer, Signal
     from PySide2.QtGui import QPen, QBrush, QPolygonF, QPainterPath, QTransform, QPainterPathStroker, QRadialGradient, \
     QFont, QFontMetrics, QColor, QPainter, QLinearGradient, QMouseEvent
     from PySide2.QtWidgets import QGraphicsItem, QGraphicsTextItem, QMenu, QAction, QStyle, QGraphicsView, \
         QGraphicsScene, \
         QInputDialog, QLineEdit, QMainWindow, QVBoxLayout, QWidget, QHBoxLayout, QSlider, QCheckBox, QComboBox, \
-        QApplication
+        QApplication, QProgressBar, QStyleOptionGraphicsItem, QMessageBox
     PYQT4 = False
 except Exception as e:
-    from PyQt4.QtCore import QLineF, QPointF, QRectF, QSizeF, QString, QTime, Qt, pyqtSignal, qAbs, qsrand
+    from PyQt4.QtCore import QLineF, QPointF, QRectF, QSizeF, QString, QTime, QTimer, Qt, pyqtSignal, qAbs, qsrand
     from PyQt4.QtGui import QAction, QApplication, QBrush, QCheckBox, QColor, QComboBox, QFont, QFontMetrics, \
         QGraphicsItem, \
         QGraphicsScene, QGraphicsTextItem, QGraphicsView, QHBoxLayout, QInputDialog, QLineEdit, QLinearGradient, \
-        QMainWindow, QMenu, QPainter, QPainterPath, QPainterPathStroker, QPen, QPolygonF, QRadialGradient, QSlider, \
-        QStyle, \
+        QMainWindow, QMenu, QMessageBox, QPainter, QPainterPath, QPainterPathStroker, QPen, QPolygonF, \
+        QProgressBar, QRadialGradient, QSlider, QStyle, QStyleOptionGraphicsItem, \
         QTransform, QVBoxLayout, QWidget
     PYQT4 = True
 
 from ParticlesBackgroundDecoration import ParticlesBackgroundDecoration
+from QNetworkxAsyncLayout import QLayoutJobRunner
+from QNetworkxEdgeLayer import QEdgeLayerItem
+from QNetworkxInstrumentation import FrameStats
+from QNetworkxLabels import QStaticLabelItem
+from QNetworkxLayoutCache import LayoutCache
+from QNetworkxLayoutEngine import ForceLayoutEngine
+from QNetworkxLayoutWorker import QLayoutThread
+from QNetworkxMultilevelLayout import multilevel_layout
+from QNetworkxNodeLayer import QNodeLayerItem
+from QNetworkxObservable import EDGE_ADDED, EDGE_CHANGED, EDGE_REMOVED, GRAPH_CLEARED, NODE_ADDED, NODE_CHANGED, \
+    NODE_REMOVED
+from QNetworkxSceneIndex import INDEX_ADAPTIVE, INDEX_BSP, INDEX_NONE, bsp_tree_depth
+from QNetworkxShapes import NodeShapes
+from QNetworkxSharedLayout import SharedMemoryLayoutEngine
+from QNetworkxVirtualScene import QVirtualGraphScene
 
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
@@ -85,6 +102,11 @@ class QEdgeGraphicItem(QGraphicsItem):
 
     Type = QGraphicsItem.UserType + 2
 
+    # Self loop geometry keyed by (node size, arc angle, arrow size), see _self_loop_geometry. Only the
+    # self_loop_geometry_size most recently used are kept.
+    self_loop_geometry = OrderedDict()
+    self_loop_geometry_size = 64
+
     def __init__(self, first_node, second_node, label=None, directed=False, label_visible=True):
         self._logger = logging.getLogger("QNetworkxGraph.QEdgeGraphicItem")
         self._logger.setLevel(logging.CRITICAL)
@@ -94,6 +116,14 @@ class QEdgeGraphicItem(QGraphicsItem):
         self.arc_angle = 315
         self.source_point = QPointF()
         self.dest_point = QPointF()
+        # Geometry of the current end points, see _update_geometry
+        self._bounding_rect = QRectF()
+        self._shape = None
+        self._source_arrow = None
+        self._dest_arrow = None
+        self._arc_rect = QRectF()
+        self._arc_start = 0
+        self._arc_span = 0
 
         self.setAcceptedMouseButtons(Qt.NoButton)
         self.setFlag(QGraphicsItem.ItemIsMovable)
@@ -104,15 +134,17 @@ class QEdgeGraphicItem(QGraphicsItem):
         self.node_size = 10
         if not label:
             if first_node.label is not None and second_node.label is not None:
-                label = "%s - %s" % (first_node.label.toPlainText(), second_node.label.toPlainText())
+                label = u"%s - %s" % (first_node.label.toPlainText(), second_node.label.toPlainText())
             else:
                 label = ''
-        self.label = QGraphicsTextItem(label, self)
-        self.label.setParentItem(self)
-        self.label.setDefaultTextColor(Qt.white)
+        # The label item is only created when the label is first shown
+        self.label_text = label
+        self._label = None
         self.source.add_edge(self)
         self.dest.add_edge(self)
-        self.adjust()
+        # Edges created in bulk are adjusted once all of them exist
+        if not first_node.graph.batch_geometry_update:
+            self.adjust()
         self.menu = QMenu()
         self.is_directed = directed
         self.setZValue(11)
@@ -120,8 +152,19 @@ class QEdgeGraphicItem(QGraphicsItem):
         self.edge_profile = 'default'
         self.edge_config = graph_config[self.edge_profile].EdgeConfig
 
+    @property
+    def label(self):
+        if self._label is None:
+            self._label = QStaticLabelItem(self.label_text, self)
+            self._label.setDefaultTextColor(Qt.white)
+        return self._label
+
     def set_label_visible(self, boolean):
-        self.label.setVisible(boolean)
+        self.label_visible = boolean
+        # Labels are hidden while the view is zoomed out below the label level of detail
+        visible = boolean and self.source.graph.labels_shown
+        if visible or self._label is not None:
+            self.label.setVisible(visible)
 
     def type(self):
         return QEdgeGraphicItem.Type
@@ -171,57 +214,123 @@ class QEdgeGraphicItem(QGraphicsItem):
                 self.dest_point = line.p1()
                 # self.setPos(self.mapToParent(self.boundingRect().center()))
                 # print "Adjust of %s" % self.label.toPlainText()
+            self._update_geometry()
         else:
-            # setting and getting initial variables we will use
-            angle_rad = math.radians(self.arc_angle)
-            node_radius = self.source.size / 2.0
-            arc_radius = node_radius * 0.60
-            centers_distance = node_radius + (2 * arc_radius / 3.0)
-
-            # calculate x, y position of the arc center from the node center
-            arc_center_x = math.cos(angle_rad) * centers_distance
-            arc_center_y = math.sin(angle_rad) * centers_distance
-
-            # Visual Debug
-            # painter.setPen(QPen(Qt.blue, 1, Qt.SolidLine,
-            #                           Qt.RoundCap, Qt.RoundJoin))
-            # painter.drawEllipse(arc_center_x-2, arc_center_y-2, 4, 4)
-
-            # calculate the P1 and P2 points where both circles cut (on arc coordinate)
-            # http://mathworld.wolfram.com/Circle-CircleIntersection.html
-            p1_cut_point_x = (math.pow(centers_distance, 2) - math.pow(node_radius, 2) + math.pow(arc_radius,
-                                                                                                  2)) / float(
-                (2 * centers_distance))
-            p1_cut_point_y = math.sqrt(math.pow(arc_radius, 2) - math.pow(p1_cut_point_x, 2))
-            p1 = QPointF(p1_cut_point_x, p1_cut_point_y)
-            p2 = QPointF(p1_cut_point_x, -p1_cut_point_y)
-            self.setPos(self.source.pos().x() + arc_center_x, self.source.pos().y() + arc_center_y)
+            key = (self.source.size, self.arc_angle, self.arrowSize)
+            cache = QEdgeGraphicItem.self_loop_geometry
+            geometry = cache.pop(key, None)
+            if geometry is None:
+                geometry = self._self_loop_geometry()
+                if len(cache) >= QEdgeGraphicItem.self_loop_geometry_size:
+                    cache.popitem(last=False)
+            cache[key] = geometry
+            arc_center = geometry[0]
+            self.setPos(self.source.pos() + arc_center)
             self.prepareGeometryChange()
-            self.source_point = p1
-            self.dest_point = p2
+            (arc_center, self.source_point, self.dest_point, self._arc_rect, self._arc_start, self._arc_span,
+             self._source_arrow, self._dest_arrow, self._shape, self._bounding_rect) = geometry
+
+    def _self_loop_geometry(self):
+        """
+        Geometry of a self loop of the current node size, arc angle and arrow size.
+
+        It doesn't depend on the position of the node, so it's computed once and shared through
+        self_loop_geometry by all the loops with the same parameters.
+
+        Returns
+        -------
+        tuple
+            (arc center relative to the node, source point, dest point, arc rect, arc start, arc span,
+            source arrow, dest arrow, shape, bounding rect)
+        """
+        # setting and getting initial variables we will use
+        angle_rad = math.radians(self.arc_angle)
+        node_radius = self.source.size / 2.0
+        arc_radius = node_radius * 0.60
+        centers_distance = node_radius + (2 * arc_radius / 3.0)
+
+        # calculate x, y position of the arc center from the node center
+        arc_center_x = math.cos(angle_rad) * centers_distance
+        arc_center_y = math.sin(angle_rad) * centers_distance
+
+        # Visual Debug
+        # painter.setPen(QPen(Qt.blue, 1, Qt.SolidLine,
+        #                           Qt.RoundCap, Qt.RoundJoin))
+        # painter.drawEllipse(arc_center_x-2, arc_center_y-2, 4, 4)
+
+        # calculate the P1 and P2 points where both circles cut (on arc coordinate)
+        # http://mathworld.wolfram.com/Circle-CircleIntersection.html
+        p1_cut_point_x = (math.pow(centers_distance, 2) - math.pow(node_radius, 2) + math.pow(arc_radius,
+                                                                                              2)) / float(
+            (2 * centers_distance))
+        p1_cut_point_y = math.sqrt(math.pow(arc_radius, 2) - math.pow(p1_cut_point_x, 2))
+        p1 = QPointF(p1_cut_point_x, p1_cut_point_y)
+        p2 = QPointF(p1_cut_point_x, -p1_cut_point_y)
+
+        # Calculate the P1 and P2 angle on arc circle coordinates
+        p1_angle = math.atan2(p1.y(), p1.x())
+        p2_angle = math.atan2(p2.y(), p2.x())
+
+        p1_angle_normalized = p1_angle % (2 * math.pi)
+        p2_angle_normalized = p2_angle % (2 * math.pi)
+        difference = abs(p1_angle_normalized - p2_angle_normalized) % (2 * math.pi)
+        span_angle = (2 * math.pi) - difference if difference < math.pi else difference
+
+        self._arc_rect = QRectF(-arc_radius, -arc_radius, arc_radius * 2, arc_radius * 2)
+        self._arc_start = math.degrees(p1_angle_normalized) * 16
+        self._arc_span = math.degrees(span_angle) * 16
+        source_arrow = self._arrow_head(p1, p1_angle - QEdgeGraphicItem.Pi / 3,
+                                        p1_angle - QEdgeGraphicItem.Pi + QEdgeGraphicItem.Pi / 3)
+        dest_arrow = self._arrow_head(p2, p2_angle - QEdgeGraphicItem.Pi / 3,
+                                      p2_angle - QEdgeGraphicItem.Pi + QEdgeGraphicItem.Pi / 3)
+        shape = self.arc_shape()
+        return (QPointF(arc_center_x, arc_center_y), p1, p2, self._arc_rect, self._arc_start, self._arc_span,
+                source_arrow, dest_arrow, shape, shape.boundingRect().adjusted(0, 0, +1, +1))
+
+    def _update_geometry(self):
+        """
+        Compute the arrowheads and the bounding rect of the current end points of a straight edge.
+
+        They are kept until the next adjust, so paint, shape and boundingRect don't repeat the trigonometry.
+        The stroked shape is built the first time the scene asks for it after an adjust.
+        """
+        self._shape = None
+        extra = (1.0 + self.arrowSize) / 2.0
+        self._bounding_rect = QRectF(self.source_point, self.dest_point).normalized().adjusted(-extra, -extra,
+                                                                                                extra, extra)
+        line = QLineF(self.source_point, self.dest_point)
+        if line.length() == 0.0:
+            self._source_arrow = self._dest_arrow = None
+            return
+        angle = math.acos(line.dx() / line.length())
+        if line.dy() >= 0:
+            angle = QEdgeGraphicItem.TwoPi - angle
+        self._source_arrow = self._arrow_head(self.source_point, angle + QEdgeGraphicItem.Pi / 3,
+                                              angle + QEdgeGraphicItem.Pi - QEdgeGraphicItem.Pi / 3)
+        self._dest_arrow = self._arrow_head(self.dest_point, angle - QEdgeGraphicItem.Pi / 3,
+                                            angle - QEdgeGraphicItem.Pi + QEdgeGraphicItem.Pi / 3)
+
+    def _arrow_head(self, point, first_angle, second_angle):
+        return QPolygonF([point,
+                          point + QPointF(math.sin(first_angle) * self.arrowSize,
+                                          math.cos(first_angle) * self.arrowSize),
+                          point + QPointF(math.sin(second_angle) * self.arrowSize,
+                                          math.cos(second_angle) * self.arrowSize)])
 
     def boundingRect(self):
         if not self.source or not self.dest:
             return QRectF()
 
-        if self.source != self.dest:
-            pen_width = 1.0
-            extra = (pen_width + self.arrowSize) / 2.0
-            return QRectF(self.source_point,
-                          QSizeF(self.dest_point.x() - self.source_point.x(),
-                                 self.dest_point.y() - self.source_point.y())).normalized().adjusted(-extra,
-                                                                                                     -extra,
-                                                                                                     extra,
-                                                                                                     extra)
-        else:
-            return self.arc_shape().boundingRect().adjusted(0, 0, +1, +1)
-            # return QRectF(-2000,-2000, 4000, 4000)
+        return self._bounding_rect
 
     def paint(self, painter, option, widget):
         if not self.source or not self.dest:
             return
 
-        if self.source == self.dest:
+        level_of_detail = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        if level_of_detail < self.source.graph.lod_hairline_threshold:
+            self.paint_hairline(painter)
+        elif self.source == self.dest:
             self.paint_arc(painter, option, widget)
         else:
             self.paint_arrow(painter, option, widget)
@@ -252,7 +361,7 @@ class QEdgeGraphicItem(QGraphicsItem):
             Dict with the text of the option as key and the name of the method to call if activated.
             The values of the dict are tuples like (object, method).
         """
-        self._logger.debug("Adding custom context menu to edge %s" % str(self.label.toPlainText()))
+        self._logger.debug("Adding custom context menu to edge %s" % self.label_text)
         for option_string, callback in options.items():
             instance, method = callback
             action = QAction(option_string, self.menu)
@@ -260,7 +369,7 @@ class QEdgeGraphicItem(QGraphicsItem):
             self.menu.addAction(action)
 
     def contextMenuEvent(self, event):
-        self._logger.debug("ContextMenuEvent received on edge %s" % str(self.label.toPlainText()))
+        self._logger.debug("ContextMenuEvent received on edge %s" % self.label_text)
         if self.menu:
             self.menu.exec_(event.screenPos())
             event.setAccepted(True)
@@ -269,222 +378,57 @@ class QEdgeGraphicItem(QGraphicsItem):
             event.setAccepted(False)
 
     def shape(self):
+        if self._shape is None:
+            if self.source == self.dest:
+                self._shape = self.arc_shape()
+            else:
+                self._shape = self.arrow_shape()
+        return self._shape
+
+    def paint_hairline(self, painter):
+        """
+        Low detail version of the edge: a cosmetic line (or circle for loops) without arrowheads.
+        """
         if self.source == self.dest:
-            new_path = self.arc_shape()
+            painter.setPen(QPen(self.edge_config.EdgeColors.Self.LineColor, 0))
+            arc_radius = self.source.size / 2.0 * 0.60
+            painter.drawEllipse(QPointF(0, 0), arc_radius, arc_radius)
         else:
-            new_path = self.arrow_shape()
-        return new_path
+            painter.setPen(QPen(self.edge_config.EdgeColors.Default.LineColor, 0))
+            painter.drawLine(self.source_point, self.dest_point)
 
     def paint_arc(self, painter, option, widget):
-        # setting and getting initial variables we will use
-        node_radius = self.source.size / 2.0
-        arc_radius = node_radius * 0.60
-        # # Translate also the painter to keep it synchronized to
-        # painter.translate(arc_center_x, arc_center_y)
+        # The arc geometry is in arc circle coordinates, rotated to point away from the node
         painter.rotate(180 + self.arc_angle)
-        # painter.scale(-1,1)
-        # painter.rotate(180)
-
         painter.setPen(QPen(self.edge_config.EdgeColors.Self.LineColor, 1, Qt.SolidLine,
                             Qt.RoundCap, Qt.RoundJoin))
-        # Debug visual information
-        # painter.drawEllipse(p1, 4, 4)
-        # painter.drawText(p1, "P1")
-        # # painter.drawText(p1, "      %s , %s" % (p1.x(), p1.y()))
-        # painter.drawEllipse(p2, 4, 4)
-        # painter.drawText(p2, "P2")
-        # # painter.drawText(p2, "      %s , %s" % (p2.x(), p2.y()))
-        # painter.drawEllipse(-2,-2, 4, 4)
-        # painter.drawEllipse(-2,-2, 4, 4)
-        # painter.drawEllipse(-2, 40, 4, 4)
-        # painter.drawEllipse(-2, 40, 4, 4)
-        # painter.drawText(0,40, "0x,40y")
-        # painter.drawEllipse(40, -2, 4, 4)
-        # painter.drawEllipse(40, -2, 4, 4)
-        # painter.drawText(40, 0, "40x,0y")
-
-        # Calculate the P1 and P2 angle on arc circle coordinates
-        p1_angle = math.atan2(self.source_point.y(), self.source_point.x())
-        p2_angle = math.atan2(self.dest_point.y(), self.dest_point.x())
-
-        p1_angle_normalized = p1_angle % (2 * math.pi)
-        p2_angle_normalized = p2_angle % (2 * math.pi)
-        difference = abs(p1_angle_normalized - p2_angle_normalized) % (2 * math.pi)
-        span_angle = (2 * math.pi) - difference if difference < math.pi else difference
-
-        p1_angle_degrees = math.degrees(p1_angle_normalized)
-        span_angle_degrees = math.degrees(span_angle)
-
-        painter.drawArc(-arc_radius, -arc_radius, arc_radius * 2, arc_radius * 2, p1_angle_degrees * 16,
-                        span_angle_degrees * 16)
+        painter.drawArc(self._arc_rect, int(self._arc_start), int(self._arc_span))
 
         # Arrows of the arc
-        source_arrow_p1 = self.source_point + QPointF(
-            math.sin(
-                p1_angle - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                p1_angle - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
-
-        source_arrow_p2 = self.source_point + QPointF(
-            math.sin(
-                p1_angle - QEdgeGraphicItem.Pi + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                p1_angle - QEdgeGraphicItem.Pi + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
-
-        dest_arrow_p1 = self.dest_point + QPointF(
-            math.sin(
-                p2_angle - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                p2_angle - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
-
-        dest_arrow_p2 = self.dest_point + QPointF(
-            math.sin(
-                p2_angle - QEdgeGraphicItem.Pi + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                p2_angle - QEdgeGraphicItem.Pi + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
         painter.setPen(QPen(self.edge_config.EdgeColors.Self.ArrowEdgeColor))
         painter.setBrush(QBrush(self.edge_config.EdgeColors.Self.ArrowFillColor))
         if not self.is_directed:
-            painter.drawPolygon(QPolygonF([self.source_point, source_arrow_p1, source_arrow_p2]))
-        painter.drawPolygon(QPolygonF([self.dest_point, dest_arrow_p1, dest_arrow_p2]))
-
-        # Visual debug
-        # painter.setPen(QPen(Qt.red, 1, Qt.SolidLine,
-        #                           Qt.RoundCap, Qt.RoundJoin))
-        # painter.drawArc(-arc_radius, -arc_radius, arc_radius * 2, arc_radius * 2, p1_angle_degrees * 16, 20 * 16)
-        # painter.setPen(QPen(Qt.yellow, 1, Qt.SolidLine,
-        #                           Qt.RoundCap, Qt.RoundJoin))
-        # painter.drawArc(-arc_radius, -arc_radius, arc_radius * 2, arc_radius * 2, 0 * 16,
-        #                 45 * 16)
-        # self.setZValue(3)
+            painter.drawPolygon(self._source_arrow)
+        painter.drawPolygon(self._dest_arrow)
 
     def paint_arrow(self, painter, option, widget):
-        # Draw the line itself.
-        line = QLineF(self.source_point, self.dest_point)
-
-        if line.length() == 0.0:
+        # Nothing to draw while the nodes overlap
+        if self._dest_arrow is None:
             return
 
         painter.setPen(QPen(self.edge_config.EdgeColors.Default.LineColor, 1, Qt.SolidLine,
                             Qt.RoundCap, Qt.RoundJoin))
-        painter.drawLine(line)
-
-        # Draw the arrows if there's enough room.
-        angle = math.acos(line.dx() / line.length())
-        if line.dy() >= 0:
-            angle = QEdgeGraphicItem.TwoPi - angle
-
-        source_arrow_p1 = self.source_point + QPointF(
-            math.sin(
-                angle + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                angle + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
-
-        source_arrow_p2 = self.source_point + QPointF(
-            math.sin(
-                angle + QEdgeGraphicItem.Pi - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                angle + QEdgeGraphicItem.Pi - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
-
-        dest_arrow_p1 = self.dest_point + QPointF(
-            math.sin(
-                angle - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                angle - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
-
-        dest_arrow_p2 = self.dest_point + QPointF(
-            math.sin(
-                angle - QEdgeGraphicItem.Pi + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                angle - QEdgeGraphicItem.Pi + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
+        painter.drawLine(self.source_point, self.dest_point)
 
         painter.setPen(QPen(self.edge_config.EdgeColors.Default.ArrowEdgeColor))
         painter.setBrush(QBrush(self.edge_config.EdgeColors.Default.ArrowFillColor))
         if not self.is_directed:
-            painter.drawPolygon(QPolygonF([line.p1(), source_arrow_p1, source_arrow_p2]))
-        painter.drawPolygon(QPolygonF([line.p2(), dest_arrow_p1, dest_arrow_p2]))
+            painter.drawPolygon(self._source_arrow)
+        painter.drawPolygon(self._dest_arrow)
 
     def arc_shape(self):
         shape = QPainterPath()
-        # setting and getting initial variables we will use
-        angle_rad = math.radians(self.arc_angle)
-        node_radius = self.source.size / 2.0
-        arc_radius = node_radius * 0.60
-        centers_distance = node_radius + (2 * arc_radius / 3.0)
-
-        # calculate x, y position of the arc center from the node center
-        arc_center_x = math.cos(angle_rad) * centers_distance
-        arc_center_y = math.sin(angle_rad) * centers_distance
-
-        # Visual Debug
-        # painter.setPen(QPen(Qt.blue, 1, Qt.SolidLine,
-        #                           Qt.RoundCap, Qt.RoundJoin))
-        # painter.drawEllipse(arc_center_x-2, arc_center_y-2, 4, 4)
-
-        # calculate the P1 and P2 points where both circles cut (on arc coordinate)
-        # http://mathworld.wolfram.com/Circle-CircleIntersection.html
-        p1_cut_point_x = (math.pow(centers_distance, 2) - math.pow(node_radius, 2) + math.pow(arc_radius, 2)) / float(
-            (2 * centers_distance))
-        p1_cut_point_y = math.sqrt(math.pow(arc_radius, 2) - math.pow(p1_cut_point_x, 2))
-        p1 = QPointF(p1_cut_point_x, p1_cut_point_y)
-        p2 = QPointF(p1_cut_point_x, -p1_cut_point_y)
-
-        transform = QTransform()
-        # # Translate also the painter to keep it synchronized to
-        transform.translate(arc_center_x, arc_center_y)
-        transform.rotate(180 + self.arc_angle)
-        shape = transform.map(shape)
-        # painter.scale(-1,1)
-        # painter.rotate(180)
-
-        # shape.setPen(QPen(Qt.cyan, 1, Qt.SolidLine,
-        #                           Qt.RoundCap, Qt.RoundJoin))
-        # Debug visual information
-        # painter.drawEllipse(p1, 4, 4)
-        # painter.drawText(p1, "P1")
-        # # painter.drawText(p1, "      %s , %s" % (p1.x(), p1.y()))
-        # painter.drawEllipse(p2, 4, 4)
-        # painter.drawText(p2, "P2")
-        # # painter.drawText(p2, "      %s , %s" % (p2.x(), p2.y()))
-        # painter.drawEllipse(-2,-2, 4, 4)
-        # painter.drawEllipse(-2,-2, 4, 4)
-        # painter.drawEllipse(-2, 40, 4, 4)
-        # painter.drawEllipse(-2, 40, 4, 4)
-        # painter.drawText(0,40, "0x,40y")
-        # painter.drawEllipse(40, -2, 4, 4)
-        # painter.drawEllipse(40, -2, 4, 4)
-        # painter.drawText(40, 0, "40x,0y")
-
-        # Calculate the P1 and P2 angle on arc circle coordinates
-        p1_angle = math.atan2(p1.y(), p1.x())
-        p2_angle = math.atan2(p2.y(), p2.x())
-
-        p1_angle_normalized = p1_angle % (2 * math.pi)
-        p2_angle_normalized = p2_angle % (2 * math.pi)
-        difference = abs(p1_angle_normalized - p2_angle_normalized) % (2 * math.pi)
-        span_angle = (2 * math.pi) - difference if difference < math.pi else difference
-
-        p1_angle_degrees = math.degrees(p1_angle_normalized)
-        span_angle_degrees = math.degrees(span_angle)
-
-        shape.arcTo(-arc_radius, -arc_radius, arc_radius * 2, arc_radius * 2, p1_angle_degrees * 16,
-                    span_angle_degrees * 16)
+        shape.arcTo(self._arc_rect, self._arc_start, self._arc_span)
         # Expand the shape 2 pixels to be able to click on edge lines
         stroker = QPainterPathStroker()
         stroker.setWidth(2)
@@ -492,68 +436,16 @@ class QEdgeGraphicItem(QGraphicsItem):
         shape = (stroker.createStroke(shape) + shape).simplified()
         return shape
 
-        # Visual debug
-        # painter.setPen(QPen(Qt.red, 1, Qt.SolidLine,
-        #                           Qt.RoundCap, Qt.RoundJoin))
-        # painter.drawArc(-arc_radius, -arc_radius, arc_radius * 2, arc_radius * 2, p1_angle_degrees * 16, 20 * 16)
-        # painter.setPen(QPen(Qt.yellow, 1, Qt.SolidLine,
-        #                           Qt.RoundCap, Qt.RoundJoin))
-        # painter.drawArc(-arc_radius, -arc_radius, arc_radius * 2, arc_radius * 2, 0 * 16,
-        #                 45 * 16)
-
     def arrow_shape(self):
         shape_path = QPainterPath()
-        if not self.source or not self.dest:
-            return
-
-            # Draw the line itself.
-        line = QLineF(self.source_point, self.dest_point)
-
-        if line.length() == 0.0:
-            return
-
-        # Draw the arrows if there's enough room.
-        angle = math.acos(line.dx() / line.length())
-        if line.dy() >= 0:
-            angle = QEdgeGraphicItem.TwoPi - angle
-
-        source_arrow_p1 = self.source_point + QPointF(
-            math.sin(
-                angle + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                angle + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
-
-        source_arrow_p2 = self.source_point + QPointF(
-            math.sin(
-                angle + QEdgeGraphicItem.Pi - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                angle + QEdgeGraphicItem.Pi - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
-
-        dest_arrow_p1 = self.dest_point + QPointF(
-            math.sin(
-                angle - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                angle - QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
-
-        dest_arrow_p2 = self.dest_point + QPointF(
-            math.sin(
-                angle - QEdgeGraphicItem.Pi + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize,
-            math.cos(
-                angle - QEdgeGraphicItem.Pi + QEdgeGraphicItem.Pi / 3
-            ) * self.arrowSize)
+        if not self.source or not self.dest or self._dest_arrow is None:
+            return shape_path
 
         if not self.is_directed:
-            shape_path.addPolygon(QPolygonF([line.p1(), source_arrow_p1, source_arrow_p2]))
+            shape_path.addPolygon(self._source_arrow)
         shape_path.moveTo(self.source_point)
         shape_path.lineTo(self.dest_point)
-        shape_path.addPolygon(QPolygonF([line.p2(), dest_arrow_p1, dest_arrow_p2]))
+        shape_path.addPolygon(self._dest_arrow)
 
         # Expand the shape 2 pixels to be able to click on edge lines
         stroker = QPainterPathStroker()
@@ -563,11 +455,6 @@ class QEdgeGraphicItem(QGraphicsItem):
         return new_path
 
 
-class NodeShapes(Enum):
-    SQUARE = 1
-    CIRCLE = SQUARE + 1
-
-
 class QNodeGraphicItem(QGraphicsItem):
     Type = QGraphicsItem.UserType + 1
 
@@ -587,8 +474,7 @@ class QNodeGraphicItem(QGraphicsItem):
         self.setZValue(10)
         self.size = 40
         self.border_width = 4
-        self.label = QGraphicsTextItem(str(label))
-        self.label.setParentItem(self)
+        self.label = QStaticLabelItem(label, self)
         self.label.setDefaultTextColor(Qt.white)
         rect = self.label.boundingRect()
         self.label.setPos(-rect.width() / 2, -rect.height() / 2)
@@ -617,7 +503,8 @@ class QNodeGraphicItem(QGraphicsItem):
 
     def add_edge(self, edge):
         self.edgeList.append(edge)
-        edge.adjust()
+        if not self.graph.batch_geometry_update:
+            edge.adjust()
 
     def edges(self):
         return self.edgeList
@@ -753,8 +640,27 @@ class QNodeGraphicItem(QGraphicsItem):
         return path
 
     def paint(self, painter, option, widget):
+        if self.graph.node_layer is not None:
+            # Painted in batch by the node layer
+            return
         x_coord = y_coord = -(self.size / 2)
         width = height = self.size
+        level_of_detail = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        if level_of_detail < self.graph.lod_dot_threshold:
+            # Flat dot, without border
+            if option.state & QStyle.State_Selected:
+                color = self.node_config.Selected.Fill
+            else:
+                color = self.node_config.Default.Fill
+            if self.node_shape == NodeShapes.CIRCLE:
+                painter.save()
+                painter.setPen(Qt.NoPen)
+                painter.setBrush(color)
+                painter.drawEllipse(QRectF(x_coord, y_coord, width, height))
+                painter.restore()
+            else:
+                painter.fillRect(QRectF(x_coord, y_coord, width, height), color)
+            return
         painter.save()
         # Draw the shadow
         # painter.setPen(Qt.NoPen)
@@ -808,10 +714,15 @@ class QNodeGraphicItem(QGraphicsItem):
         return label_width
 
     def itemChange(self, change, value):
-        if change == QGraphicsItem.ItemPositionHasChanged:
+        if change == QGraphicsItem.ItemPositionHasChanged and not self.graph.batch_geometry_update:
+            stats = self.graph.stats
+            if stats is not None:
+                start = time.time()
             for edge in self.edgeList:
                 edge.adjust()
-            self.graph.item_moved()
+            if stats is not None:
+                stats.add(FrameStats.GEOMETRY, time.time() - start)
+            self.graph.item_moved(self)
 
         return super(QNodeGraphicItem, self).itemChange(change, value)
 
@@ -828,8 +739,6 @@ class QNodeGraphicItem(QGraphicsItem):
     def set_size(self, new_size):
         self.prepareGeometryChange()
         self.size = new_size
-        self.calculate_forces()
-        self.advance()
         self.update()
 
     def set_node_profile(self, node_profile):
@@ -878,21 +787,74 @@ class QNodeGraphicItem(QGraphicsItem):
 
 class QNetworkxWidget(QGraphicsView):
     node_selection_changed = Signal(list)
+    layout_converged = Signal(int, float)
+    # Setters of QNodeGraphicItem applied by set_node_attributes, keyed by node attribute of the user graph
+    node_attribute_setters = {'size': 'set_size', 'profile': 'set_node_profile', 'shape': 'set_node_shape'}
+    # Emitted when the visible region of the scene changes (scroll, zoom or resize)
+    viewport_changed = Signal()
+    # Emitted after every painted frame while the instrumentation is enabled, with the frame timings
+    frame_stats = Signal(object)
 
     def __init__(self, directed=False, parent=None):
         super(QNetworkxWidget, self).__init__(parent)
 
         self.timer_id = 0
+        self.layout_engine = ForceLayoutEngine()
+        self._layout_dirty = True
+        self._layout_reload_scheduled = False
+        self.batch_geometry_update = False
+        self.layout_thread = None
+        self._layout_generation = 0
+        self._pending_layout_positions = None
+        self.pinned_nodes = set()
+        self.transition_frames = 0
+        # Zoom levels under which nodes are drawn as flat dots, edges as hairlines and labels are hidden
+        self.lod_dot_threshold = 0.3
+        self.lod_hairline_threshold = 0.3
+        self.lod_label_threshold = 0.5
+        self.labels_shown = True
+        self.transition_interval = 1000 / 60
+        self._transition = None
+        self._transition_timer = QTimer(self)
+        self._transition_timer.timeout.connect(self._transition_step)
+        # Increased on every change of the nodes or edges, to discard results computed for an older graph
+        self.graph_version = 0
+        self.incremental_placement = False
+        self.incremental_hops = 2
+        self.animating = False
+        # New nodes waiting for their edges (True once placed at the barycenter of their neighbours)
+        self._fresh_nodes = {}
+        # Nodes whose neighbourhood must be relaxed on the next reload of the layout engine
+        self._relax_items = set()
+        # Frame timings, None while the instrumentation is disabled
+        self.stats = None
+        self.hud_visible = False
+        self._hud_timer = QTimer(self)
+        self._hud_timer.setInterval(250)
+        self._hud_timer.timeout.connect(self._update_hud)
+        self._edge_count = (None, 0)
         self.background_color = QColor(0, 0, 0)
         self.last_position = None
         self.current_position = None
         self.panning_mode = False
 
         self.scene = QGraphicsScene(self)
+        # No index while the nodes move, a BSP tree is built once they have been still for a while
         self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        self.index_mode = INDEX_ADAPTIVE
+        self.index_settle_delay = 500
+        self.index_leaf_size = 8
+        self._index_timer = QTimer(self)
+        self._index_timer.setSingleShot(True)
+        self._index_timer.setInterval(self.index_settle_delay)
+        self._index_timer.timeout.connect(self.build_scene_index)
         self.scene.setSceneRect(-400, -400, 800, 800)
         self.setScene(self.scene)
         self.scene.selectionChanged.connect(self.on_selection_change)
+        self.edge_layer = None
+        self.node_layer = None
+        # QVirtualGraphScene showing its graph in the widget, if any
+        self.virtual_scene = None
         self.setCacheMode(QGraphicsView.CacheBackground)
         self.setViewportUpdateMode(QGraphicsView.BoundingRectViewportUpdate)
         self.setRenderHint(QPainter.Antialiasing)
@@ -907,6 +869,9 @@ class QNetworkxWidget(QGraphicsView):
         self.setWindowTitle("QNetworkXWidget")
 
         self.nx_graph = nx.Graph()
+        # Node items keyed by their unicode label in nx_graph, and the labels keyed by item
+        self.node_items = {}
+        self.node_labels = {}
         # self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.is_directed = directed
 
@@ -930,6 +895,10 @@ class QNetworkxWidget(QGraphicsView):
         action3.setCheckable(True)
         action3.triggered.connect(self.animate_nodes)
 
+        action4 = QAction("Barnes-Hut repulsion", self)
+        action4.setCheckable(True)
+        action4.triggered.connect(self.set_barnes_hut_repulsion)
+
         self.node_groups_menu = self.menu.addMenu("Add to group...")
         self.new_group_action = QAction("Add new group...", self)
         self.new_group_action.triggered.connect(self.create_new_node_group)
@@ -938,12 +907,20 @@ class QNetworkxWidget(QGraphicsView):
         self.menu.addAction(action1)
         self.menu.addAction(action2)
         self.menu.addAction(action3)
+        self.menu.addAction(action4)
         self.menu.addSeparator()
 
     def set_mass_center(self):
-        if self.selected_nodes():
-            for node_label in self.selected_nodes():
-                self.nx_graph.node[node_label]['item'].set_mass_center(self.last_menu_position)
+        nodes = self.selected_node_items()
+        if nodes:
+            for node in nodes:
+                node.set_mass_center(self.last_menu_position)
+                self.layout_engine.set_mass_center(node, self.last_menu_position.x(), self.last_menu_position.y())
+                self.layout_engine.reheat_items([node])
+                if self.layout_thread is not None and node in self.layout_engine.index:
+                    self.layout_thread.set_mass_center(self.layout_engine.index[node],
+                                                       self.last_menu_position.x(), self.last_menu_position.y())
+            self.item_moved()
 
     def center_on(self, position):
         temp = self.panning_mode
@@ -1028,19 +1005,46 @@ class QNetworkxWidget(QGraphicsView):
         self.particle_background.set_color(color)
 
     def on_selection_change(self):
+        if self.layout_thread is not None and not self._layout_dirty:
+            self.update_layout_engine()
         selected_nodes = self.selected_nodes()
         self.node_selection_changed.emit(selected_nodes)
 
     def selected_nodes(self):
-        changed = self.scene.selectedItems()
-        selected_nodes = []
-        for item in changed:
-            if isinstance(item, QNodeGraphicItem):
-                if PYQT4:
-                    selected_nodes.append(unicode(item.label.toPlainText().toUtf8(), encoding="UTF-8"))
-                else:
-                    selected_nodes.append(unicode(item.label.toPlainText()))
-        return selected_nodes
+        """
+        Labels of the selected nodes, from the item index.
+        """
+        node_labels = self.node_labels
+        return [node_labels[item] for item in self.scene.selectedItems() if item in node_labels]
+
+    def selected_node_items(self):
+        node_labels = self.node_labels
+        return [item for item in self.scene.selectedItems() if item in node_labels]
+
+    def node_item(self, label):
+        """
+        Item of the node of label, None if it's not in the graph.
+        """
+        return self.node_items.get(self.node_label(label))
+
+    def item_label(self, item):
+        """
+        Label of a node item, None if it's not a node of the graph.
+        """
+        return self.node_labels.get(item)
+
+    def register_node_item(self, node_label, item):
+        """
+        Add a node item to the label/item index. Every node added to nx_graph must be registered.
+        """
+        self.node_items[node_label] = item
+        self.node_labels[item] = node_label
+
+    def unregister_node_item(self, node_label):
+        item = self.node_items.pop(node_label, None)
+        if item is not None:
+            self.node_labels.pop(item, None)
+        return item
 
     def get_selected_nodes(self):
         return self.selected_nodes()
@@ -1066,93 +1070,823 @@ class QNetworkxWidget(QGraphicsView):
     def set_scale_factor(self, scale_factor):
         self._scale_factor = scale_factor
 
-    def item_moved(self):
-        if not self.timer_id:
+    def item_moved(self, node=None):
+        self.invalidate_layers()
+        self.scene_changing()
+        if node is not None:
+            self.layout_engine.set_position(node, node.pos().x(), node.pos().y())
+            self.layout_engine.reheat_items([node])
+            if self.layout_thread is not None and node in self.layout_engine.index:
+                self.layout_thread.move_node(self.layout_engine.index[node], node.pos().x(), node.pos().y())
+        self.start_layout()
+
+    def start_layout(self):
+        if self.layout_thread is not None:
+            self.update_layout_engine()
+            self.layout_thread.start(self.scene_bounds())
+        elif not self.timer_id:
             self.timer_id = self.startTimer(1000 / 25)
 
+    def scene_bounds(self):
+        scene_rect = self.scene.sceneRect()
+        return scene_rect.left(), scene_rect.top(), scene_rect.right(), scene_rect.bottom()
+
+    def set_threaded_layout(self, enabled):
+        """
+        Run the force simulation in a background thread instead of the GUI thread.
+
+        The thread works on its own copy of the positions and publishes a snapshot of them at the
+        animation rate. Only the latest snapshot is applied to the items. Nodes dragged, pinned or with a
+        new mass center are sent to the thread as soon as they change.
+
+        The thread always runs a single process engine, so it can't be combined with set_process_layout.
+        """
+        if enabled and isinstance(self.layout_engine, SharedMemoryLayoutEngine):
+            raise Exception("The threaded layout can't be used with the process layout, disable it first")
+        if enabled and self.layout_thread is None:
+            if self.timer_id:
+                self.killTimer(self.timer_id)
+                self.timer_id = 0
+            self.layout_thread = QLayoutThread(self)
+            self.layout_thread.positions_ready.connect(self.on_layout_positions_ready)
+            self.layout_thread.layout_stopped.connect(self.on_layout_stopped)
+            QApplication.instance().aboutToQuit.connect(self.layout_thread.shutdown)
+            self.invalidate_layout()
+            self.start_layout()
+        elif not enabled and self.layout_thread is not None:
+            QApplication.instance().aboutToQuit.disconnect(self.layout_thread.shutdown)
+            self.layout_thread.shutdown()
+            self.layout_thread.deleteLater()
+            self.layout_thread = None
+            self._pending_layout_positions = None
+            self.start_layout()
+
+    def set_process_layout(self, workers):
+        """
+        Shard the force computation across a pool of processes.
+
+        The positions and velocities are kept in shared memory buffers, so the pool exchanges no
+        arrays with the widget, which reads the positions directly from the shared buffer.
+
+        Parameters
+        ----------
+        workers : int
+            Number of processes of the pool. 0 or None goes back to the single process engine.
+
+        The pool is forked from the GUI process, so it can't be combined with set_threaded_layout.
+        """
+        if workers and self.layout_thread is not None:
+            raise Exception("The process layout can't be used with the threaded layout, disable it first")
+        previous_engine = self.layout_engine
+        if workers:
+            self.layout_engine = SharedMemoryLayoutEngine(workers)
+            QApplication.instance().aboutToQuit.connect(self.layout_engine.close)
+        else:
+            self.layout_engine = ForceLayoutEngine()
+        self.layout_engine.set_repulsion_mode(previous_engine.repulsion_mode, previous_engine.theta)
+        if isinstance(previous_engine, SharedMemoryLayoutEngine):
+            QApplication.instance().aboutToQuit.disconnect(previous_engine.close)
+            previous_engine.close()
+        self.invalidate_layout()
+        self.start_layout()
+
+    def on_layout_positions_ready(self, generation, positions):
+        if generation != self._layout_generation:
+            return
+        if self._pending_layout_positions is None:
+            QTimer.singleShot(0, self.apply_layout_snapshot)
+        # Only the latest snapshot is applied
+        self._pending_layout_positions = positions
+
+    def on_layout_stopped(self, generation, iterations, energy):
+        if generation != self._layout_generation:
+            return
+        # The worker froze all its nodes, so the temperatures kept by an incremental reload match them
+        self.layout_engine.temperatures[:] = 0.0
+        if iterations:
+            self.layout_converged.emit(iterations, energy)
+
+    def apply_layout_snapshot(self):
+        positions = self._pending_layout_positions
+        self._pending_layout_positions = None
+        if positions is None or self._layout_dirty or len(positions) != len(self.layout_engine):
+            return
+        engine = self.layout_engine
+        rows = np.flatnonzero((positions != engine.positions).any(axis=1) & engine.movable)
+        engine.positions[rows] = positions[rows]
+        self.apply_layout_positions(rows)
+
+    def pin_node(self, label, pinned=True):
+        """
+        Keep a node in its current position while the rest of the graph is animated.
+        """
+        node = self.node_items[self.node_label(label)]
+        if pinned:
+            self.pinned_nodes.add(node)
+        else:
+            self.pinned_nodes.discard(node)
+        self.start_layout()
+
+    def set_repulsion_mode(self, mode, theta=None):
+        """
+        Select how the node repulsion of the animation is computed.
+
+        Parameters
+        ----------
+        mode : str
+            ForceLayoutEngine.EXACT for the all-pairs sum or ForceLayoutEngine.BARNES_HUT for the
+            quadtree approximation.
+        theta : float
+            Opening angle of the Barnes-Hut approximation. The current one is kept if None.
+        """
+        self.layout_engine.set_repulsion_mode(mode, theta)
+        if self.layout_thread is not None:
+            self.layout_thread.apply_settings(self.layout_engine.settings())
+        self.layout_engine.reheat()
+        self.item_moved()
+
+    def set_barnes_hut_repulsion(self, enabled):
+        if enabled:
+            self.set_repulsion_mode(ForceLayoutEngine.BARNES_HUT)
+        else:
+            self.set_repulsion_mode(ForceLayoutEngine.EXACT)
+
+    def set_layout_convergence(self, convergence_threshold=None, max_iterations=None, cooling_factor=None,
+                               initial_temperature=None, reheat_hops=None):
+        """
+        Configure when the animation considers the layout converged and stops by itself.
+
+        Parameters
+        ----------
+        convergence_threshold : float
+            Mean squared displacement per node (in pixels) under which the layout has converged.
+        max_iterations : int
+            Maximum number of ticks after the animation is (re)started.
+        cooling_factor : float
+            Factor applied to the temperature of the moving nodes on every tick.
+        initial_temperature : float
+            Maximum displacement of a node in the first tick after a (re)start.
+        reheat_hops : int
+            Size, in edges, of the neighbourhood that is restarted when a node is dragged.
+
+        The parameters that are None keep their current value. layout_converged is emitted with the
+        number of iterations and the final energy when the animation stops.
+        """
+        self.layout_engine.apply_settings(dict(convergence_threshold=convergence_threshold,
+                                               max_iterations=max_iterations, cooling_factor=cooling_factor,
+                                               initial_temperature=initial_temperature, reheat_hops=reheat_hops))
+        if self.layout_thread is not None:
+            self.layout_thread.apply_settings(self.layout_engine.settings())
+
+    def invalidate_layout(self):
+        """
+        Mark the arrays of the layout engine as outdated.
+
+        Must be called when nodes or edges are added or removed, or their sizes change. The engine is
+        rebuilt from the graph on the next animation tick, or, with the threaded layout, once control
+        returns to the event loop, when the thread is restarted with the new graph.
+        """
+        self._layout_dirty = True
+        if self.layout_thread is not None and not self._layout_reload_scheduled:
+            self._layout_reload_scheduled = True
+            QTimer.singleShot(0, self._reload_layout_thread)
+
+    def _reload_layout_thread(self):
+        self._layout_reload_scheduled = False
+        if self.layout_thread is not None and self._layout_dirty:
+            self.start_layout()
+
+    def update_layout_engine(self):
+        if self._layout_dirty:
+            self.layout_engine.load_graph(self.nx_graph, keep_temperatures=self.incremental_placement)
+            if self.incremental_placement and self._relax_items:
+                self.layout_engine.reheat_items(self._relax_items, hops=self.incremental_hops)
+            self._relax_items.clear()
+            self._layout_dirty = False
+            if self.layout_thread is not None:
+                self._layout_generation = self.layout_thread.load(self.layout_engine)
+        fixed_items = self.scene.selectedItems() + list(self.pinned_nodes)
+        if self.scene.mouseGrabberItem():
+            fixed_items.append(self.scene.mouseGrabberItem())
+        self.layout_engine.set_fixed_items(fixed_items)
+        if self.layout_thread is not None:
+            self.layout_thread.set_fixed_rows(np.flatnonzero(~self.layout_engine.movable).tolist())
+
+    def apply_layout_positions(self, rows):
+        """
+        Move the items of the given layout engine rows to their positions in the engine.
+
+        Edges connected to the moved nodes are adjusted once after all the nodes have been placed,
+        instead of once per moved end.
+        """
+        items = self.layout_engine.items
+        self.move_items([items[row] for row in rows], self.layout_engine.positions[rows])
+
+    def move_items(self, nodes, positions):
+        """
+        Move the node items to the (len(nodes), 2) positions array in a single geometry update pass.
+
+        Every edge connected to the moved nodes is adjusted once, after all the nodes have been placed.
+        """
+        edges = set()
+        self.batch_geometry_update = True
+        try:
+            for node, (x, y) in zip(nodes, positions):
+                node.setPos(x, y)
+                edges.update(node.edges())
+        finally:
+            self.batch_geometry_update = False
+        if self.stats is not None:
+            start = time.time()
+        for edge in edges:
+            edge.adjust()
+        self.invalidate_layers()
+        if self.stats is not None:
+            self.stats.add(FrameStats.GEOMETRY, time.time() - start)
+        self.scene_changing()
+
+    def set_instrumentation(self, enabled, hud=None, window=120):
+        """
+        Record the time spent in the simulation, the geometry updates and the painting of every frame.
+
+        The timings are available with instrumentation_stats and sent with frame_stats after every
+        painted frame. While disabled the widget only checks that stats is None.
+
+        Parameters
+        ----------
+        enabled : bool
+        hud : bool
+            Show the timings over the view. The current setting is kept if None.
+        window : int
+            Number of frames the statistics are computed over.
+        """
+        if enabled and self.stats is None:
+            self.stats = FrameStats(window)
+        elif not enabled:
+            self.stats = None
+        if hud is not None:
+            self.hud_visible = hud
+        if self.stats is not None and self.hud_visible:
+            self._hud_timer.start()
+        else:
+            self._hud_timer.stop()
+        self.viewport().update()
+
+    def set_hud_visible(self, visible):
+        self.set_instrumentation(self.stats is not None, hud=visible)
+
+    def instrumentation_stats(self):
+        """
+        Summary of the timings of the last frames (see FrameStats.summary), None if disabled.
+        """
+        if self.stats is None:
+            return None
+        return self.stats.summary()
+
+    def _graph_counts(self):
+        # number_of_edges walks all the nodes, so it's only counted again when the graph changes
+        version, edges = self._edge_count
+        if version != self.graph_version:
+            edges = self.nx_graph.number_of_edges()
+            self._edge_count = (self.graph_version, edges)
+        return dict(nodes=len(self.nx_graph), edges=edges)
+
+    def _update_hud(self):
+        self.viewport().update(self._hud_rect().toAlignedRect())
+
+    def _hud_rect(self):
+        line_height = QFontMetrics(self.font()).height()
+        return QRectF(4, 4, 320, line_height * 6 + 8)
+
+    def paintEvent(self, event):
+        if self.stats is None or self._hud_rect().toAlignedRect().contains(event.rect()):
+            # Repaints of the overlay alone aren't frames of the graph
+            return super(QNetworkxWidget, self).paintEvent(event)
+        start = time.time()
+        super(QNetworkxWidget, self).paintEvent(event)
+        frame = self.stats.end_frame(time.time() - start, **self._graph_counts())
+        self.frame_stats.emit(frame)
+
+    def drawForeground(self, painter, rect):
+        super(QNetworkxWidget, self).drawForeground(painter, rect)
+        if self.stats is None or not self.hud_visible:
+            return
+        hud_rect = self._hud_rect()
+        line_height = QFontMetrics(self.font()).height()
+        painter.save()
+        # The overlay is drawn in viewport coordinates, whatever the zoom
+        painter.resetTransform()
+        painter.fillRect(hud_rect, QColor(60, 60, 60, 200))
+        painter.setPen(Qt.white)
+        painter.setFont(self.font())
+        for row, line in enumerate(self.stats.hud_lines()):
+            painter.drawText(QPointF(hud_rect.left() + 6, hud_rect.top() + 4 + line_height * (row + 1)), line)
+        painter.restore()
+
+    def set_scene_index(self, mode, settle_delay=None, leaf_size=None):
+        """
+        Select how the scene indexes its items for hit testing, rubber band selection and culling.
+
+        Parameters
+        ----------
+        mode : str
+            INDEX_ADAPTIVE drops the index while the nodes move (animation, transitions, drags) and
+            builds a BSP tree once they have been still for settle_delay milliseconds. INDEX_BSP always
+            keeps the BSP tree and INDEX_NONE never indexes the items.
+        settle_delay : int
+            Milliseconds without moves before the BSP tree is built. The current one is kept if None.
+        leaf_size : int
+            Items per leaf used to choose the depth of the BSP tree. The current one is kept if None.
+        """
+        if mode not in (INDEX_ADAPTIVE, INDEX_BSP, INDEX_NONE):
+            raise Exception("Index mode must be one of %s, %s or %s" % (INDEX_ADAPTIVE, INDEX_BSP, INDEX_NONE))
+        self.index_mode = mode
+        if settle_delay is not None:
+            self.index_settle_delay = settle_delay
+            self._index_timer.setInterval(settle_delay)
+        if leaf_size is not None:
+            self.index_leaf_size = leaf_size
+        self._index_timer.stop()
+        if mode == INDEX_NONE:
+            self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        elif mode == INDEX_BSP:
+            self.build_scene_index()
+        else:
+            self.scene_changing()
+
+    def scene_changing(self):
+        """
+        Called when items move or are added: with the adaptive index the BSP tree is dropped, as every
+        move would update it, and is built again when the scene has been still for index_settle_delay.
+        """
+        if self.index_mode != INDEX_ADAPTIVE:
+            return
+        if self.scene.itemIndexMethod() != QGraphicsScene.NoIndex:
+            self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        self._index_timer.start()
+
+    def build_scene_index(self):
+        """
+        Index the items in a BSP tree with a depth that leaves about index_leaf_size items per leaf.
+        """
+        if self.index_mode == INDEX_NONE:
+            return
+        depth = bsp_tree_depth(len(self.scene.items()), self.index_leaf_size)
+        if self.scene.itemIndexMethod() != QGraphicsScene.BspTreeIndex:
+            self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+        if self.scene.bspTreeDepth() != depth:
+            self.scene.setBspTreeDepth(depth)
+
+    def invalidate_layers(self):
+        """
+        Make the edge and node layers, if enabled, pick up the new node positions and sizes.
+        """
+        if self.edge_layer is not None:
+            self.edge_layer.invalidate_geometry()
+        if self.node_layer is not None:
+            self.node_layer.invalidate_geometry()
+
+    def set_node_layer(self, enabled):
+        """
+        Paint all the nodes with a single QNodeLayerItem, grouped by profile, shape and state.
+
+        The node items are kept for selection, dragging and hit testing, but they stop painting
+        themselves and their device coordinate cache is disabled.
+        """
+        if enabled and self.node_layer is None:
+            self.node_layer = QNodeLayerItem(self)
+            self.scene.addItem(self.node_layer)
+            self.scene.sceneRectChanged.connect(self.node_layer.scene_rect_changed)
+            cache_mode = QGraphicsItem.NoCache
+        elif not enabled and self.node_layer is not None:
+            self.scene.sceneRectChanged.disconnect(self.node_layer.scene_rect_changed)
+            self.scene.removeItem(self.node_layer)
+            self.node_layer = None
+            cache_mode = QGraphicsItem.DeviceCoordinateCache
+        else:
+            return
+        for label, data in self.nx_graph.nodes(data=True):
+            data['item'].setCacheMode(cache_mode)
+            data['item'].update()
+
+    def set_edge_layer(self, enabled):
+        """
+        Draw the straight edges with a single QEdgeLayerItem instead of one QEdgeGraphicItem each.
+
+        The existing edges are moved to (or from) the layer. Edges of the layer have no label and share
+        the context menu of the layer; self loops always keep their own item. The 'item' attribute of
+        the edges in the layer is None.
+        """
+        if enabled and self.edge_layer is None:
+            self.edge_layer = QEdgeLayerItem(self, graph_config['default'].EdgeConfig)
+            self.scene.addItem(self.edge_layer)
+            self.scene.sceneRectChanged.connect(self.edge_layer.scene_rect_changed)
+            for label1, label2, data in self.nx_graph.edges(data=True):
+                edge = data['item']
+                if edge is not None and edge.source is not edge.dest:
+                    self.scene.removeItem(edge)
+                    edge.source.edgeList.remove(edge)
+                    edge.dest.edgeList.remove(edge)
+                    data['item'] = None
+                    self.edge_layer.add_edge((label1, label2), edge.source, edge.dest)
+        elif not enabled and self.edge_layer is not None:
+            layer = self.edge_layer
+            self.edge_layer = None
+            for (label1, label2), source, dest in layer.edges():
+                edge = QEdgeGraphicItem(first_node=source, second_node=dest, directed=self.is_directed,
+                                        label_visible=True)
+                self.nx_graph[label1][label2]['item'] = edge
+                self.scene.addItem(edge)
+            self.scene.sceneRectChanged.disconnect(layer.scene_rect_changed)
+            self.scene.removeItem(layer)
+
+    def set_incremental_placement(self, enabled, hops=None):
+        """
+        Place the nodes added to a graph that is already laid out without disturbing the rest of it.
+
+        A new node starts at the barycenter of its neighbours as its edges are added, and only the nodes
+        at most hops edges away from the inserted nodes and edges are relaxed by the animation. The rest
+        of the graph stays frozen, so the simulated part of each insertion doesn't grow with the graph.
+
+        Parameters
+        ----------
+        enabled : bool
+        hops : int
+            Size, in edges, of the relaxed neighbourhood. The current one is kept if None.
+        """
+        self.incremental_placement = enabled
+        if hops is not None:
+            self.incremental_hops = hops
+        if not enabled:
+            self._fresh_nodes.clear()
+            self._relax_items.clear()
+
+    def _place_at_barycenter(self, node, node_label):
+        """
+        Move a new node to the barycenter of its neighbours that already have a position.
+        """
+        positions = []
+        for neighbour_label in self.nx_graph.neighbors(node_label):
+            neighbour = self.nx_graph.node[neighbour_label]['item']
+            if neighbour is not node and self._fresh_nodes.get(neighbour, True):
+                positions.append((neighbour.pos().x(), neighbour.pos().y()))
+        if positions:
+            x, y = np.mean(positions, axis=0)
+            # Small offset so the node is not on top of a single neighbour
+            self.move_items([node], [(x + uniform(-10, 10), y + uniform(-10, 10))])
+            self._fresh_nodes[node] = True
+
+    def _schedule_relaxation(self):
+        if not self._fresh_nodes and not self._relax_items:
+            QTimer.singleShot(0, self._relax_insertions)
+
+    def _relax_insertions(self):
+        """
+        Close the current batch of insertions and relax their neighbourhood if the graph is animated.
+        """
+        self._fresh_nodes.clear()
+        if self._relax_items and self.animating:
+            self.start_layout()
+
+    @staticmethod
+    def node_label(label):
+        """
+        Unicode label the node of label (a string, QString or any other object) has in nx_graph.
+        """
+        if isinstance(label, unicode):
+            return label
+        if PYQT4 and isinstance(label, QString):
+            return unicode(label.toUtf8(), encoding="UTF-8")
+        return unicode(str(label), encoding="UTF-8")
+
+    def _create_node(self, node_label, region=None):
+        node = QNodeGraphicItem(self, node_label)
+        node.label.setVisible(self.labels_shown)
+        if self.node_layer is not None:
+            node.setCacheMode(QGraphicsItem.NoCache)
+        self.nx_graph.add_node(node_label, item=node, confiner=region)
+        self.register_node_item(node_label, node)
+        return node
+
+    def _begin_bulk_update(self):
+        """
+        Stop the scene signals, the scene index and the edge adjusts until _end_bulk_update.
+        """
+        self.batch_geometry_update = True
+        self.scene.blockSignals(True)
+        if self.scene.itemIndexMethod() != QGraphicsScene.NoIndex:
+            self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+
+    def _end_bulk_update(self):
+        self.batch_geometry_update = False
+        self.scene.blockSignals(False)
+        self.scene.sceneRectChanged.emit(self.scene.sceneRect())
+        if self.index_mode == INDEX_BSP:
+            self.build_scene_index()
+        else:
+            self.scene_changing()
+
+    def add_nodes_from(self, labels, positions=None, region=None):
+        """
+        Add many nodes at once. Labels already in the graph are skipped.
+
+        The items are added with the scene signals and index suspended, and the layout and layers are
+        invalidated once for all of them.
+
+        Parameters
+        ----------
+        labels : iterable
+            Labels of the new nodes.
+        positions : dict
+            Pixel positions (x, y) keyed by label. Nodes without one keep the default position.
+        region :
+            Confiner of all the new nodes.
+
+        Returns
+        -------
+        list
+            Unicode labels of the added nodes.
+        """
+        added = []
+        unplaced = []
+        self._begin_bulk_update()
+        try:
+            for label in labels:
+                node_label = self.node_label(label)
+                if node_label in self.nx_graph:
+                    continue
+                node = self._create_node(node_label, region)
+                self.scene.addItem(node)
+                position = positions.get(label) if positions else None
+                if position is not None:
+                    node.setPos(QPointF(position[0], position[1]))
+                else:
+                    unplaced.append(node)
+                added.append(node_label)
+        finally:
+            self._end_bulk_update()
+        if not added:
+            return added
+        if self.incremental_placement:
+            self._schedule_relaxation()
+            for node in unplaced:
+                self._fresh_nodes[node] = False
+                self._relax_items.add(node)
+                node.animate_node(self.animating)
+        if self.node_layer is not None:
+            self.node_layer.invalidate_structure()
+        self.graph_version += 1
+        self.invalidate_layout()
+        return added
+
+    def add_edges_from(self, edges, label_visible=True):
+        """
+        Add many edges at once. Edges already in the graph are skipped.
+
+        Both ends of every edge must be in the graph, which is checked before any edge is added. The
+        edge items are created with the scene signals and index suspended and every one of them is
+        adjusted once, after all of them have been added.
+
+        Parameters
+        ----------
+        edges : iterable
+            (label1, label2) or (label1, label2, edge label) tuples.
+        label_visible : bool
+
+        Returns
+        -------
+        list
+            (label1, label2) unicode labels of the added edges.
+        """
+        edge_labels = []
+        for edge in edges:
+            node1_label, node2_label = self.node_label(edge[0]), self.node_label(edge[1])
+            if node1_label not in self.node_items or node2_label not in self.node_items:
+                raise Exception("Nodes must be existing labels on the graph: %s, %s" % (node1_label, node2_label))
+            edge_labels.append((node1_label, node2_label, edge[2] if len(edge) > 2 else None))
+
+        added = []
+        new_items = []
+        self._begin_bulk_update()
+        try:
+            for node1_label, node2_label, label in edge_labels:
+                if self.nx_graph.has_edge(node1_label, node2_label):
+                    continue
+                node1 = self.node_items[node1_label]
+                node2 = self.node_items[node2_label]
+                if self.edge_layer is not None and node1 is not node2:
+                    edge = None
+                    self.edge_layer.add_edge((node1_label, node2_label), node1, node2)
+                else:
+                    edge = QEdgeGraphicItem(first_node=node1, second_node=node2, label=label,
+                                            directed=self.is_directed, label_visible=label_visible)
+                    self.scene.addItem(edge)
+                    new_items.append(edge)
+                self.nx_graph.add_edge(node1_label, node2_label, item=edge)
+                added.append((node1_label, node2_label))
+        finally:
+            self._end_bulk_update()
+        for edge in new_items:
+            edge.adjust()
+        if not added:
+            return added
+        if self.incremental_placement:
+            self._schedule_relaxation()
+            for node1_label, node2_label in added:
+                for node_label in (node1_label, node2_label):
+                    node = self.node_items[node_label]
+                    if node in self._fresh_nodes:
+                        self._place_at_barycenter(node, node_label)
+                    self._relax_items.add(node)
+        self.invalidate_layers()
+        self.graph_version += 1
+        self.invalidate_layout()
+        return added
+
     def add_node(self, label=None, position=None, region=None):
         if label is None:
-            node_label = u"Node %s" % len(self.nx_graph.nodes())
-        elif PYQT4 and isinstance(label, QString):
-             node_label = unicode(label.toUtf8(), encoding="UTF-8")
+            node_label = u"Node %s" % len(self.nx_graph)
         else:
-            node_label = unicode(str(label), encoding="UTF-8")
-        
-        if label not in self.nx_graph.nodes():
-            node = QNodeGraphicItem(self, node_label)
-            self.nx_graph.add_node(node_label, item=node, confiner=region)
+            node_label = self.node_label(label)
+
+        if node_label not in self.nx_graph:
+            node = self._create_node(node_label, region)
+            if self.node_layer is not None:
+                self.node_layer.invalidate_structure()
+            self.scene_changing()
             self.scene.addItem(node)
             if position and isinstance(position, tuple):
                 node.setPos(QPointF(position[0], position[1]))
+            elif self.incremental_placement:
+                self._schedule_relaxation()
+                self._fresh_nodes[node] = False
+                self._relax_items.add(node)
+                node.animate_node(self.animating)
+            self.graph_version += 1
+            self.invalidate_layout()
         else:
             # TODO: raise exception
             pass
 
     def remove_node(self, label=None):
-        if PYQT4 and isinstance(label, QString):
-            node_label = unicode(label.toUtf8(), encoding="UTF-8")
-        else:
-            node_label = unicode(str(label), encoding="UTF-8")
-
-        if label in self.nx_graph.nodes():
-            node_item = self.nx_graph.node[node_label]['item']
+        node_label = self.node_label(label)
+
+        if node_label in self.node_items:
+            node_item = self.node_items[node_label]
+            if self.incremental_placement:
+                self._schedule_relaxation()
+                self._relax_items.discard(node_item)
+                self._fresh_nodes.pop(node_item, None)
+                for neighbour_label in self.nx_graph.neighbors(node_label):
+                    if neighbour_label != node_label:
+                        self._relax_items.add(self.nx_graph.node[neighbour_label]['item'])
+            self.scene_changing()
             for edge in self.nx_graph.edges(node_label):
                 edge_item = self.nx_graph[edge[0]][edge[1]]['item']
-                self.scene.removeItem(edge_item)    
+                if edge_item is not None:
+                    self._detach_edge(edge_item)
+            if self.edge_layer is not None:
+                self.edge_layer.remove_node_edges(node_item)
+            if self.node_layer is not None:
+                self.node_layer.invalidate_structure()
             self.scene.removeItem(node_item)
             self.nx_graph.remove_node(node_label)
+            self.unregister_node_item(node_label)
+            self.graph_version += 1
+            self.invalidate_layout()
         else:
             # TODO: raise exception
             pass
 
     def get_node(self, label):
-        if label in self.nx_graph.nodes():
-            return self.nx_graph.node[str(label)]
+        node_label = self.node_label(label)
+        if node_label in self.node_items:
+            return self.nx_graph.node[node_label]
         else:
             return None
 
+    def _edge_end(self, node):
+        """
+        (label, item) of an edge end given as a label or a QNodeGraphicItem of the graph.
+        """
+        if isinstance(node, QNodeGraphicItem):
+            node_label = self.node_labels.get(node)
+        else:
+            node_label = self.node_label(node)
+        if node_label is None or node_label not in self.node_items:
+            raise Exception("Nodes must be existing labels on the graph or QNodeGraphicItem")
+        return node_label, self.node_items[node_label]
+
     def add_edge(self, label=None, first_node=None, second_node=None, node_tuple=None, label_visible=True):
         if node_tuple:
-            node1_label, node2_label = node_tuple
-            if not isinstance(node1_label, unicode):
-                node1_label = unicode(str(node1_label), encoding="UTF-8")
-            if not isinstance(node2_label, unicode):
-                node2_label = unicode(str(node2_label), encoding="UTF-8")
-            if node1_label in self.nx_graph.nodes() and node2_label in self.nx_graph.nodes():
-                node1 = self.nx_graph.node[node1_label]['item']
-                node2 = self.nx_graph.node[node2_label]['item']
-        elif first_node and second_node:
-            if isinstance(first_node, basestring) and first_node in self.nx_graph.nodes():
-                node1_label = first_node
-                node1 = self.nx_graph.node[first_node]['item']
-            elif isinstance(first_node, QNodeGraphicItem):
-                node1 = first_node
-                node1_label = unicode(node1.label.toPlainText().toUtf8(), encoding="UTF-8")
-            elif PYQT4 and isinstance(first_node, QString):
-                node1_label = unicode(first_node.toUtf8(), encoding="UTF-8")
-                node1 = self.nx_graph.node[node1_label]['item']
-            else:
-                raise Exception("Nodes must be existing labels on the graph or QNodeGraphicItem")
-            if isinstance(second_node, basestring):
-                node2_label = second_node
-                node2 = self.nx_graph.node[second_node]['item']
-            elif isinstance(second_node, QNodeGraphicItem):
-                node2 = second_node
-                node2_label = unicode(node2.label.toPlainText().toUtf8(), encoding="UTF-8")
-            elif PYQT4 and isinstance(second_node, QString):
-                node2_label = unicode(second_node.toUtf8(), encoding="UTF-8")
-                node2 = self.nx_graph.node[node2_label]['item']
+            first_node, second_node = node_tuple[0], node_tuple[1]
+        node1_label, node1 = self._edge_end(first_node)
+        node2_label, node2 = self._edge_end(second_node)
+
+        if not self.nx_graph.has_edge(node1_label, node2_label):
+            if self.edge_layer is not None and node1 is not node2:
+                # Straight edges are drawn by the edge layer, without an item of their own
+                edge = None
             else:
-                raise Exception("Nodes must be existing labels on the graph or QNodeGraphicItem")
-
-        edge = QEdgeGraphicItem(first_node=node1, second_node=node2, label=label, directed=self.is_directed,
-                                label_visible=label_visible)
-        edge.adjust()
-        if edge and edge.label.toPlainText() not in self.nx_graph.edges():
+                edge = QEdgeGraphicItem(first_node=node1, second_node=node2, label=label, directed=self.is_directed,
+                                        label_visible=label_visible)
+                edge.adjust()
             self.nx_graph.add_edge(node1_label, node2_label, item=edge)
-            self.scene.addItem(edge)
+            self.scene_changing()
+            if edge is None:
+                self.edge_layer.add_edge((node1_label, node2_label), node1, node2)
+            else:
+                self.scene.addItem(edge)
+            if self.incremental_placement:
+                self._schedule_relaxation()
+                for node, node_label in ((node1, node1_label), (node2, node2_label)):
+                    if node in self._fresh_nodes:
+                        self._place_at_barycenter(node, node_label)
+                    self._relax_items.add(node)
+            self.graph_version += 1
+            self.invalidate_layout()
             # self.scene.addItem(edge.label)
 
+    def _detach_edge(self, edge):
+        """
+        Remove an edge item from the scene and from the edge lists of both its ends.
+        """
+        edge.source.edgeList.remove(edge)
+        if edge in edge.dest.edgeList:
+            edge.dest.edgeList.remove(edge)
+        self.scene.removeItem(edge)
+
+    def remove_edge(self, first_node, second_node):
+        """
+        Remove the edge between two nodes, given as labels or QNodeGraphicItem. Nothing is done if
+        there's no such edge.
+        """
+        node1_label, node1 = self._edge_end(first_node)
+        node2_label, node2 = self._edge_end(second_node)
+        if not self.nx_graph.has_edge(node1_label, node2_label):
+            return
+        edge = self.nx_graph[node1_label][node2_label]['item']
+        if edge is None:
+            if self.edge_layer is not None:
+                # The layer keeps the edge with its ends in the order they were added
+                self.edge_layer.remove_edge((node1_label, node2_label))
+                self.edge_layer.remove_edge((node2_label, node1_label))
+        else:
+            self._detach_edge(edge)
+        self.nx_graph.remove_edge(node1_label, node2_label)
+        if self.incremental_placement:
+            self._schedule_relaxation()
+            self._relax_items.update((node1, node2))
+        self.scene_changing()
+        self.invalidate_layers()
+        self.graph_version += 1
+        self.invalidate_layout()
+
+    def set_node_attributes(self, label, attributes):
+        """
+        Keep the attributes of a node of the user graph and apply the ones in node_attribute_setters to
+        its item. Only the attributes that changed since the last call are applied.
+
+        Parameters
+        ----------
+        label :
+            Label of the node.
+        attributes : dict
+            All the attributes of the node in the user graph.
+        """
+        data = self.nx_graph.node[self.node_label(label)]
+        previous = data.get('attributes', {})
+        node = data['item']
+        changed = False
+        for name, setter in self.node_attribute_setters.items():
+            if name in attributes and attributes[name] != previous.get(name):
+                getattr(node, setter)(attributes[name])
+                changed = True
+        data['attributes'] = dict(attributes)
+        if changed:
+            for edge in node.edges():
+                edge.adjust()
+            if self.node_layer is not None:
+                self.node_layer.invalidate_structure()
+            self.invalidate_layers()
+            self.invalidate_layout()
+
+    def set_edge_attributes(self, first_node, second_node, attributes):
+        """
+        Keep the attributes of an edge of the user graph. A 'label' attribute is the text of the edge
+        label.
+        """
+        node1_label, node1 = self._edge_end(first_node)
+        node2_label, node2 = self._edge_end(second_node)
+        data = self.nx_graph[node1_label][node2_label]
+        edge = data['item']
+        label = attributes.get('label')
+        if edge is not None and label is not None and label != data.get('attributes', {}).get('label'):
+            edge.label_text = unicode(label)
+            if edge._label is not None:
+                edge._label.setPlainText(edge.label_text)
+        data['attributes'] = dict(attributes)
+
     def keyPressEvent(self, event):
         key = event.key()
 
@@ -1192,17 +1926,24 @@ class QNetworkxWidget(QGraphicsView):
                 self.setDragMode(QGraphicsView.RubberBandDrag)
     
             super(QNetworkxWidget, self).mouseReleaseEvent(event)
+            if self.layout_thread is not None and not self._layout_dirty:
+                # The released node can be moved by the simulation again
+                self.update_layout_engine()
 
     def timerEvent(self, event):
-        items_moved = False
-        for label, data in self.nx_graph.nodes(data=True):
-            data['item'].calculate_forces()
-            if data['item'].advance():
-                items_moved = True
-
-        if not items_moved:
+        if self.stats is not None:
+            start = time.time()
+        self.update_layout_engine()
+        moved_rows = self.layout_engine.step(self.scene_bounds())
+        if self.stats is not None:
+            self.stats.add(FrameStats.SIMULATION, time.time() - start)
+        if len(moved_rows):
+            self.apply_layout_positions(moved_rows)
+        if self.layout_engine.converged or not len(moved_rows):
             self.killTimer(self.timer_id)
             self.timer_id = 0
+            if self.layout_engine.iteration:
+                self.layout_converged.emit(self.layout_engine.iteration, self.layout_engine.energy)
 
     def wheelEvent(self, event):
         self.scale_view(math.pow(2.0, -event.delta() / 240.0))
@@ -1213,6 +1954,11 @@ class QNetworkxWidget(QGraphicsView):
         self.resize_scene()
         if self.particle_background:
             self.particle_background.recalculate_new_pos()
+        self.viewport_changed.emit()
+
+    def scrollContentsBy(self, dx, dy):
+        super(QNetworkxWidget, self).scrollContentsBy(dx, dy)
+        self.viewport_changed.emit()
 
     def resize_scene(self):
         if self.panning_mode:
@@ -1254,17 +2000,24 @@ class QNetworkxWidget(QGraphicsView):
                               QPen(Qt.white), QBrush(Qt.SolidPattern))
 
     def set_node_size(self, size):
+        # The layout engine reads the new sizes when it's loaded again
         for label, data in self.nx_graph.nodes(data=True):
             data['item'].set_size(size)
         for label1, label2, data in self.nx_graph.edges(data=True):
-            data['item'].adjust()
+            if data['item'] is not None:
+                data['item'].adjust()
+        self.invalidate_layers()
+        self.invalidate_layout()
 
     def animate_nodes(self, animate):
+        self.animating = bool(animate)
         for label, data in self.nx_graph.nodes(data=True):
             data['item'].animate_node(animate)
-            if animate:
-                data['item'].calculate_forces()
-                data['item'].advance()
+        self.invalidate_layout()
+        if animate:
+            self.item_moved()
+        elif self.layout_thread is not None:
+            self.layout_thread.stop()
 
     def stop_animation(self):
         self.animate_nodes(False)
@@ -1272,17 +2025,90 @@ class QNetworkxWidget(QGraphicsView):
     def start_animation(self):
         self.animate_nodes(True)
 
-    def set_node_positions(self, position_dict):
+    def set_node_positions(self, position_dict, animated=None):
+        """
+        Move the nodes to new positions.
+
+        Parameters
+        ----------
+        position_dict : dict
+            Pixel positions keyed by node label.
+        animated : bool
+            Tween the nodes from their current positions for transition_frames frames instead of moving
+            them at once. True if None and transition_frames is not 0.
+        """
+        nodes = []
+        positions = []
         for node_str, position in position_dict.items():
             if not isinstance(node_str, unicode):
                 node_str = unicode(str(node_str), encoding="UTF-8")
-            if node_str in self.nx_graph.nodes():
-                node = self.nx_graph.node[node_str]['item']
-                node.setPos(position[0], position[1])
-                node.update()
-                for edge in node.edges():
-                    edge.adjust()
-                    edge.update()
+            if node_str in self.nx_graph:
+                nodes.append(self.nx_graph.node[node_str]['item'])
+                positions.append((position[0], position[1]))
+        positions = np.array(positions, dtype=float).reshape(-1, 2)
+        if animated is None:
+            animated = self.transition_frames > 0
+        self.stop_transition(restart_layout=False)
+        if animated and len(nodes) and self.transition_frames > 0:
+            if self.timer_id:
+                self.killTimer(self.timer_id)
+                self.timer_id = 0
+            if self.layout_thread is not None:
+                self.layout_thread.stop()
+            start = np.array([(node.pos().x(), node.pos().y()) for node in nodes])
+            self._transition = (nodes, start, positions, 0)
+            self._transition_timer.start(self.transition_interval)
+        else:
+            # The edges are adjusted here, and the layout restarted once for the whole graph
+            self.move_items(nodes, positions)
+            self.invalidate_layout()
+            self.start_layout()
+
+    def set_transition(self, frames, interval=None):
+        """
+        Configure the animated transitions of set_node_positions.
+
+        Parameters
+        ----------
+        frames : int
+            Number of frames of a transition. 0 moves the nodes at once.
+        interval : int
+            Milliseconds between two frames. The current one is kept if None.
+        """
+        self.transition_frames = max(0, int(frames))
+        if interval is not None:
+            self.transition_interval = interval
+
+    def stop_transition(self, restart_layout=True):
+        """
+        Finish the running transition, if any, leaving the nodes at their final positions.
+
+        Parameters
+        ----------
+        restart_layout : bool
+            Start the layout again from the final positions, as at the end of the transition.
+        """
+        if self._transition is None:
+            return
+        nodes, start, end, frame = self._transition
+        self._transition = None
+        self._transition_timer.stop()
+        self.move_items(nodes, end)
+        if restart_layout:
+            self.invalidate_layout()
+            self.start_layout()
+
+    def _transition_step(self):
+        nodes, start, end, frame = self._transition
+        frame += 1
+        progress = float(frame) / self.transition_frames
+        if progress >= 1:
+            self.stop_transition()
+            return
+        # Smoothstep easing, so the nodes accelerate and stop softly
+        eased = progress * progress * (3 - 2 * progress)
+        self._transition = (nodes, start, end, frame)
+        self.move_items(nodes, start + (end - start) * eased)
 
     def resize_nodes_to_minimum_label_width(self):
         node_label_width_list = []
@@ -1300,6 +2126,60 @@ class QNetworkxWidget(QGraphicsView):
 
         self.scale(scale_factor, scale_factor)
         self.resize_scene()
+        self.update_level_of_detail()
+        self.viewport_changed.emit()
+
+    def level_of_detail(self):
+        """
+        Current zoom of the view, as used by the items to choose how much detail they paint.
+        """
+        return QStyleOptionGraphicsItem.levelOfDetailFromTransform(self.transform())
+
+    def set_level_of_detail_thresholds(self, dots=None, hairlines=None, labels=None):
+        """
+        Configure the zoom levels where the detail of the graph is reduced.
+
+        Parameters
+        ----------
+        dots : float
+            Under this level the nodes are drawn as flat dots.
+        hairlines : float
+            Under this level the edges are drawn as hairlines without arrowheads.
+        labels : float
+            Under this level the labels of nodes and edges are hidden.
+
+        The parameters that are None keep their current value. 0 disables a reduction.
+        """
+        if dots is not None:
+            self.lod_dot_threshold = dots
+        if hairlines is not None:
+            self.lod_hairline_threshold = hairlines
+        if labels is not None:
+            self.lod_label_threshold = labels
+        self.update_level_of_detail()
+        self.scene.update()
+
+    def set_edge_labels_visible(self, visible):
+        """
+        Show or hide the labels of all the edges with an item. The label items are created when first shown.
+        """
+        for label1, label2, data in self.nx_graph.edges(data=True):
+            if data['item'] is not None:
+                data['item'].set_label_visible(visible)
+
+    def update_level_of_detail(self):
+        """
+        Show or hide the labels when the zoom crosses lod_label_threshold.
+        """
+        labels_shown = self.level_of_detail() >= self.lod_label_threshold
+        if labels_shown == self.labels_shown:
+            return
+        self.labels_shown = labels_shown
+        for label, data in self.nx_graph.nodes(data=True):
+            data['item'].label.setVisible(labels_shown)
+        for label1, label2, data in self.nx_graph.edges(data=True):
+            if data['item'] is not None:
+                data['item'].set_label_visible(data['item'].label_visible)
 
     def add_context_menu(self, options, related_classes=["graph"]):
         """
@@ -1318,7 +2198,10 @@ class QNetworkxWidget(QGraphicsView):
                 data['item'].add_context_menu(options)
         if "edges" in related_classes:
             for label1, label2, data in self.nx_graph.edges(data=True):
-                data['item'].add_context_menu(options)
+                if data['item'] is not None:
+                    data['item'].add_context_menu(options)
+            if self.edge_layer is not None:
+                self.edge_layer.add_context_menu(options)
         if "graph" in related_classes:
             for option_string, callback in options.items():
                 instance, method = callback
@@ -1327,11 +2210,25 @@ class QNetworkxWidget(QGraphicsView):
                 self.menu.addAction(action1)
 
     def delete_graph(self):
+        self._transition = None
+        self._transition_timer.stop()
+        self.scene_changing()
+        if self.virtual_scene is not None:
+            self.virtual_scene.clear()
         for label, data in self.nx_graph.nodes(data=True):
             self.scene.removeItem(data['item'])
         for label1, label2, data in self.nx_graph.edges(data=True):
-            self.scene.removeItem(data['item'])
+            if data['item'] is not None:
+                self.scene.removeItem(data['item'])
+        if self.edge_layer is not None:
+            self.edge_layer.clear()
+        if self.node_layer is not None:
+            self.node_layer.invalidate_structure()
         self.nx_graph.clear()
+        self.node_items.clear()
+        self.node_labels.clear()
+        self.graph_version += 1
+        self.invalidate_layout()
 
     def clear(self):
         self.delete_graph()
@@ -1351,6 +2248,12 @@ class QNetworkxWidget(QGraphicsView):
             super(QNetworkxWidget, self).contextMenuEvent(event)
             return
 
+        # Edges of the edge layer are not items, they are looked up under the cursor
+        if self.edge_layer is not None and \
+                self.edge_layer.exec_context_menu(self.mapToScene(event.pos()), event.globalPos()):
+            event.setAccepted(True)
+            return
+
         # if the user has right clicked in the background, this will pop up the general context menu
         if self.menu:
             if not self.selected_nodes():
@@ -1417,6 +2320,11 @@ class QNetworkxController(object):
         else:
             self.graph_widget = QNetworkxWidget(directed=True)
         self.graph = nx.Graph()
+        # Layout function used by set_graph when no initial positions are given
+        self.initial_layout = nx.circular_layout
+        self.virtual_scene = None
+        # ObservableGraph whose changes are applied to the widget, see observe_graph
+        self.observed_graph = None
         # self.node_positions = self.construct_the_graph()
 
     def print_something(self):
@@ -1426,24 +2334,166 @@ class QNetworkxController(object):
         self.delete_graph()
 
     def delete_graph(self):
+        self.stop_observing()
         self.graph_widget.delete_graph()
         self.graph = None
 
-    def set_graph(self, g, initial_pos=None):
+    def set_graph(self, g, initial_pos=None, virtualized=False):
+        """
+        Show the graph g in the widget.
+
+        Parameters
+        ----------
+        g : networkx.Graph
+        initial_pos : dict or callable
+            Positions keyed by node, or a layout function (like multilevel_layout or the ones of
+            networkx.drawing.layout) that is called with the graph. initial_layout is used if None.
+        virtualized : bool
+            Create graphic items only for the nodes and edges around the visible region, with a
+            QVirtualGraphScene, instead of for the whole graph. Meant for graphs too big to be animated.
+        """
+        self.stop_observing()
         self.graph = g
 
-        for node in self.graph.nodes():
-            self.graph_widget.add_node(node)
+        if virtualized:
+            if not initial_pos:
+                initial_pos = self.initial_layout
+            if callable(initial_pos):
+                initial_pos = initial_pos(self.graph)
+            if self.virtual_scene is None:
+                self.virtual_scene = QVirtualGraphScene(self.graph_widget)
+            self.virtual_scene.set_graph(self.graph, initial_pos)
+            return
+        if self.virtual_scene is not None:
+            self.virtual_scene.detach()
+            self.virtual_scene = None
 
-        for edge in self.graph.edges():
-            self.graph_widget.add_edge(node_tuple=edge)
+        self.graph_widget.add_nodes_from(self.graph.nodes())
+        self.graph_widget.add_edges_from(self.graph.edges())
 
         if not initial_pos:
-            initial_pos = nx.circular_layout(self.graph)
+            initial_pos = self.initial_layout
         if len(self.graph.nodes())>0:
+            if callable(initial_pos):
+                initial_pos = initial_pos(self.graph)
             initial_pos = self.graph_widget.networkx_positions_to_pixels(initial_pos)
             self.graph_widget.set_node_positions(initial_pos)
 
+    def sync_graph(self, g, initial_pos=None):
+        """
+        Show the graph g updating only what differs from the graph in the widget.
+
+        The nodes and edges missing in g are removed, the new ones are added and the changed attributes
+        (see QNetworkxWidget.node_attribute_setters) are applied. The nodes already shown keep their
+        items and positions. The widget shows a single edge for a pair of nodes, so with a directed g an
+        edge is kept while any of its two directions is in g.
+
+        Parameters
+        ----------
+        g : networkx.Graph
+        initial_pos : dict or callable
+            Positions of the nodes, or a layout function called with g, as in set_graph. Only the new
+            nodes are moved. Without them the new nodes are placed by the incremental placement of the
+            widget if it's enabled.
+
+        Returns
+        -------
+        dict
+            Labels of the changed elements, keyed by 'added_nodes', 'removed_nodes', 'changed_nodes',
+            'added_edges', 'removed_edges' and 'changed_edges'.
+
+        Examples
+        --------
+        Syncing the graph already shown changes nothing, whatever the direction of its edges:
+
+        >>> controller = QNetworkxController()
+        >>> g = nx.DiGraph([(1, 2), (3, 2), (2, 1)])
+        >>> controller.set_graph(g)
+        >>> [name for name, labels in controller.sync_graph(g).items() if labels]
+        []
+        """
+        widget = self.graph_widget
+        self.graph = g
+        directed = g.is_directed()
+        labels = dict((widget.node_label(node), node) for node in g.nodes())
+        changes = dict((name, []) for name in ('added_nodes', 'removed_nodes', 'changed_nodes', 'added_edges',
+                                               'removed_edges', 'changed_edges'))
+
+        for node_label in [node_label for node_label in widget.node_items if node_label not in labels]:
+            widget.remove_node(node_label)
+            changes['removed_nodes'].append(node_label)
+        for node1_label, node2_label in widget.nx_graph.edges():
+            node1, node2 = labels[node1_label], labels[node2_label]
+            if not g.has_edge(node1, node2) and not (directed and g.has_edge(node2, node1)):
+                widget.remove_edge(node1_label, node2_label)
+                changes['removed_edges'].append((node1_label, node2_label))
+
+        new_nodes = [node for node in g.nodes() if widget.node_label(node) not in widget.node_items]
+        positions = None
+        if new_nodes and initial_pos:
+            if callable(initial_pos):
+                initial_pos = initial_pos(g)
+            positions = widget.networkx_positions_to_pixels(initial_pos)
+        changes['added_nodes'] = widget.add_nodes_from(new_nodes, positions)
+        changes['added_edges'] = widget.add_edges_from(
+            [edge for edge in g.edges() if not widget.nx_graph.has_edge(widget.node_label(edge[0]),
+                                                                         widget.node_label(edge[1]))])
+
+        for node_label, node in labels.items():
+            if widget.nx_graph.node[node_label].get('attributes', {}) != g.node[node]:
+                widget.set_node_attributes(node_label, g.node[node])
+                changes['changed_nodes'].append(node_label)
+        synced_edges = set()
+        for node1, node2, attributes in g.edges(data=True):
+            node1_label, node2_label = widget.node_label(node1), widget.node_label(node2)
+            if directed:
+                # Both directions share the edge of the widget, it takes the attributes of the first one
+                if frozenset((node1_label, node2_label)) in synced_edges:
+                    continue
+                synced_edges.add(frozenset((node1_label, node2_label)))
+            if widget.nx_graph[node1_label][node2_label].get('attributes', {}) != attributes:
+                widget.set_edge_attributes(node1_label, node2_label, attributes)
+                changes['changed_edges'].append((node1_label, node2_label))
+        return changes
+
+    def observe_graph(self, g, initial_pos=None):
+        """
+        Show an ObservableGraph and apply its changes to the widget as they happen, without diffing it.
+
+        The graph is first synchronized with sync_graph. It's observed until another graph is set or
+        the graph is deleted.
+        """
+        self.stop_observing()
+        self.sync_graph(g, initial_pos)
+        self.observed_graph = g
+        g.add_listener(self.on_graph_event)
+
+    def stop_observing(self):
+        if self.observed_graph is not None:
+            self.observed_graph.remove_listener(self.on_graph_event)
+            self.observed_graph = None
+
+    def on_graph_event(self, event, *args):
+        widget = self.graph_widget
+        if event == NODE_ADDED:
+            widget.add_nodes_from([args[0]])
+            if args[1]:
+                widget.set_node_attributes(args[0], args[1])
+        elif event == NODE_REMOVED:
+            widget.remove_node(args[0])
+        elif event == NODE_CHANGED:
+            widget.set_node_attributes(args[0], args[1])
+        elif event == EDGE_ADDED:
+            widget.add_edges_from([(args[0], args[1])])
+            if args[2]:
+                widget.set_edge_attributes(args[0], args[1], args[2])
+        elif event == EDGE_REMOVED:
+            widget.remove_edge(args[0], args[1])
+        elif event == EDGE_CHANGED:
+            widget.set_edge_attributes(args[0], args[1], args[2])
+        elif event == GRAPH_CLEARED:
+            widget.delete_graph()
+
     def set_elements_context_menus(self, options_dict, elements):
         self.graph_widget.add_context_menu(options_dict, elements)
 
@@ -1519,6 +2569,10 @@ class QNetworkxWindowExample(QMainWindow):
         self.animation_checkbox = QCheckBox("Animate graph")
         self.horizontal_layout.addWidget(self.animation_checkbox)
         self.animation_checkbox.stateChanged.connect(self.graph_widget.animate_nodes)
+        self.edge_labels_checkbox = QCheckBox("Edge labels")
+        self.edge_labels_checkbox.setChecked(True)
+        self.horizontal_layout.addWidget(self.edge_labels_checkbox)
+        self.edge_labels_checkbox.toggled.connect(self.graph_widget.set_edge_labels_visible)
         self.graph_model = nx.complete_graph(10)
         # self.graph_model.add_edge(1,1)
         initial_positions = nx.circular_layout(self.graph_model)
@@ -1526,14 +2580,31 @@ class QNetworkxWindowExample(QMainWindow):
         self.graph_widget.animate_nodes(self.animation_checkbox.checkState())
         current_width = self.graph_widget.resize_nodes_to_minimum_label_width()
         self.slider.setValue(current_width)
+        # Layout changes are tweened over half a second
+        self.graph_widget.set_transition(30)
 
         self.layouts_combo = QComboBox()
         for layout_method in dir(ly):
             if "_layout" in layout_method and callable(getattr(ly, layout_method)) and layout_method[0] != '_':
                 self.layouts_combo.addItem(layout_method)
+        self.extra_layouts = {"multilevel_layout": multilevel_layout}
+        self.layout_cache = LayoutCache()
+        for layout_method in sorted(self.extra_layouts):
+            self.layouts_combo.addItem(layout_method)
         self.main_layout.addWidget(self.layouts_combo)
         self.layouts_combo.currentIndexChanged.connect(self.on_change_layout)
 
+        # Busy indicator of the layouts computed in the background
+        self.layout_progress = QProgressBar()
+        self.layout_progress.setRange(0, 0)
+        self.layout_progress.setVisible(False)
+        self.main_layout.addWidget(self.layout_progress)
+        self.layout_runner = QLayoutJobRunner(self)
+        self.layout_runner.busy_changed.connect(self.layout_progress.setVisible)
+        self.layout_runner.job_finished.connect(self.on_layout_computed)
+        self.layout_runner.job_failed.connect(self.on_layout_failed)
+        QApplication.instance().aboutToQuit.connect(self.layout_runner.close)
+
         a = {
             "Option 1": (self.network_controller, "print_something"),
             "option 2": (self.network_controller, "print_something")
@@ -1553,8 +2624,27 @@ class QNetworkxWindowExample(QMainWindow):
 
     def on_change_layout(self, index):
         item = self.layouts_combo.itemText(index)
-        layout_method = getattr(ly, str(item))
-        pos = layout_method(self.graph_model)
+        layout_method = self.extra_layouts.get(str(item)) or getattr(ly, str(item))
+        key = self.layout_cache.key(self.graph_model, str(item))
+        pos = self.layout_cache.get(key)
+        if pos is not None:
+            self.layout_runner.cancel()
+            self.apply_layout(pos)
+        else:
+            # The stale job, if any, is cancelled by the new one
+            self.layout_runner.submit(layout_method, self.graph_model, str(item),
+                                      user_data=(key, self.graph_widget.graph_version))
+
+    def on_layout_computed(self, job_id, pos, user_data):
+        key, graph_version = user_data
+        self.layout_cache.put(key, pos)
+        if graph_version == self.graph_widget.graph_version:
+            self.apply_layout(pos)
+
+    def on_layout_failed(self, job_id, error):
+        QMessageBox.warning(self, "Layout failed", "The layout couldn't be computed:\n%s" % error)
+
+    def apply_layout(self, pos):
         pos = self.network_controller.graph_widget.networkx_positions_to_pixels(pos)
         self.graph_widget.set_node_positions(pos)
 
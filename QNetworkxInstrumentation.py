@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import time
+from collections import deque
+
+
+class FrameStats(object):
+    """
+    Timings of the last frames of a QNetworkxWidget.
+
+    The time spent in every section (simulation ticks, geometry updates of the items and painting) is
+    accumulated with add until the view is painted, which closes the frame with end_frame. The last
+    window frames are kept to compute the frames per second and the mean and maximum of every
+    section.
+
+    Parameters
+    ----------
+    window : int
+        Number of frames the summary is computed over.
+    """
+    SIMULATION = "simulation"
+    GEOMETRY = "geometry"
+    PAINT = "paint"
+    SECTIONS = (SIMULATION, GEOMETRY, PAINT)
+
+    def __init__(self, window=120):
+        self.window = window
+        self.frames = deque(maxlen=window)
+        self._pending = dict.fromkeys(self.SECTIONS, 0.0)
+        self._ticks = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def add(self, section, seconds):
+        self._pending[section] += seconds
+        if section == self.SIMULATION:
+            self._ticks += 1
+
+    def end_frame(self, paint_seconds, **counts):
+        """
+        Close the current frame, adding paint_seconds to its paint time.
+
+        Parameters
+        ----------
+        counts :
+            Item counts to keep with the frame, like nodes=100.
+
+        Returns
+        -------
+        dict
+            The frame: time (end of the frame), the seconds of every section, ticks (simulation steps
+            of the frame) and the counts.
+        """
+        self.add(self.PAINT, paint_seconds)
+        frame = dict(self._pending)
+        frame["time"] = time.time()
+        frame["ticks"] = self._ticks
+        frame.update(counts)
+        self.frames.append(frame)
+        self._pending = dict.fromkeys(self.SECTIONS, 0.0)
+        self._ticks = 0
+        return frame
+
+    def fps(self):
+        if len(self.frames) < 2:
+            return 0.0
+        elapsed = self.frames[-1]["time"] - self.frames[0]["time"]
+        if elapsed <= 0:
+            return 0.0
+        return (len(self.frames) - 1) / elapsed
+
+    def summary(self):
+        """
+        Statistics of the frames in the window.
+
+        Returns
+        -------
+        dict
+            fps, frames, the last item counts and, for every section, <section>_ms (mean milliseconds
+            per frame), <section>_max_ms and <section>_last_ms.
+        """
+        summary = {"fps": self.fps(), "frames": len(self.frames)}
+        for section in self.SECTIONS:
+            values = [frame[section] * 1000 for frame in self.frames] or [0.0]
+            summary["%s_ms" % section] = sum(values) / len(values)
+            summary["%s_max_ms" % section] = max(values)
+            summary["%s_last_ms" % section] = values[-1]
+        if self.frames:
+            last = self.frames[-1]
+            for name, value in last.items():
+                if name not in self.SECTIONS and name != "time":
+                    summary[name] = value
+        return summary
+
+    def hud_lines(self):
+        """
+        Summary as the text lines of the on screen overlay.
+        """
+        summary = self.summary()
+        lines = ["%.1f fps" % summary["fps"]]
+        for section in self.SECTIONS:
+            lines.append("%-10s %6.2f ms (max %6.2f)" % (section, summary["%s_ms" % section],
+                                                        summary["%s_max_ms" % section]))
+        if "nodes" in summary:
+            lines.append("%d nodes, %d edges" % (summary["nodes"], summary.get("edges", 0)))
+        return lines
+
+    def reset(self):
+        self.frames.clear()
+        self._pending = dict.fromkeys(self.SECTIONS, 0.0)
+        self._ticks = 0
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import logging
+import os
+import time
+from collections import OrderedDict
+
+try:
+    from PySide2.QtCore import QPointF, QRectF, QSizeF, Qt
+    from PySide2.QtGui import QColor, QFont, QStaticText, QTransform
+    from PySide2.QtWidgets import QApplication, QGraphicsItem, QGraphicsTextItem
+    PYQT4 = False
+except Exception as e:
+    from PyQt4.QtCore import QPointF, QRectF, QSizeF, QString, Qt
+    from PyQt4.QtGui import QApplication, QColor, QFont, QGraphicsItem, QGraphicsTextItem, QStaticText, \
+        QTransform
+    PYQT4 = True
+
+
+class LabelMetricsCache(object):
+    """
+    Shared cache of the laid out texts of the labels.
+
+    Every distinct (font, text) pair is laid out once into a QStaticText, which keeps its glyph runs, and
+    its size is measured once. Labels with the same text share the same QStaticText (it's implicitly
+    shared), so a graph with many repeated labels lays them out only once. The least recently used
+    entries are dropped when there are more than max_entries.
+
+    Parameters
+    ----------
+    max_entries : int
+        Number of laid out texts kept.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._default_font = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def default_font(self):
+        """
+        Font of the labels that don't set one, the application font when it's first needed.
+        """
+        if self._default_font is None:
+            self._default_font = QFont()
+        return self._default_font
+
+    def static_text(self, text, font=None):
+        """
+        Laid out text and its size.
+
+        Returns
+        -------
+        tuple
+            (QStaticText, QSizeF)
+        """
+        if font is None:
+            font = self.default_font()
+        key = (font.key(), text)
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            static_text = QStaticText(text)
+            static_text.setTextFormat(Qt.PlainText)
+            static_text.setPerformanceHint(QStaticText.AggressiveCaching)
+            static_text.prepare(QTransform(), font)
+            entry = (static_text, QSizeF(static_text.size()))
+            while len(self._entries) >= self.max_entries:
+                self._entries.popitem(last=False)
+        self._entries[key] = entry
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self._default_font = None
+
+
+label_metrics = LabelMetricsCache()
+
+
+class QStaticLabelItem(QGraphicsItem):
+    """
+    Lightweight replacement of QGraphicsTextItem for the node and edge labels.
+
+    A QGraphicsTextItem owns a full QTextDocument. This item only keeps its text, its color and an
+    optional font, and paints the QStaticText of the shared label_metrics cache. It has the part of the
+    QGraphicsTextItem interface used by the graph (toPlainText, setPlainText, setDefaultTextColor, font,
+    setFont) and the same document margin, so it's positioned like a QGraphicsTextItem would be.
+
+    Parameters
+    ----------
+    text : str
+    parent : QGraphicsItem
+    """
+    Type = QGraphicsItem.UserType + 5
+    Margin = 4
+
+    def __init__(self, text, parent=None):
+        super(QStaticLabelItem, self).__init__(parent)
+        self._text = unicode(text)
+        self._font = None
+        self._color = QColor(Qt.black)
+        self._size = label_metrics.static_text(self._text)[1]
+        self.setAcceptedMouseButtons(Qt.NoButton)
+
+    def type(self):
+        return QStaticLabelItem.Type
+
+    def toPlainText(self):
+        if PYQT4:
+            return QString(self._text)
+        return self._text
+
+    def setPlainText(self, text):
+        if PYQT4 and isinstance(text, QString):
+            text = unicode(text.toUtf8(), encoding="UTF-8")
+        self.prepareGeometryChange()
+        self._text = unicode(text)
+        self._size = label_metrics.static_text(self._text, self._font)[1]
+
+    def defaultTextColor(self):
+        return QColor(self._color)
+
+    def setDefaultTextColor(self, color):
+        self._color = QColor(color)
+        self.update()
+
+    def font(self):
+        return QFont(self._font if self._font is not None else label_metrics.default_font())
+
+    def setFont(self, font):
+        self.prepareGeometryChange()
+        self._font = QFont(font)
+        self._size = label_metrics.static_text(self._text, self._font)[1]
+
+    def boundingRect(self):
+        return QRectF(0, 0, self._size.width() + 2 * self.Margin, self._size.height() + 2 * self.Margin)
+
+    def paint(self, painter, option, widget):
+        if not self._text:
+            return
+        static_text = label_metrics.static_text(self._text, self._font)[0]
+        painter.setFont(self._font if self._font is not None else label_metrics.default_font())
+        painter.setPen(self._color)
+        painter.drawStaticText(QPointF(self.Margin, self.Margin), static_text)
+
+
+def _resident_memory():
+    """
+    Resident memory of the process in bytes (Linux), or the peak resident memory where /proc is missing.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def label_memory_benchmark(count=10000, label_class=QStaticLabelItem):
+    """
+    Memory and time needed to create count labels of label_class, with distinct texts as node labels.
+
+    Returns
+    -------
+    tuple
+        (bytes per label, seconds)
+    """
+    start_memory = _resident_memory()
+    start_time = time.time()
+    labels = []
+    for index in range(count):
+        label = label_class(u"Node %d" % index)
+        label.setDefaultTextColor(Qt.white)
+        label.boundingRect()
+        labels.append(label)
+    elapsed = time.time() - start_time
+    per_label = (_resident_memory() - start_memory) / float(count)
+    return per_label, elapsed
+
+
+if __name__ == '__main__':
+    import sys
+
+    app = QApplication(sys.argv)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    # The static labels are measured first, so the text items can't reuse memory they freed
+    for label_class in (QStaticLabelItem, QGraphicsTextItem):
+        per_label, elapsed = label_memory_benchmark(count, label_class)
+        print "%s: %d labels in %.2fs, %.0f bytes per label" % (label_class.__name__, count, elapsed, per_label)
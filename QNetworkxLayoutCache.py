@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import cPickle
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+
+
+def graph_fingerprint(graph):
+    """
+    Structural hash of a networkx graph: its nodes, its edges and whether it is directed.
+
+    Attributes are not taken into account, so two graphs with the same topology and node labels have the
+    same fingerprint and share their layouts.
+
+    Returns
+    -------
+    str
+        Hexadecimal sha1 digest.
+    """
+    digest = hashlib.sha1()
+    digest.update("directed" if graph.is_directed() else "undirected")
+    for node in sorted(repr(node) for node in graph.nodes()):
+        digest.update(node)
+        digest.update("\0")
+    edges = []
+    for first, second in graph.edges():
+        first, second = repr(first), repr(second)
+        if not graph.is_directed() and second < first:
+            first, second = second, first
+        edges.append("%s\1%s" % (first, second))
+    for edge in sorted(edges):
+        digest.update(edge)
+        digest.update("\0")
+    return digest.hexdigest()
+
+
+class LayoutCache(object):
+    """
+    Cache of layout results keyed by graph fingerprint, layout name and layout parameters.
+
+    The most recently used max_entries results are kept in memory and the least recently used one is
+    evicted when it is full. If directory is set, every result is also pickled there, so a topology laid
+    out in a previous session is loaded from disk instead of recomputed.
+
+    Parameters
+    ----------
+    max_entries : int
+        Number of layouts kept in memory.
+    directory : str
+        Folder of the on-disk store. No disk store if None.
+    """
+
+    def __init__(self, max_entries=32, directory=None):
+        self._logger = logging.getLogger("QNetworkxGraph.LayoutCache")
+        self._logger.setLevel(logging.CRITICAL)
+        self.max_entries = max_entries
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        if self.directory and not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries or (self.directory is not None and os.path.isfile(self._path(key)))
+
+    @staticmethod
+    def key(graph, layout_name, **parameters):
+        """
+        Cache key of the layout layout_name of graph with the given parameters.
+        """
+        digest = hashlib.sha1(graph_fingerprint(graph))
+        digest.update(layout_name)
+        for name, value in sorted(parameters.items()):
+            digest.update("\0%s=%r" % (name, value))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Positions stored for key, or None if they are not cached.
+        """
+        if key in self._entries:
+            positions = self._entries.pop(key)
+            self._entries[key] = positions
+            self.hits += 1
+            return dict(positions)
+        positions = self._load(key)
+        if positions is not None:
+            self.hits += 1
+            self._store(key, positions)
+            return dict(positions)
+        self.misses += 1
+        return None
+
+    def put(self, key, positions):
+        """
+        Store the positions dictionary of a layout in memory and, if enabled, on disk.
+        """
+        positions = dict(positions)
+        self._store(key, positions)
+        if self.directory is not None:
+            try:
+                with open(self._path(key), "wb") as store:
+                    cPickle.dump(positions, store, cPickle.HIGHEST_PROTOCOL)
+            except (IOError, OSError) as e:
+                self._logger.warning("Can't write the layout %s to disk: %s" % (key, e))
+
+    def layout(self, graph, layout_name, layout_function, **parameters):
+        """
+        Positions of layout_function(graph, **parameters), computed only if they are not cached.
+        """
+        key = self.key(graph, layout_name, **parameters)
+        positions = self.get(key)
+        if positions is None:
+            positions = layout_function(graph, **parameters)
+            self.put(key, positions)
+        return positions
+
+    def clear(self, disk=False):
+        """
+        Empty the memory cache, and the on-disk store too if disk is True.
+        """
+        self._entries.clear()
+        if disk and self.directory is not None:
+            for file_name in os.listdir(self.directory):
+                if file_name.endswith(".layout"):
+                    os.remove(os.path.join(self.directory, file_name))
+
+    def _store(self, key, positions):
+        self._entries.pop(key, None)
+        self._entries[key] = positions
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, "%s.layout" % key)
+
+    def _load(self, key):
+        if self.directory is None or not os.path.isfile(self._path(key)):
+            return None
+        try:
+            with open(self._path(key), "rb") as store:
+                return cPickle.load(store)
+        except Exception as e:
+            self._logger.warning("Can't read the layout %s from disk: %s" % (key, e))
+            return None
@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import logging
+
+import numpy as np
+
+from QNetworkxBarnesHut import barnes_hut_repulsion
+
+
+def exact_repulsion(positions, sizes, rows=None, max_block_elements=1 << 21):
+    """
+    All-pairs repulsion of the nodes in rows from every other node.
+
+    Same model as QNodeGraphicItem.calculate_forces: each node j pushes node i with
+    (p_i - p_j) * 7 * size_i / (2 * |p_i - p_j|^2). The pairs are evaluated in row blocks so the
+    temporary arrays never hold more than max_block_elements pairs.
+
+    Parameters
+    ----------
+    positions : numpy.ndarray
+        (N, 2) array with the positions of all the nodes.
+    sizes : numpy.ndarray
+        (N,) array with the size of every node.
+    rows : numpy.ndarray
+        Indices of the nodes the force is computed for. All of them if None.
+    max_block_elements : int
+        Maximum number of node pairs evaluated at once.
+
+    Returns
+    -------
+    numpy.ndarray
+        (len(rows), 2) array with the repulsion force of each requested node.
+    """
+    if rows is None:
+        rows = np.arange(len(positions))
+    forces = np.zeros((len(rows), 2))
+    if not len(rows):
+        return forces
+    block_size = max(1, max_block_elements // max(1, len(positions)))
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        delta = positions[block, np.newaxis, :] - positions[np.newaxis, :, :]
+        distance = 2.0 * np.einsum('ijk,ijk->ij', delta, delta)
+        with np.errstate(divide='ignore'):
+            inverse = np.where(distance > 0, 1.0 / distance, 0.0)
+        forces[start:start + len(block)] = np.einsum('ijk,ij->ik', delta, inverse) * \
+            (7.0 * sizes[block])[:, np.newaxis]
+    return forces
+
+
+def build_adjacency(edges, count):
+    """
+    Compressed sparse rows adjacency of an undirected edge list.
+
+    Returns
+    -------
+    tuple
+        (pointers, neighbours) so the neighbours of node i are neighbours[pointers[i]:pointers[i + 1]].
+        Every edge is listed for both of its ends.
+    """
+    both = np.concatenate((edges, edges[:, ::-1])).reshape(-1, 2)
+    order = np.argsort(both[:, 0], kind='mergesort')
+    neighbours = both[order, 1]
+    pointers = np.concatenate(([0], np.cumsum(np.bincount(both[:, 0], minlength=count)))).astype(np.intp)
+    return pointers, neighbours
+
+
+def neighbour_pairs(pointers, neighbours, rows):
+    """
+    All the (position in rows, neighbour) pairs of the nodes in rows for a build_adjacency adjacency.
+    """
+    counts = pointers[rows + 1] - pointers[rows]
+    owner = np.repeat(np.arange(len(rows)), counts)
+    starts = np.repeat(pointers[rows] - np.cumsum(counts) + counts, counts)
+    return owner, neighbours[starts + np.arange(len(owner))]
+
+
+def spring_attraction(positions, weights, mass_centers, pointers, neighbours, rows):
+    """
+    Spring attraction plus mass center pull of the nodes in rows.
+
+    Same model as QNodeGraphicItem.calculate_forces: every neighbour pulls node i with
+    (p_j - p_i) / weight_i and the mass center with 2 * (mass_center_i - p_i) / weight_i.
+    Only the edges of the requested nodes are visited.
+
+    Returns
+    -------
+    numpy.ndarray
+        (len(rows), 2) array with the attraction of each requested node.
+    """
+    owner, others = neighbour_pairs(pointers, neighbours, rows)
+    delta = positions[others] - positions[rows[owner]]
+    attraction = np.zeros((len(rows), 2))
+    for axis in (0, 1):
+        attraction[:, axis] = np.bincount(owner, weights=delta[:, axis], minlength=len(rows))
+    # Invisible node pulling to the mass center
+    attraction += (mass_centers[rows] - positions[rows]) * 2.0
+    return attraction / weights[rows, np.newaxis]
+
+
+class ForceLayoutEngine(object):
+    """
+    Force directed layout of a whole graph computed as array operations.
+
+    The engine keeps the positions, sizes, weights, mass centers and edges of the nodes in numpy
+    arrays and computes the repulsion, the spring attraction and the mass center pull of every node in
+    one batched step. It applies the same force model as QNodeGraphicItem.calculate_forces, but every
+    node of a tick is moved from the positions at its start, while the per item implementation moved
+    the items one by one, each seeing the ones already moved. The trajectories differ slightly.
+
+    Rows of the arrays follow the order of the items list. Use load_graph to (re)build the arrays from
+    a QNetworkxWidget graph and set_position to keep them in sync when a node is moved from outside.
+
+    The repulsion is the exact all-pairs sum by default. With repulsion_mode set to BARNES_HUT it is
+    approximated with a quadtree (see QNetworkxBarnesHut) using the opening angle theta.
+
+    Every node has a temperature that limits how far it can move in a tick and that decreases by
+    cooling_factor on every tick (simulated annealing). Nodes colder than min_temperature are frozen.
+    The energy of a tick is the sum of the squared displacements of the nodes. The layout has converged
+    when the mean squared displacement is below convergence_threshold, all the nodes are frozen or
+    max_iterations ticks have been done since the last reheat.
+    """
+    EXACT = "exact"
+    BARNES_HUT = "barnes_hut"
+
+    def __init__(self):
+        self._logger = logging.getLogger("QNetworkxGraph.ForceLayoutEngine")
+        self._logger.setLevel(logging.CRITICAL)
+        self.repulsion_mode = ForceLayoutEngine.EXACT
+        self.theta = 0.5
+        self.initial_temperature = 100.0
+        self.cooling_factor = 0.97
+        self.min_temperature = 0.05
+        self.convergence_threshold = 0.01
+        self.max_iterations = 2000
+        self.reheat_hops = 2
+        self.temperatures = np.zeros(0)
+        self.iteration = 0
+        self.energy = 0.0
+        self.converged = False
+        self.items = []
+        self.index = {}
+        self.positions = np.zeros((0, 2))
+        self.sizes = np.zeros(0)
+        self.weights = np.ones(0)
+        self.mass_centers = np.zeros((0, 2))
+        self.edges = np.zeros((0, 2), dtype=np.intp)
+        self.adjacency_pointers = np.zeros(1, dtype=np.intp)
+        self.adjacency = np.zeros(0, dtype=np.intp)
+        self.animated = np.zeros(0, dtype=bool)
+        self.movable = np.zeros(0, dtype=bool)
+
+    def __len__(self):
+        return len(self.items)
+
+    def load_graph(self, nx_graph, keep_temperatures=False):
+        """
+        Build the arrays from a graph whose nodes and edges have an 'item' attribute.
+
+        Parameters
+        ----------
+        nx_graph : networkx.Graph
+            Graph of a QNetworkxWidget.
+        keep_temperatures : bool
+            Keep the temperature of the items that were already loaded and freeze the new ones, instead
+            of reheating the whole graph. Used to relax only the surroundings of an insertion.
+        """
+        previous_temperatures = dict((item, self.temperatures[row]) for item, row in self.index.items()) \
+            if keep_temperatures else {}
+        labels = []
+        self.items = []
+        for label, data in nx_graph.nodes(data=True):
+            labels.append(label)
+            self.items.append(data['item'])
+        self.index = dict((item, row) for row, item in enumerate(self.items))
+        count = len(self.items)
+        self.positions = np.zeros((count, 2))
+        self.sizes = np.zeros(count)
+        self.weights = np.ones(count)
+        self.mass_centers = np.zeros((count, 2))
+        self.animated = np.zeros(count, dtype=bool)
+        for row, item in enumerate(self.items):
+            self.positions[row] = (item.pos().x(), item.pos().y())
+            self.sizes[row] = item.size
+            self.weights[row] = (nx_graph.degree(labels[row]) + 1) * item.size
+            self.mass_centers[row] = (item.mass_center.x(), item.mass_center.y())
+            self.animated[row] = bool(item.animate)
+        self.movable = self.animated.copy()
+        if keep_temperatures:
+            self.temperatures = np.array([previous_temperatures.get(item, 0.0) for item in self.items])
+        else:
+            self.temperatures = np.full(count, self.initial_temperature)
+        self.iteration = 0
+        self.converged = False
+
+        node_rows = dict((label, row) for row, label in enumerate(labels))
+        edges = [(node_rows[label1], node_rows[label2]) for label1, label2 in nx_graph.edges()]
+        self.set_edges(np.array(edges, dtype=np.intp).reshape(-1, 2))
+        self._logger.debug("Loaded %d nodes and %d edges" % (count, len(self.edges)))
+
+    def arrays(self):
+        """
+        Copy of the simulation state, without the items, that can be loaded with load_arrays.
+        """
+        return dict(positions=self.positions.copy(), sizes=self.sizes.copy(), weights=self.weights.copy(),
+                    mass_centers=self.mass_centers.copy(), edges=self.edges.copy(),
+                    animated=self.animated.copy(), temperatures=self.temperatures.copy())
+
+    def settings(self):
+        """
+        Parameters of the simulation, that can be applied to another engine with apply_settings.
+        """
+        return dict(repulsion_mode=self.repulsion_mode, theta=self.theta,
+                    initial_temperature=self.initial_temperature, cooling_factor=self.cooling_factor,
+                    min_temperature=self.min_temperature, convergence_threshold=self.convergence_threshold,
+                    max_iterations=self.max_iterations, reheat_hops=self.reheat_hops)
+
+    def apply_settings(self, settings):
+        self.set_repulsion_mode(settings.get('repulsion_mode', self.repulsion_mode), settings.get('theta'))
+        for name in ('initial_temperature', 'cooling_factor', 'min_temperature', 'convergence_threshold',
+                     'max_iterations', 'reheat_hops'):
+            if settings.get(name) is not None:
+                setattr(self, name, settings[name])
+
+    def load_arrays(self, positions, sizes, weights, mass_centers, edges, animated, temperatures=None):
+        """
+        Set the simulation state from arrays, as returned by arrays. The engine has no items then.
+        """
+        self.items = [None] * len(positions)
+        self.index = {}
+        self.positions = positions
+        self.sizes = sizes
+        self.weights = weights
+        self.mass_centers = mass_centers
+        self.animated = animated
+        self.movable = self.animated.copy()
+        if temperatures is None:
+            temperatures = np.full(len(positions), self.initial_temperature)
+        self.temperatures = temperatures
+        self.iteration = 0
+        self.converged = False
+        self.set_edges(edges)
+
+    def set_edges(self, edges):
+        self.edges = edges
+        self.adjacency_pointers, self.adjacency = build_adjacency(edges, len(self.positions))
+
+    def set_position(self, item, x, y):
+        row = self.index.get(item)
+        if row is not None:
+            self.positions[row] = (x, y)
+
+    def set_mass_center(self, item, x, y):
+        row = self.index.get(item)
+        if row is not None:
+            self.mass_centers[row] = (x, y)
+
+    def neighbourhood(self, rows, hops):
+        """
+        Rows of the nodes at most hops edges away from the nodes in rows, including them.
+        """
+        visited = np.zeros(len(self.positions), dtype=bool)
+        frontier = np.unique(np.asarray(rows, dtype=np.intp))
+        visited[frontier] = True
+        for hop in range(hops):
+            owner, others = neighbour_pairs(self.adjacency_pointers, self.adjacency, frontier)
+            frontier = np.unique(others[~visited[others]])
+            if not len(frontier):
+                break
+            visited[frontier] = True
+        return np.flatnonzero(visited)
+
+    def reheat(self, rows=None, temperature=None, hops=None):
+        """
+        Restart the simulation of some nodes.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            Rows of the nodes to reheat. Their neighbourhood of hops edges is reheated too, so the rest
+            of the graph stays frozen. All the nodes if None.
+        temperature : float
+            New temperature of the nodes. initial_temperature if None.
+        hops : int
+            Size of the reheated neighbourhood. reheat_hops if None.
+        """
+        if temperature is None:
+            temperature = self.initial_temperature
+        if hops is None:
+            hops = self.reheat_hops
+        if rows is None:
+            self.temperatures[:] = temperature
+        else:
+            rows = self.neighbourhood(rows, hops)
+            self.temperatures[rows] = np.maximum(self.temperatures[rows], temperature)
+        self.iteration = 0
+        self.converged = False
+
+    def reheat_items(self, items, temperature=None, hops=None):
+        rows = [self.index[item] for item in items if item in self.index]
+        if rows:
+            self.reheat(rows, temperature, hops)
+
+    def set_fixed_items(self, items):
+        """
+        Mark the nodes that can't be moved by the simulation on the next step.
+
+        Not animated nodes are always fixed. The rest are movable unless they are in items (usually the
+        selected nodes and the one grabbed by the mouse).
+        """
+        rows = [self.index[item] for item in items if item in self.index]
+        self.set_fixed_rows(rows)
+
+    def set_fixed_rows(self, rows):
+        self.movable = self.animated.copy()
+        self.movable[np.asarray(rows, dtype=np.intp)] = False
+
+    def compute_forces(self, rows=None):
+        """
+        Total velocity of the nodes in rows for the current positions.
+
+        Returns
+        -------
+        numpy.ndarray
+            (len(rows), 2) array.
+        """
+        if rows is None:
+            rows = np.arange(len(self.items))
+        rows = np.asarray(rows, dtype=np.intp)
+        return self.compute_repulsion(rows) + spring_attraction(self.positions, self.weights, self.mass_centers,
+                                                                self.adjacency_pointers, self.adjacency, rows)
+
+    def set_repulsion_mode(self, mode, theta=None):
+        if mode not in (ForceLayoutEngine.EXACT, ForceLayoutEngine.BARNES_HUT):
+            raise Exception("Repulsion mode must be ForceLayoutEngine.EXACT or ForceLayoutEngine.BARNES_HUT")
+        self.repulsion_mode = mode
+        if theta is not None:
+            self.theta = theta
+
+    def compute_repulsion(self, rows):
+        if self.repulsion_mode == ForceLayoutEngine.BARNES_HUT:
+            return barnes_hut_repulsion(self.positions, self.sizes, rows, self.theta)
+        return exact_repulsion(self.positions, self.sizes, rows)
+
+    def step(self, bounds=None):
+        """
+        Advance the simulation one tick.
+
+        Parameters
+        ----------
+        bounds : tuple
+            (left, top, right, bottom) rect where the nodes must stay. No limits if None.
+
+        Returns
+        -------
+        numpy.ndarray
+            Rows of the nodes whose position changed. Check converged to know if more steps are needed.
+        """
+        rows = np.flatnonzero(self.movable & (self.temperatures > self.min_temperature))
+        if not len(rows) or self.iteration >= self.max_iterations:
+            self.converged = True
+            return np.zeros(0, dtype=np.intp)
+        velocities = self.compute_forces(rows)
+
+        # The temperature limits the displacement of every node
+        length = np.sqrt((velocities * velocities).sum(axis=1))
+        too_fast = length > self.temperatures[rows]
+        velocities[too_fast] *= (self.temperatures[rows][too_fast] / length[too_fast])[:, np.newaxis]
+        self.temperatures[rows] *= self.cooling_factor
+
+        new_positions = self.positions[rows] + velocities
+        if bounds is not None:
+            left, top, right, bottom = bounds
+            new_positions[:, 0] = np.minimum(np.maximum(new_positions[:, 0], left + 10), right - 10)
+            new_positions[:, 1] = np.minimum(np.maximum(new_positions[:, 1], top + 10), bottom - 10)
+
+        displacement = new_positions - self.positions[rows]
+        self.energy = float((displacement * displacement).sum())
+        self.iteration += 1
+        self.converged = self.energy <= self.convergence_threshold * len(rows) or \
+            self.iteration >= self.max_iterations
+        if self.converged:
+            self.temperatures[rows] = 0.0
+
+        moved = (displacement != 0).any(axis=1)
+        rows = rows[moved]
+        self.positions[rows] = new_positions[moved]
+        return rows
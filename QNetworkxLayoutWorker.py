@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import logging
+
+try:
+    from PySide2.QtCore import QObject, QThread, QTimer, Signal, Slot
+except Exception as e:
+    from PyQt4.QtCore import QObject, QThread, QTimer, pyqtSignal as Signal, pyqtSlot as Slot
+
+from QNetworkxLayoutEngine import ForceLayoutEngine
+
+
+class QLayoutWorker(QObject):
+    """
+    Runs a ForceLayoutEngine with its own copy of the positions.
+
+    The worker lives in a QLayoutThread and must only be driven through queued signals. Every tick
+    publishes a copy of all the positions with positions_ready. Once the layout converges the worker
+    stops ticking and emits layout_stopped with the number of iterations and the final energy.
+
+    The generation number sent with load is returned with every snapshot, so the receiver can discard
+    snapshots of a graph that has already changed.
+    """
+    positions_ready = Signal(int, object)
+    layout_stopped = Signal(int, int, float)
+
+    def __init__(self, interval=1000 / 25):
+        super(QLayoutWorker, self).__init__()
+        self._logger = logging.getLogger("QNetworkxGraph.QLayoutWorker")
+        self._logger.setLevel(logging.CRITICAL)
+        self.engine = ForceLayoutEngine()
+        self.generation = 0
+        self.interval = interval
+        self.bounds = None
+        self.fixed_rows = []
+        self.timer = None
+
+    @Slot(int, object)
+    def load(self, generation, arrays):
+        self.generation = generation
+        self.engine.load_arrays(**arrays)
+        self.fixed_rows = []
+
+    @Slot(object)
+    def start(self, bounds):
+        self.bounds = bounds
+        if self.timer is None:
+            # Created here so it belongs to the worker thread
+            self.timer = QTimer(self)
+            self.timer.timeout.connect(self.tick)
+        if not self.timer.isActive():
+            self.timer.start(self.interval)
+
+    @Slot()
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+
+    @Slot(int, float, float)
+    def move_node(self, row, x, y):
+        if row < len(self.engine):
+            self.engine.positions[row] = (x, y)
+            self.engine.reheat([row])
+
+    @Slot(object)
+    def set_fixed_rows(self, rows):
+        self.fixed_rows = [row for row in rows if row < len(self.engine)]
+
+    @Slot(int, float, float)
+    def set_mass_center(self, row, x, y):
+        if row < len(self.engine):
+            self.engine.mass_centers[row] = (x, y)
+            self.engine.reheat([row])
+
+    @Slot(object)
+    def apply_settings(self, settings):
+        self.engine.apply_settings(settings)
+
+    def tick(self):
+        self.engine.set_fixed_rows(self.fixed_rows)
+        rows = self.engine.step(self.bounds)
+        if len(rows):
+            self.positions_ready.emit(self.generation, self.engine.positions.copy())
+        if self.engine.converged or not len(rows):
+            self.timer.stop()
+            self.layout_stopped.emit(self.generation, self.engine.iteration, self.engine.energy)
+
+
+class QLayoutThread(QObject):
+    """
+    Owns the thread of a QLayoutWorker and forwards the requests of the GUI thread to it.
+
+    All the methods can be called from the GUI thread. They are delivered to the worker as queued
+    signals, so they are handled between two ticks of the simulation.
+    """
+    positions_ready = Signal(int, object)
+    layout_stopped = Signal(int, int, float)
+
+    _load_requested = Signal(int, object)
+    _start_requested = Signal(object)
+    _stop_requested = Signal()
+    _move_requested = Signal(int, float, float)
+    _fixed_rows_requested = Signal(object)
+    _mass_center_requested = Signal(int, float, float)
+    _settings_requested = Signal(object)
+
+    def __init__(self, parent=None, interval=1000 / 25):
+        super(QLayoutThread, self).__init__(parent)
+        self.generation = 0
+        self._fixed_rows = None
+        self.thread = QThread()
+        self.worker = QLayoutWorker(interval)
+        self.worker.moveToThread(self.thread)
+
+        self._load_requested.connect(self.worker.load)
+        self._start_requested.connect(self.worker.start)
+        self._stop_requested.connect(self.worker.stop)
+        self._move_requested.connect(self.worker.move_node)
+        self._fixed_rows_requested.connect(self.worker.set_fixed_rows)
+        self._mass_center_requested.connect(self.worker.set_mass_center)
+        self._settings_requested.connect(self.worker.apply_settings)
+        self.worker.positions_ready.connect(self.positions_ready)
+        self.worker.layout_stopped.connect(self.layout_stopped)
+        self.thread.start()
+
+    def load(self, engine):
+        """
+        Send a copy of the state of engine to the worker. Returns the generation of the new state.
+        """
+        self.generation += 1
+        self._fixed_rows = None
+        self._load_requested.emit(self.generation, engine.arrays())
+        self._settings_requested.emit(engine.settings())
+        return self.generation
+
+    def start(self, bounds):
+        self._start_requested.emit(bounds)
+
+    def stop(self):
+        self._stop_requested.emit()
+
+    def move_node(self, row, x, y):
+        self._move_requested.emit(row, x, y)
+
+    def set_fixed_rows(self, rows):
+        rows = sorted(rows)
+        if rows != self._fixed_rows:
+            self._fixed_rows = rows
+            self._fixed_rows_requested.emit(rows)
+
+    def set_mass_center(self, row, x, y):
+        self._mass_center_requested.emit(row, x, y)
+
+    def apply_settings(self, settings):
+        self._settings_requested.emit(settings)
+
+    def shutdown(self):
+        self.stop()
+        self.thread.quit()
+        self.thread.wait()
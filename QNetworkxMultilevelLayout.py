@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import logging
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+_logger = logging.getLogger("QNetworkxGraph.QNetworkxMultilevelLayout")
+_logger.setLevel(logging.CRITICAL)
+
+
+def _graph_arrays(G):
+    nodes = G.nodes()
+    index = dict((node, row) for row, node in enumerate(nodes))
+    edges = np.array([(index[u], index[v]) for u, v in G.edges() if u != v], dtype=np.intp).reshape(-1, 2)
+    return nodes, edges
+
+
+def _handshake_matching(count, edges, weights, random, rounds=3):
+    """
+    Matching of the graph where every node proposes to its heaviest neighbour and mutual proposals win.
+
+    Returns
+    -------
+    numpy.ndarray
+        (count,) array with the node each one is matched to, or -1 for the unmatched ones.
+    """
+    match = np.full(count, -1, dtype=np.intp)
+    sources = np.concatenate((edges[:, 0], edges[:, 1]))
+    targets = np.concatenate((edges[:, 1], edges[:, 0]))
+    scores = np.concatenate((weights, weights))
+    for matching_round in range(rounds):
+        free = (match[sources] < 0) & (match[targets] < 0)
+        if not free.any():
+            break
+        round_sources = sources[free]
+        round_targets = targets[free]
+        # Random tie break, so equal weights don't always match the same nodes
+        round_scores = scores[free] + random.uniform(0, 1e-3, free.sum())
+        order = np.lexsort((round_scores, round_sources))
+        last = np.concatenate((round_sources[order][1:] != round_sources[order][:-1], [True]))
+        proposal = np.full(count, -1, dtype=np.intp)
+        proposal[round_sources[order][last]] = round_targets[order][last]
+        proposing = np.flatnonzero(proposal >= 0)
+        mutual = proposing[proposal[proposal[proposing]] == proposing]
+        match[mutual] = proposal[mutual]
+    return match
+
+
+def _coarsen(count, edges, weights, masses, random):
+    """
+    Collapse the graph through a handshake matching.
+
+    Edges are scored by weight / (mass_u * mass_v), so light clusters are merged first. Nodes left
+    unmatched (typically the leaves around a hub) join the cluster of their heaviest matched neighbour,
+    so graphs with hubs keep shrinking.
+
+    Returns
+    -------
+    tuple
+        (clusters, coarse_count, coarse_edges, coarse_weights, coarse_masses), clusters being the coarse
+        node of every fine node.
+    """
+    scores = weights / (masses[edges[:, 0]] * masses[edges[:, 1]])
+    match = _handshake_matching(count, edges, scores, random)
+    parent = np.arange(count)
+    matched = np.flatnonzero(match > np.arange(count))
+    parent[match[matched]] = matched
+
+    both = np.concatenate((edges, edges[:, ::-1]))
+    both_scores = np.concatenate((scores, scores))
+    joining = (match[both[:, 0]] < 0) & (match[both[:, 1]] >= 0)
+    if joining.any():
+        joining_edges = both[joining]
+        order = np.lexsort((both_scores[joining], joining_edges[:, 0]))
+        joining_edges = joining_edges[order]
+        last = np.concatenate((joining_edges[1:, 0] != joining_edges[:-1, 0], [True]))
+        parent[joining_edges[last, 0]] = parent[joining_edges[last, 1]]
+
+    roots, clusters = np.unique(parent, return_inverse=True)
+    coarse_count = len(roots)
+    coarse_masses = np.bincount(clusters, weights=masses, minlength=coarse_count)
+    coarse_edges = np.sort(clusters[edges], axis=1)
+    keep = coarse_edges[:, 0] != coarse_edges[:, 1]
+    keys = coarse_edges[keep, 0] * coarse_count + coarse_edges[keep, 1]
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    coarse_weights = np.bincount(inverse, weights=weights[keep], minlength=len(unique_keys))
+    coarse_edges = np.column_stack((unique_keys // coarse_count, unique_keys % coarse_count)).astype(np.intp)
+    return clusters, coarse_count, coarse_edges, coarse_weights, coarse_masses
+
+
+def _global_repulsion(positions, masses, k, max_block_elements=1 << 20):
+    """
+    All-pairs repulsion k^2 * mass_j / d of every node, computed in blocks of rows.
+    """
+    count = len(positions)
+    displacement = np.zeros((count, 2))
+    block = max(1, max_block_elements // count)
+    for start in range(0, count, block):
+        delta = positions[start:start + block, np.newaxis, :] - positions[np.newaxis, :, :]
+        distance = np.maximum((delta * delta).sum(axis=2), 1e-9)
+        displacement[start:start + block] = (delta * (k * k * masses / distance)[:, :, np.newaxis]).sum(axis=1)
+    return displacement
+
+
+def _refine(positions, edges, masses, k, iterations, temperature, global_repulsion, neighbours=8, refresh=5):
+    """
+    Fruchterman-Reingold iterations: springs of natural length k on the edges and k^2 * mass / d
+    repulsion, the mass being the number of finest nodes a node stands for (Walshaw's multilevel variant).
+
+    With global_repulsion all the pairs repel each other, otherwise every node is only pushed by its
+    closest neighbours within 2 * k (grid variant), which keeps the cost of the fine levels linear even
+    where the prolongation stacks many nodes together. The neighbours are searched every refresh
+    iterations.
+    """
+    count = len(positions)
+    for iteration in range(iterations):
+        if global_repulsion:
+            displacement = _global_repulsion(positions, masses, k)
+        else:
+            if iteration % refresh == 0:
+                # The closest node of every query is the node itself
+                distance, others = cKDTree(positions).query(positions, min(count, neighbours + 1),
+                                                            distance_upper_bound=2 * k)
+                close = others[:, 1:] < count
+                owner = np.repeat(np.arange(count), close.sum(axis=1))
+                others = others[:, 1:][close]
+            delta = positions[owner] - positions[others]
+            distance = np.maximum((delta * delta).sum(axis=1), 1e-9)
+            push = delta * (k * k * masses[others] / distance)[:, np.newaxis]
+            displacement = np.zeros((count, 2))
+            for axis in (0, 1):
+                displacement[:, axis] = np.bincount(owner, weights=push[:, axis], minlength=count)
+            # Light gravity so the components don't drift apart without global repulsion
+            displacement -= positions * (0.01 * k / max(1.0, np.sqrt(count)))
+        if len(edges):
+            delta = positions[edges[:, 1]] - positions[edges[:, 0]]
+            pull = delta * (np.sqrt((delta * delta).sum(axis=1)) / k)[:, np.newaxis]
+            for axis in (0, 1):
+                displacement[:, axis] += np.bincount(edges[:, 0], weights=pull[:, axis], minlength=count)
+                displacement[:, axis] -= np.bincount(edges[:, 1], weights=pull[:, axis], minlength=count)
+
+        length = np.maximum(np.sqrt((displacement * displacement).sum(axis=1)), 1e-9)
+        positions += displacement * (np.minimum(length, temperature) / length)[:, np.newaxis]
+        temperature *= 0.9
+    return positions
+
+
+def multilevel_layout(G, scale=1, center=None, coarsest_size=50, iterations=30, seed=None):
+    """
+    Position the nodes with a multilevel (coarsen - layout - refine) force directed algorithm.
+
+    The graph is repeatedly collapsed through matchings of its edges until it has at most coarsest_size
+    nodes or it doesn't shrink anymore. The coarsest graph is laid out with an all-pairs force
+    simulation, then every level is prolonged (each node starts at the position of its coarse node) and
+    refined with a few force iterations that only repel close nodes. A 100k nodes graph is laid out in
+    about ten seconds, much closer to the final picture than circular_layout.
+
+    Same interface as the networkx.drawing.layout functions, so it can be used as initial_pos provider
+    of QNetworkxController.set_graph or in the layouts combo.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+    scale : float
+        Positions are rescaled to the [-scale, scale] range.
+    center : array-like
+        Coordinate pair around which to center the layout.
+    coarsest_size : int
+        Coarsening stops when the graph has less nodes than this.
+    iterations : int
+        Force iterations of every level. The coarsest level gets four times more.
+    seed : int
+        Seed of the random numbers, for reproducible layouts.
+
+    Returns
+    -------
+    dict
+        A dictionary of positions keyed by node.
+    """
+    nodes, edges = _graph_arrays(G)
+    count = len(nodes)
+    if center is None:
+        center = np.zeros(2)
+    if count == 0:
+        return {}
+    if count == 1:
+        return {nodes[0]: np.asarray(center, dtype=float)}
+
+    random = np.random.RandomState(seed)
+    levels = []
+    level_count, level_edges = count, edges
+    level_weights = np.ones(len(edges))
+    level_masses = np.ones(count)
+    while level_count > coarsest_size:
+        clusters, coarse_count, coarse_edges, coarse_weights, coarse_masses = \
+            _coarsen(level_count, level_edges, level_weights, level_masses, random)
+        if coarse_count > 0.95 * level_count:
+            break
+        levels.append((level_count, level_edges, level_masses, clusters))
+        level_count, level_edges, level_weights, level_masses = \
+            coarse_count, coarse_edges, coarse_weights, coarse_masses
+    _logger.debug("Multilevel layout of %d nodes with %d levels, coarsest has %d nodes" %
+                  (count, len(levels), level_count))
+
+    # The natural edge length grows with the number of fine nodes a coarse node stands for
+    k = np.sqrt(float(count) / level_count)
+    positions = random.uniform(-1, 1, (level_count, 2)) * k * np.sqrt(level_count)
+    # The coarsest level can still be big when coarsening stalls (many isolated nodes)
+    positions = _refine(positions, level_edges, level_masses, k, iterations * 4, k * np.sqrt(level_count),
+                        level_count <= coarsest_size * 4)
+
+    for fine_count, fine_edges, fine_masses, clusters in reversed(levels):
+        k = np.sqrt(float(count) / fine_count)
+        positions = positions[clusters] + random.uniform(-0.1, 0.1, (fine_count, 2)) * k
+        positions = _refine(positions, fine_edges, fine_masses, k, iterations, k * 0.5,
+                            fine_count <= coarsest_size * 4)
+
+    positions -= positions.mean(axis=0)
+    extent = np.abs(positions).max()
+    if extent > 0:
+        positions *= scale / extent
+    positions += center
+    return dict(zip(nodes, positions))
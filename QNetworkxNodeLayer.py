@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import logging
+
+import numpy as np
+
+try:
+    from PySide2.QtCore import QRectF, Qt
+    from PySide2.QtGui import QBrush, QPainterPath, QPen
+    from PySide2.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+except Exception as e:
+    from PyQt4.QtCore import QRectF, Qt
+    from PyQt4.QtGui import QBrush, QGraphicsItem, QPainterPath, QPen, QStyleOptionGraphicsItem
+
+from QNetworkxShapes import NodeShapes
+
+
+class QNodeLayerItem(QGraphicsItem):
+    """
+    Single graphics item that paints all the nodes of a QNetworkxWidget.
+
+    The QNodeGraphicItem items stay in the scene, so selection, dragging, context menus and hit testing
+    work as usual, but they don't paint themselves while the layer is active. The layer groups the
+    visible nodes by profile, shape and state (Default or Selected) and draws every group in one call
+    with a pen and a brush that are created once per profile and state.
+
+    The node positions are kept in an array to cull the nodes outside of the exposed rect. It must be
+    refreshed with invalidate_geometry when nodes move, and with invalidate_structure when nodes are
+    added or removed.
+
+    Parameters
+    ----------
+    graph_widget : QNetworkxWidget
+    """
+    Type = QGraphicsItem.UserType + 4
+
+    def __init__(self, graph_widget):
+        super(QNodeLayerItem, self).__init__()
+        self._logger = logging.getLogger("QNetworkxGraph.QNodeLayerItem")
+        self._logger.setLevel(logging.CRITICAL)
+        self.graph = graph_widget
+        self._nodes = []
+        self._positions = np.zeros((0, 2))
+        self._extents = np.zeros(0)
+        self._styles = {}
+        self._structure_dirty = True
+        self._geometry_dirty = True
+
+        self.setAcceptedMouseButtons(Qt.NoButton)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        # Above the edge layer and below the node items, so their labels are painted over the layer
+        self.setZValue(9.5)
+
+    def type(self):
+        return QNodeLayerItem.Type
+
+    def invalidate_structure(self):
+        self._structure_dirty = True
+        self.invalidate_geometry()
+
+    def invalidate_geometry(self):
+        self._geometry_dirty = True
+        self.update()
+
+    def clear_style_cache(self):
+        """
+        Forget the cached pens and brushes, needed after the profiles configuration changes.
+        """
+        self._styles.clear()
+        self.update()
+
+    def _update_geometry(self):
+        if self._structure_dirty:
+            self._nodes = [data['item'] for label, data in self.graph.nx_graph.nodes(data=True)]
+            self._structure_dirty = False
+        count = len(self._nodes)
+        self._positions = np.zeros((count, 2))
+        self._extents = np.zeros(count)
+        for row, node in enumerate(self._nodes):
+            position = node.pos()
+            self._positions[row] = (position.x(), position.y())
+            self._extents[row] = node.size / 2.0 + node.border_width
+        self._geometry_dirty = False
+
+    def _style(self, node, selected):
+        """
+        Cached (pen, brush) of the profile of node in the given state, as QNodeGraphicItem.paint makes them.
+        """
+        key = (node.node_profile, selected)
+        style = self._styles.get(key)
+        if style is None:
+            colors = node.node_config.Selected if selected else node.node_config.Default
+            pen = QPen(colors.Edge.PenColor)
+            pen.setWidth(node.border_width * colors.Edge.PenWidth)
+            style = self._styles[key] = (pen, QBrush(colors.Fill))
+        return style
+
+    def boundingRect(self):
+        if self.scene() is None:
+            return QRectF()
+        return self.scene().sceneRect()
+
+    def scene_rect_changed(self, rect):
+        self.prepareGeometryChange()
+
+    def shape(self):
+        return QPainterPath()
+
+    def paint(self, painter, option, widget):
+        if self._geometry_dirty:
+            self._update_geometry()
+        if not len(self._nodes):
+            return
+        exposed = option.exposedRect
+        positions = self._positions
+        extents = self._extents
+        visible = np.flatnonzero((positions[:, 0] + extents >= exposed.left()) &
+                                 (positions[:, 0] - extents <= exposed.right()) &
+                                 (positions[:, 1] + extents >= exposed.top()) &
+                                 (positions[:, 1] - extents <= exposed.bottom()))
+
+        groups = {}
+        for row in visible.tolist():
+            node = self._nodes[row]
+            if not node.isVisible():
+                continue
+            half = node.size / 2
+            rect = QRectF(positions[row, 0] - half, positions[row, 1] - half, node.size, node.size)
+            key = (node.node_profile, node.node_shape, node.isSelected())
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = (node, [])
+            group[1].append(rect)
+
+        flat = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform()) < \
+            self.graph.lod_dot_threshold
+        for (profile, shape, selected), (node, rects) in groups.items():
+            pen, brush = self._style(node, selected)
+            # Flat dots, without border, when zoomed out
+            painter.setPen(Qt.NoPen if flat else pen)
+            painter.setBrush(brush)
+            if shape == NodeShapes.CIRCLE:
+                path = QPainterPath()
+                for rect in rects:
+                    path.addEllipse(rect)
+                painter.drawPath(path)
+            else:
+                painter.drawRects(rects)
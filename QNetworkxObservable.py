@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import networkx as nx
+
+NODE_ADDED = "node_added"
+NODE_REMOVED = "node_removed"
+NODE_CHANGED = "node_changed"
+EDGE_ADDED = "edge_added"
+EDGE_REMOVED = "edge_removed"
+EDGE_CHANGED = "edge_changed"
+GRAPH_CLEARED = "graph_cleared"
+
+
+def _node_key(node):
+    # add_nodes_from accepts nodes and (node, attribute dict) tuples
+    try:
+        hash(node)
+        return node
+    except TypeError:
+        return node[0]
+
+
+class ObservableGraph(nx.Graph):
+    """
+    networkx Graph that tells its listeners about every change, so a QNetworkxController can apply
+    them to the widget as they happen instead of diffing the whole graph.
+
+    The listeners are called with the event and its arguments after the graph has changed:
+
+    - NODE_ADDED, NODE_CHANGED: node, attribute dict
+    - NODE_REMOVED: node. Its edges are removed with it, without EDGE_REMOVED events.
+    - EDGE_ADDED, EDGE_CHANGED: node1, node2, attribute dict. The ends that weren't in the graph are
+      added first, with NODE_ADDED events.
+    - EDGE_REMOVED: node1, node2
+    - GRAPH_CLEARED: no arguments
+
+    Attributes changed directly in the node and edge dicts (like G.node[n]['size'] = 10) can't be
+    seen; use set_node_attributes and set_edge_attributes for the listeners to know.
+    """
+
+    def __init__(self, data=None, **attr):
+        self._listeners = []
+        super(ObservableGraph, self).__init__(data, **attr)
+
+    def add_listener(self, listener):
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def notify(self, event, *args):
+        for listener in list(self._listeners):
+            listener(event, *args)
+
+    def add_node(self, n, attr_dict=None, **attr):
+        added = n not in self.node
+        super(ObservableGraph, self).add_node(n, attr_dict, **attr)
+        self.notify(NODE_ADDED if added else NODE_CHANGED, n, self.node[n])
+
+    def add_nodes_from(self, nodes, **attr):
+        nodes = list(nodes)
+        added = set(_node_key(n) for n in nodes if _node_key(n) not in self.node)
+        super(ObservableGraph, self).add_nodes_from(nodes, **attr)
+        notified = set()
+        for n in nodes:
+            key = _node_key(n)
+            if key not in notified:
+                notified.add(key)
+                self.notify(NODE_ADDED if key in added else NODE_CHANGED, key, self.node[key])
+
+    def remove_node(self, n):
+        super(ObservableGraph, self).remove_node(n)
+        self.notify(NODE_REMOVED, n)
+
+    def remove_nodes_from(self, nodes):
+        removed = []
+        seen_nodes = set()
+        for n in nodes:
+            if n in self.node and n not in seen_nodes:
+                seen_nodes.add(n)
+                removed.append(n)
+        super(ObservableGraph, self).remove_nodes_from(removed)
+        for n in removed:
+            self.notify(NODE_REMOVED, n)
+
+    def _notify_edges(self, edges, new_nodes, new_edges):
+        for n in new_nodes:
+            self.notify(NODE_ADDED, n, self.node[n])
+        for u, v in edges:
+            self.notify(EDGE_ADDED if (u, v) in new_edges else EDGE_CHANGED, u, v, self.adj[u][v])
+
+    def add_edge(self, u, v, attr_dict=None, **attr):
+        new_nodes = [n for n in ((u,) if u == v else (u, v)) if n not in self.node]
+        new_edges = set() if self.has_edge(u, v) else set([(u, v)])
+        super(ObservableGraph, self).add_edge(u, v, attr_dict, **attr)
+        self._notify_edges([(u, v)], new_nodes, new_edges)
+
+    def add_edges_from(self, ebunch, attr_dict=None, **attr):
+        ebunch = list(ebunch)
+        edges = []
+        new_nodes = []
+        new_edges = set()
+        seen_nodes = set()
+        seen_edges = set()
+        for e in ebunch:
+            u, v = e[0], e[1]
+            for n in (u, v):
+                if n not in seen_nodes:
+                    seen_nodes.add(n)
+                    if n not in self.node:
+                        new_nodes.append(n)
+            if (u, v) in seen_edges or (v, u) in seen_edges:
+                continue
+            seen_edges.add((u, v))
+            edges.append((u, v))
+            if not self.has_edge(u, v):
+                new_edges.add((u, v))
+        super(ObservableGraph, self).add_edges_from(ebunch, attr_dict, **attr)
+        self._notify_edges(edges, new_nodes, new_edges)
+
+    def remove_edge(self, u, v):
+        super(ObservableGraph, self).remove_edge(u, v)
+        self.notify(EDGE_REMOVED, u, v)
+
+    def remove_edges_from(self, ebunch):
+        removed = []
+        seen_edges = set()
+        for e in ebunch:
+            u, v = e[0], e[1]
+            key = (u, v) if self.is_directed() else frozenset((u, v))
+            if key in seen_edges or not self.has_edge(u, v):
+                continue
+            seen_edges.add(key)
+            removed.append((u, v))
+        super(ObservableGraph, self).remove_edges_from(removed)
+        for u, v in removed:
+            self.notify(EDGE_REMOVED, u, v)
+
+    def set_node_attributes(self, n, **attr):
+        self.node[n].update(attr)
+        self.notify(NODE_CHANGED, n, self.node[n])
+
+    def set_edge_attributes(self, u, v, **attr):
+        self.adj[u][v].update(attr)
+        self.notify(EDGE_CHANGED, u, v, self.adj[u][v])
+
+    def clear(self):
+        super(ObservableGraph, self).clear()
+        self.notify(GRAPH_CLEARED)
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import argparse
+import logging
+import os
+import struct
+import sys
+import zlib
+
+import networkx as nx
+import networkx.drawing.layout as ly
+import numpy as np
+
+try:
+    from PySide2.QtCore import QRectF, QSize, Qt
+    from PySide2.QtGui import QColor, QImage, QPainter
+    PYQT4 = False
+except Exception as e:
+    from PyQt4.QtCore import QRectF, QSize, Qt
+    from PyQt4.QtGui import QColor, QImage, QPainter
+    PYQT4 = True
+
+from QNetworkxGraph import QApplication, QNetworkxController, QNetworkxWidget
+from QNetworkxMultilevelLayout import multilevel_layout
+
+_logger = logging.getLogger("QNetworkxGraph.QNetworkxRender")
+_logger.setLevel(logging.CRITICAL)
+
+GRAPH_READERS = {
+    ".gml": nx.read_gml,
+    ".graphml": nx.read_graphml,
+    ".gexf": nx.read_gexf,
+    ".adjlist": nx.read_adjlist,
+    ".edgelist": nx.read_edgelist,
+    ".txt": nx.read_edgelist,
+}
+
+
+def ensure_application():
+    """
+    The running QApplication, or a new one. The offscreen platform is used if there is no display.
+    """
+    if not os.environ.get("DISPLAY") and not os.environ.get("QT_QPA_PLATFORM") and sys.platform.startswith("linux"):
+        os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    application = QApplication.instance()
+    if application is None:
+        application = QApplication(sys.argv[:1])
+    return application
+
+
+def resolve_layout(layout):
+    """
+    Layout function from its name: multilevel_layout or one of the networkx.drawing.layout functions.
+    Callables and dicts of positions are returned as they are.
+    """
+    if layout is None or callable(layout) or isinstance(layout, dict):
+        return layout
+    if layout == "multilevel_layout":
+        return multilevel_layout
+    if layout.endswith("_layout") and hasattr(ly, layout):
+        return getattr(ly, layout)
+    raise Exception("Unknown layout %s" % layout)
+
+
+def build_widget(graph, layout=None, spacing=150.0, layers=True, labels=True):
+    """
+    QNetworkxWidget, never shown, with graph laid out by layout.
+
+    Parameters
+    ----------
+    graph : networkx.Graph
+    layout : str, callable or dict
+        Name or function of the layout, or the positions keyed by node. multilevel_layout if None.
+    spacing : float
+        The scene is sized so there are about spacing pixels between neighbour nodes.
+    layers : bool
+        Draw the nodes and the straight edges with the batched layers.
+    labels : bool
+        Draw the node labels.
+    """
+    ensure_application()
+    layout = resolve_layout(layout)
+    if layout is None:
+        layout = resolve_layout("multilevel_layout")
+    widget = QNetworkxWidget(directed=graph.is_directed())
+    side = spacing * max(1.0, np.sqrt(graph.number_of_nodes()))
+    widget.scene.setSceneRect(-side / 2, -side / 2, side, side)
+    if layers:
+        widget.set_edge_layer(True)
+        widget.set_node_layer(True)
+    controller = QNetworkxController(widget)
+    controller.set_graph(graph, initial_pos=layout)
+    for label, data in widget.nx_graph.nodes(data=True):
+        data['item'].label.setVisible(labels)
+    return widget
+
+
+def graph_bounds(widget, margin=40):
+    """
+    Scene rect of all the nodes of the widget and their labels, grown by margin pixels.
+    """
+    bounds = QRectF()
+    for label, data in widget.nx_graph.nodes(data=True):
+        node = data['item']
+        bounds = bounds.united(node.sceneBoundingRect()).united(node.label.sceneBoundingRect())
+    for label1, label2, data in widget.nx_graph.edges(data=True):
+        if data['item'] is not None:
+            bounds = bounds.united(data['item'].sceneBoundingRect())
+    if bounds.isNull():
+        bounds = widget.scene.sceneRect()
+    return bounds.adjusted(-margin, -margin, margin, margin)
+
+
+def _render_tile(scene, painter, target, source):
+    painter.save()
+    painter.setClipRect(target)
+    scene.render(painter, target, source, Qt.IgnoreAspectRatio)
+    painter.restore()
+
+
+def render_image(scene, source, width, height, background):
+    """
+    QImage of the source rect of the scene, width x height pixels.
+    """
+    image = QImage(width, height, QImage.Format_ARGB32)
+    image.fill(background)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    _render_tile(scene, painter, QRectF(0, 0, width, height), source)
+    painter.end()
+    return image
+
+
+def _png_chunk(output, chunk_type, data):
+    output.write(struct.pack(">I", len(data)))
+    output.write(chunk_type)
+    output.write(data)
+    output.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def _rgba_rows(image):
+    """
+    Rows of an ARGB32 QImage as RGBA bytes, each one preceded by the PNG filter type 0.
+    """
+    width, height = image.width(), image.height()
+    bits = image.constBits()
+    if PYQT4:
+        bits.setsize(image.byteCount())
+    pixels = np.frombuffer(bits, np.uint8).reshape(height, image.bytesPerLine())[:, :width * 4]
+    # ARGB32 is stored as BGRA on little endian machines
+    if sys.byteorder == "little":
+        rgba = pixels.reshape(height, width, 4)[:, :, [2, 1, 0, 3]]
+    else:
+        rgba = pixels.reshape(height, width, 4)[:, :, [1, 2, 3, 0]]
+    rows = np.zeros((height, width * 4 + 1), np.uint8)
+    rows[:, 1:] = rgba.reshape(height, width * 4)
+    return rows.tostring()
+
+
+def render_png(scene, source, path, width, height, background, tile_size=2048, max_strip_bytes=1 << 27):
+    """
+    Render the source rect of the scene to a width x height PNG file, tile by tile.
+
+    The image is rendered in horizontal strips of tiles. Every strip is compressed and written as soon
+    as it is rendered, so only one strip is in memory at a time: at most tile_size pixels high, and
+    lower if a strip would take more than max_strip_bytes.
+    """
+    scale_x = source.width() / float(width)
+    scale_y = source.height() / float(height)
+    strip_height = max(1, min(tile_size, height, max_strip_bytes // (width * 4)))
+    compressor = zlib.compressobj(6)
+    with open(path, "wb") as output:
+        output.write("\x89PNG\r\n\x1a\n")
+        _png_chunk(output, "IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        for top in range(0, height, strip_height):
+            rows = min(strip_height, height - top)
+            strip = QImage(width, rows, QImage.Format_ARGB32)
+            strip.fill(background)
+            painter = QPainter(strip)
+            painter.setRenderHint(QPainter.Antialiasing)
+            for left in range(0, width, tile_size):
+                columns = min(tile_size, width - left)
+                target = QRectF(left, 0, columns, rows)
+                tile_source = QRectF(source.left() + left * scale_x, source.top() + top * scale_y,
+                                     columns * scale_x, rows * scale_y)
+                _render_tile(scene, painter, target, tile_source)
+            painter.end()
+            data = compressor.compress(_rgba_rows(strip))
+            if data:
+                _png_chunk(output, "IDAT", data)
+            _logger.debug("Rendered rows %d to %d of %d" % (top, top + rows, height))
+        _png_chunk(output, "IDAT", compressor.flush())
+        _png_chunk(output, "IEND", "")
+
+
+def render_svg(scene, source, path, width, height, background):
+    """
+    Render the source rect of the scene to a SVG file with a width x height view box.
+    """
+    try:
+        from PySide2.QtSvg import QSvgGenerator
+    except Exception as e:
+        try:
+            from PyQt4.QtSvg import QSvgGenerator
+        except Exception as e:
+            raise Exception("The QtSvg module is needed to render SVG files")
+
+    generator = QSvgGenerator()
+    generator.setFileName(path)
+    generator.setSize(QSize(width, height))
+    generator.setViewBox(QRectF(0, 0, width, height))
+    generator.setTitle("QNetworkxGraph")
+    painter = QPainter(generator)
+    painter.fillRect(QRectF(0, 0, width, height), background)
+    scene.render(painter, QRectF(0, 0, width, height), source)
+    painter.end()
+
+
+def render_widget(widget, path, width=None, height=None, scale=1.0, tile_size=2048, background=None, margin=40):
+    """
+    Render all the graph of widget to path. The format is taken from the extension: png, svg or any
+    image format supported by QImage.
+
+    The size of the image is width x height. If only one of them is given the other one keeps the
+    aspect ratio of the graph, if none of them is given the graph is rendered at scale pixels per
+    scene unit.
+
+    Returns
+    -------
+    tuple
+        (width, height) of the rendered image.
+    """
+    source = graph_bounds(widget, margin)
+    if width is None and height is None:
+        width, height = source.width() * scale, source.height() * scale
+    elif width is None:
+        width = source.width() * height / source.height()
+    elif height is None:
+        height = source.height() * width / source.width()
+    width, height = max(1, int(round(width))), max(1, int(round(height)))
+    if background is None:
+        background = widget.background_color
+    background = QColor(background)
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".svg":
+        render_svg(widget.scene, source, path, width, height, background)
+    elif extension == ".png" and (width > tile_size or height > tile_size):
+        render_png(widget.scene, source, path, width, height, background, tile_size)
+    else:
+        image = render_image(widget.scene, source, width, height, background)
+        if not image.save(path):
+            raise Exception("Can't save the image %s" % path)
+    return width, height
+
+
+def render_graph(graph, path, layout=None, width=None, height=None, scale=1.0, tile_size=2048, background=None,
+                 spacing=150.0, layers=True, labels=True, margin=40):
+    """
+    Lay out a networkx graph and render it to path without showing any window.
+
+    Parameters
+    ----------
+    graph : networkx.Graph
+    path : str
+        Output file, .png, .svg or any other image format supported by QImage.
+    layout : str, callable or dict
+        Name or function of the layout, or the positions keyed by node. multilevel_layout if None.
+    width, height, scale :
+        Size of the image, see render_widget.
+    tile_size : int
+        Maximum size of the tiles the PNG images are rendered in.
+    background : QColor
+        Background of the image, the one of QNetworkxWidget if None.
+    spacing, layers, labels :
+        See build_widget.
+    margin : int
+        Scene pixels around the graph.
+
+    Returns
+    -------
+    tuple
+        (width, height) of the rendered image.
+    """
+    widget = build_widget(graph, layout, spacing, layers, labels)
+    try:
+        return render_widget(widget, path, width, height, scale, tile_size, background, margin)
+    finally:
+        widget.delete_graph()
+        widget.deleteLater()
+
+
+def read_graph(path):
+    """
+    Read a graph file, the format is taken from the extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in GRAPH_READERS:
+        raise Exception("Unknown graph format %s, use one of %s" % (extension, ", ".join(sorted(GRAPH_READERS))))
+    return GRAPH_READERS[extension](path)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Render a graph file to a PNG, SVG or other image without "
+                                                 "display. Big PNG images are rendered tile by tile.")
+    parser.add_argument("graph", help="Graph file (%s)" % ", ".join(sorted(GRAPH_READERS)))
+    parser.add_argument("output", help="Image file, .png, .svg, .jpg...")
+    parser.add_argument("--layout", default="multilevel_layout",
+                        help="multilevel_layout or a networkx.drawing.layout function")
+    parser.add_argument("--width", type=int)
+    parser.add_argument("--height", type=int)
+    parser.add_argument("--scale", type=float, default=1.0, help="Pixels per scene unit without width and height")
+    parser.add_argument("--tile-size", type=int, default=2048)
+    parser.add_argument("--spacing", type=float, default=150.0)
+    parser.add_argument("--background", help="Color name like white or #202020")
+    parser.add_argument("--no-labels", action="store_true")
+    parser.add_argument("--no-layers", action="store_true")
+    args = parser.parse_args(arguments)
+
+    ensure_application()
+    graph = read_graph(args.graph)
+    width, height = render_graph(graph, args.output, layout=args.layout, width=args.width, height=args.height,
+                                 scale=args.scale, tile_size=args.tile_size, background=args.background,
+                                 spacing=args.spacing, layers=not args.no_layers, labels=not args.no_labels)
+    print "Rendered %d nodes and %d edges to %s (%dx%d)" % (graph.number_of_nodes(), graph.number_of_edges(),
+                                                         args.output, width, height)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import argparse
+import math
+import random
+import time
+
+INDEX_ADAPTIVE = "adaptive"
+INDEX_BSP = "bsp"
+INDEX_NONE = "none"
+
+
+def bsp_tree_depth(item_count, leaf_size=8, max_depth=16):
+    """
+    Depth of a BSP tree that leaves about leaf_size items in every leaf.
+
+    Every level of the tree splits the leaves in two, so a tree of depth d has 2^d leaves.
+    """
+    if item_count <= leaf_size:
+        return 1
+    return max(1, min(max_depth, int(math.ceil(math.log(float(item_count) / leaf_size, 2)))))
+
+
+def benchmark(nodes=5000, queries=200, repaints=10, seed=0):
+    """
+    Hit test, rubber band and paint latency of a QNetworkxWidget scene without index (the animation
+    phase) and with the BSP tree built once the layout is static.
+
+    The nodes are placed on a jittered grid and linked to their right and bottom neighbours, so the
+    edges are short as in a laid out graph.
+
+    Returns
+    -------
+    dict
+        Milliseconds of every measure keyed by phase ("animating", "static") and then by measure
+        ("build", "item_at", "rubber_band", "paint").
+    """
+    from QNetworkxGraph import QApplication, QNetworkxWidget, QPointF, QRectF
+
+    app = QApplication.instance()
+    random_state = random.Random(seed)
+    columns = int(math.ceil(math.sqrt(nodes)))
+    spacing = 80.0
+    side = columns * spacing
+    widget = QNetworkxWidget()
+    widget.scene.setSceneRect(-side / 2, -side / 2, side, side)
+    for node in range(nodes):
+        row, column = divmod(node, columns)
+        widget.add_node(node, position=((column + random_state.uniform(0.2, 0.8)) * spacing - side / 2,
+                                        (row + random_state.uniform(0.2, 0.8)) * spacing - side / 2))
+    for node in range(nodes):
+        for neighbour in (node + 1, node + columns):
+            if neighbour < nodes and (neighbour != node + 1 or neighbour % columns):
+                widget.add_edge(node_tuple=(node, neighbour), label_visible=False)
+    widget.resize(800, 800)
+    widget.show()
+    app.processEvents()
+    points = [QPointF(random_state.uniform(-side / 2, side / 2), random_state.uniform(-side / 2, side / 2))
+              for query in range(queries)]
+    rects = [QRectF(point.x(), point.y(), 300, 300) for point in points]
+
+    results = {}
+    for phase in ("animating", "static"):
+        start = time.time()
+        if phase == "animating":
+            widget.set_scene_index(INDEX_NONE)
+        else:
+            widget.set_scene_index(INDEX_BSP)
+        # The index is built lazily by the first query
+        widget.scene.items(points[0])
+        measures = {"build": (time.time() - start) * 1000}
+
+        start = time.time()
+        for point in points:
+            widget.scene.items(point)
+        measures["item_at"] = (time.time() - start) * 1000 / queries
+
+        start = time.time()
+        for rect in rects:
+            widget.scene.items(rect)
+        measures["rubber_band"] = (time.time() - start) * 1000 / queries
+
+        # A zoomed in view, where most of the items are culled
+        widget.resetTransform()
+        widget.scale(2, 2)
+        start = time.time()
+        for repaint in range(repaints):
+            widget.viewport().repaint()
+        measures["paint"] = (time.time() - start) * 1000 / repaints
+        results[phase] = measures
+    widget.close()
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    from QNetworkxGraph import QApplication
+
+    parser = argparse.ArgumentParser(description="Hit test and paint latency with and without scene index")
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    results = benchmark(args.nodes, args.queries)
+    print "%d nodes on a grid (milliseconds)" % args.nodes
+    print "%10s %10s %10s %12s %10s" % ("phase", "build", "item_at", "rubber_band", "paint")
+    for phase in ("animating", "static"):
+        measures = results[phase]
+        print "%10s %10.2f %10.3f %12.3f %10.2f" % (phase, measures["build"], measures["item_at"],
+                                                    measures["rubber_band"], measures["paint"])
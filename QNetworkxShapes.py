@@ -0,0 +1,8 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from enum import Enum
+
+
+class NodeShapes(Enum):
+    SQUARE = 1
+    CIRCLE = SQUARE + 1
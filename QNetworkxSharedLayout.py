@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import argparse
+import ctypes
+import logging
+import multiprocessing
+import time
+
+import numpy as np
+
+from QNetworkxBarnesHut import QuadTree
+from QNetworkxLayoutEngine import ForceLayoutEngine, exact_repulsion, spring_attraction
+
+# Shared buffers as (dtype, kind, elements per item). Kind tells how many items the buffer has: one per
+# node ("node"), per adjacency entry ("adjacency") or per cell of the Barnes-Hut quadtree ("cell").
+_BUFFERS = {
+    'positions': (np.float64, 'node', 2),
+    'velocities': (np.float64, 'node', 2),
+    'mass_centers': (np.float64, 'node', 2),
+    'sizes': (np.float64, 'node', 1),
+    'weights': (np.float64, 'node', 1),
+    'rows': (np.intp, 'node', 1),
+    'pointers': (np.intp, 'node', 1),
+    'neighbours': (np.intp, 'adjacency', 1),
+    'tree_centers': (np.float64, 'cell', 2),
+    'tree_widths': (np.float64, 'cell', 1),
+    'tree_counts': (np.intp, 'cell', 1),
+    'tree_mass_centers': (np.float64, 'cell', 2),
+    'tree_children': (np.intp, 'cell', 4),
+    'tree_leaf_count': (np.intp, 'cell', 1),
+    'tree_leaf_start': (np.intp, 'cell', 1),
+    'tree_is_leaf': (np.bool_, 'cell', 1),
+    'tree_members': (np.intp, 'node', 1),
+}
+
+# ctypes of the buffers. c_ssize_t is as wide as np.intp on every platform, unlike the 'l' typecode,
+# which is 32 bits on Windows.
+_CTYPES = {np.dtype(np.float64): ctypes.c_double, np.dtype(np.intp): ctypes.c_ssize_t,
+           np.dtype(np.bool_): ctypes.c_bool}
+
+# Buffers of the pool process, set by _init_worker, and the views on them of the current sizes
+_shared = {}
+
+
+def _shared_array(dtype, size):
+    """
+    Flat numpy array of size elements backed by an anonymous shared memory buffer that is inherited by
+    forked processes.
+    """
+    buffer = multiprocessing.RawArray(_CTYPES[np.dtype(dtype)], max(1, int(size)))
+    return buffer, np.frombuffer(buffer, dtype=dtype)
+
+
+def _views(flat, sizes):
+    """
+    Views of the sizes in use on the flat buffers. sizes has the number of items of every kind.
+    """
+    views = {}
+    for name, (dtype, kind, width) in _BUFFERS.items():
+        # The adjacency pointers have an extra element
+        count = sizes[kind] + 1 if name == 'pointers' else sizes[kind]
+        view = flat[name][:count * width]
+        views[name] = view.reshape(count, width) if width > 1 else view
+    return views
+
+
+def _init_worker(buffers):
+    _shared.clear()
+    _shared['flat'] = dict((name, np.frombuffer(buffer, dtype=_BUFFERS[name][0])) for name, buffer in buffers.items())
+
+
+def _compute_shard(task):
+    """
+    Velocities of the rows[start:stop] nodes, written to the shared velocities buffer.
+
+    Only the shard bounds, the sizes of the arrays and the repulsion settings travel through the pool,
+    the arrays, and the quadtree built once per tick by the engine, are read from and written to
+    shared memory.
+    """
+    start, stop, sizes, repulsion_mode, theta = task
+    key = tuple(sorted(sizes.items()))
+    if _shared.get('key') != key:
+        _shared['key'] = key
+        _shared['views'] = _views(_shared['flat'], sizes)
+    views = _shared['views']
+    positions = views['positions']
+    rows = views['rows'][start:stop]
+    if repulsion_mode == ForceLayoutEngine.BARNES_HUT:
+        tree = QuadTree.from_arrays(positions, dict((name, views['tree_' + name]) for name in QuadTree.ARRAYS))
+        repulsion = tree.repulsion(views['sizes'], rows, theta)
+    else:
+        repulsion = exact_repulsion(positions, views['sizes'], rows)
+    attraction = spring_attraction(positions, views['weights'], views['mass_centers'], views['pointers'],
+                                   views['neighbours'], rows)
+    views['velocities'][start:stop] = repulsion + attraction
+    return stop - start
+
+
+class SharedMemoryLayoutEngine(ForceLayoutEngine):
+    """
+    ForceLayoutEngine that shards the force computation across a pool of processes.
+
+    Positions, velocities and the rest of the simulation arrays live in shared memory buffers that the
+    pool processes inherit when they are forked, so a tick only sends the bounds of every shard to the
+    workers. The positions attribute is a view on the shared buffer and can be read directly by the
+    widget. With Barnes-Hut repulsion the quadtree is built once per tick by the engine and shared with
+    the workers too.
+
+    The buffers are allocated with room to grow, so loading a changed graph only copies the arrays.
+    The pool is forked again only when a buffer has to grow, which doubles its capacity. Python 2 has no
+    spawn start method, so the pool is always forked from the calling process: don't combine the engine
+    with threads that may hold locks while it forks, like the threaded layout of QNetworkxWidget.
+
+    Parameters
+    ----------
+    workers : int
+        Number of processes. multiprocessing.cpu_count() if None.
+    """
+
+    def __init__(self, workers=None):
+        super(SharedMemoryLayoutEngine, self).__init__()
+        self._logger = logging.getLogger("QNetworkxGraph.SharedMemoryLayoutEngine")
+        self._logger.setLevel(logging.CRITICAL)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.pool = None
+        self.buffers = {}
+        self.capacity = {'node': 0, 'adjacency': 0, 'cell': 0}
+        self._flat = {}
+        self._views = {}
+        self._sizes = {'node': 0, 'adjacency': 0, 'cell': 0}
+        self.velocities = np.zeros((0, 2))
+        self._rows = np.zeros(0, dtype=np.intp)
+
+    def load_graph(self, nx_graph, keep_temperatures=False):
+        super(SharedMemoryLayoutEngine, self).load_graph(nx_graph, keep_temperatures)
+        self._share_arrays()
+
+    def load_arrays(self, positions, sizes, weights, mass_centers, edges, animated, temperatures=None):
+        super(SharedMemoryLayoutEngine, self).load_arrays(positions, sizes, weights, mass_centers, edges, animated,
+                                                          temperatures)
+        self._share_arrays()
+
+    def _reserve(self, sizes):
+        """
+        Make sure the buffers can hold sizes items of every kind, allocating bigger ones and forking the
+        pool again if they can't.
+        """
+        if self.pool is not None and all(sizes[kind] <= self.capacity[kind] for kind in sizes):
+            return
+        # A quadtree with a point per leaf has about twice as many cells as points
+        needed = dict(sizes, cell=max(sizes['cell'], 2 * sizes['node']))
+        for kind in needed:
+            if needed[kind] > self.capacity[kind]:
+                self.capacity[kind] = max(needed[kind], 2 * self.capacity[kind], 64)
+        self.close()
+        for name, (dtype, kind, width) in _BUFFERS.items():
+            extra = 1 if name == 'pointers' else 0
+            self.buffers[name], self._flat[name] = _shared_array(dtype, (self.capacity[kind] + extra) * width)
+        self.pool = multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(self.buffers,))
+        self._logger.debug("Started %d layout processes for %d nodes" % (self.workers, self.capacity['node']))
+
+    def _share_arrays(self, cell_count=None):
+        """
+        Copy the simulation arrays to the shared buffers and make the attributes views on them.
+        """
+        arrays = dict((name, getattr(self, name)) for name in ('positions', 'mass_centers', 'sizes', 'weights'))
+        arrays['pointers'] = self.adjacency_pointers
+        arrays['neighbours'] = self.adjacency
+        sizes = {'node': len(self.positions), 'adjacency': len(self.adjacency),
+                 'cell': self._sizes['cell'] if cell_count is None else cell_count}
+        self._reserve(sizes)
+        self._sizes = sizes
+        self._views = _views(self._flat, sizes)
+        for name, array in arrays.items():
+            self._views[name][:] = array
+        for name in ('positions', 'mass_centers', 'sizes', 'weights'):
+            setattr(self, name, self._views[name])
+        self.adjacency_pointers = self._views['pointers']
+        self.adjacency = self._views['neighbours']
+        self.velocities = self._views['velocities']
+        self._rows = self._views['rows']
+
+    def _share_tree(self):
+        tree = QuadTree(self.positions)
+        if len(tree) != self._sizes['cell']:
+            self._share_arrays(len(tree))
+        for name in QuadTree.ARRAYS:
+            self._views['tree_' + name][:] = getattr(tree, name)
+
+    def compute_forces(self, rows=None):
+        if rows is None:
+            rows = np.arange(len(self.items))
+        if self.pool is None or not len(rows):
+            return super(SharedMemoryLayoutEngine, self).compute_forces(rows)
+        if self.repulsion_mode == ForceLayoutEngine.BARNES_HUT:
+            self._share_tree()
+        count = len(rows)
+        self._rows[:count] = rows
+        bounds = np.linspace(0, count, min(self.workers, count) + 1).astype(int)
+        tasks = [(bounds[i], bounds[i + 1], self._sizes, self.repulsion_mode, self.theta)
+                 for i in range(len(bounds) - 1)]
+        self.pool.map(_compute_shard, tasks)
+        return self.velocities[:count].copy()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+def benchmark(nodes=50000, edges_per_node=2, workers=(1, 2, 4, 8), ticks=5, repulsion_mode=None, theta=0.5):
+    """
+    Ticks per second of a SharedMemoryLayoutEngine with the given numbers of workers.
+
+    The graph is a random one with nodes * edges_per_node edges and scattered positions, so the numbers
+    only depend on the size. Barnes-Hut repulsion is used unless repulsion_mode says otherwise.
+
+    Returns
+    -------
+    dict
+        Ticks per second for every number of workers.
+    """
+    if repulsion_mode is None:
+        repulsion_mode = ForceLayoutEngine.BARNES_HUT
+    random = np.random.RandomState(0)
+    side = np.sqrt(nodes) * 40
+    arrays = dict(positions=random.uniform(-side, side, (nodes, 2)), sizes=np.full(nodes, 40.0),
+                  mass_centers=np.zeros((nodes, 2)), animated=np.ones(nodes, dtype=bool),
+                  edges=random.randint(0, nodes, (nodes * edges_per_node, 2)).astype(np.intp))
+    arrays['weights'] = (np.bincount(arrays['edges'].ravel(), minlength=nodes) + 1) * arrays['sizes']
+
+    results = {}
+    for worker_count in workers:
+        engine = SharedMemoryLayoutEngine(worker_count)
+        engine.set_repulsion_mode(repulsion_mode, theta)
+        engine.load_arrays(**dict((name, value.copy()) for name, value in arrays.items()))
+        try:
+            engine.step()
+            start = time.time()
+            for tick in range(ticks):
+                engine.step()
+            results[worker_count] = ticks / (time.time() - start)
+        finally:
+            engine.close()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ticks per second of the multiprocess force layout")
+    parser.add_argument("--nodes", type=int, default=50000)
+    parser.add_argument("--ticks", type=int, default=5)
+    parser.add_argument("--workers", type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument("--repulsion", choices=[ForceLayoutEngine.BARNES_HUT, ForceLayoutEngine.EXACT],
+                        default=ForceLayoutEngine.BARNES_HUT)
+    args = parser.parse_args()
+
+    ticks_per_second = benchmark(args.nodes, workers=args.workers, ticks=args.ticks, repulsion_mode=args.repulsion)
+    print "%d nodes, %s repulsion" % (args.nodes, args.repulsion)
+    print "%8s %12s %8s" % ("workers", "ticks/s", "speedup")
+    for worker_count in args.workers:
+        print "%8d %12.3f %8.2f" % (worker_count, ticks_per_second[worker_count],
+                                    ticks_per_second[worker_count] / ticks_per_second[args.workers[0]])
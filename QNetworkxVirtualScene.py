@@ -0,0 +1,498 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+try:
+    from PySide2.QtCore import QObject, QPointF, QRectF, Qt, QTimer, Signal
+    from PySide2.QtGui import QPainterPath, QPen, QPolygonF
+    from PySide2.QtWidgets import QGraphicsItem
+except Exception as e:
+    from PyQt4.QtCore import QObject, QPointF, QRectF, Qt, QTimer, pyqtSignal as Signal
+    from PyQt4.QtGui import QGraphicsItem, QPainterPath, QPen, QPolygonF
+
+
+class QVirtualOverviewItem(QGraphicsItem):
+    """
+    Dots of all the nodes of a QVirtualGraphScene, shown instead of the node items when the view is
+    zoomed out so far that the visible part of the graph is over the items budget.
+
+    At most max_points dots of the exposed rect are drawn, taking every n-th node when there are more.
+
+    Parameters
+    ----------
+    virtual_scene : QVirtualGraphScene
+    """
+    Type = QGraphicsItem.UserType + 6
+
+    def __init__(self, virtual_scene, max_points=50000):
+        super(QVirtualOverviewItem, self).__init__()
+        self.virtual_scene = virtual_scene
+        self.max_points = max_points
+        self.setAcceptedMouseButtons(Qt.NoButton)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.setZValue(8)
+
+    def type(self):
+        return QVirtualOverviewItem.Type
+
+    def boundingRect(self):
+        if self.scene() is None:
+            return QRectF()
+        return self.scene().sceneRect()
+
+    def scene_rect_changed(self, rect):
+        self.prepareGeometryChange()
+
+    def shape(self):
+        return QPainterPath()
+
+    def paint(self, painter, option, widget):
+        positions = self.virtual_scene.positions
+        if not len(positions):
+            return
+        exposed = option.exposedRect
+        rows = np.flatnonzero((positions[:, 0] >= exposed.left()) & (positions[:, 0] <= exposed.right()) &
+                              (positions[:, 1] >= exposed.top()) & (positions[:, 1] <= exposed.bottom()))
+        if len(rows) > self.max_points:
+            rows = rows[::int(np.ceil(len(rows) / float(self.max_points)))]
+        colors = self.virtual_scene.graph_widget.background_color
+        painter.setPen(QPen(Qt.white if colors.lightness() < 128 else Qt.black, 0))
+        painter.drawPoints(QPolygonF([QPointF(x, y) for x, y in positions[rows].tolist()]))
+
+
+class QVirtualGraphScene(QObject):
+    """
+    Shows a networkx graph in a QNetworkxWidget creating graphic items only for the visible region.
+
+    The positions of all the nodes are kept in an array with a kd-tree over it. When the view is
+    scrolled, zoomed or resized, the nodes inside the viewport (grown by margin times its size on
+    every side) and the edges touching them or crossing the viewport are materialized: they get a
+    QNodeGraphicItem or a QEdgeGraphicItem and are added to the nx_graph of the widget, so selection,
+    dragging, context menus and the node and edge layers work on them as usual. Items that leave the
+    region go back to a pool and are reused for the next materialized elements, instead of being
+    destroyed and created again. Positions of dragged nodes are written back to the array when their
+    item is released.
+
+    When the region holds more than max_nodes nodes or max_edges edges nothing is materialized and
+    the graph is drawn as dots by a QVirtualOverviewItem.
+
+    The animation of the widget only knows about the materialized part of the graph, so the graph
+    should be laid out beforehand (for example with multilevel_layout) and the animation left off.
+
+    Parameters
+    ----------
+    graph_widget : QNetworkxWidget
+    margin : float
+        Size of the materialized region around the viewport, relative to the viewport size.
+    max_nodes : int
+        Nodes budget of the materialized region.
+    max_edges : int
+        Edges budget of the materialized region.
+    pool_size : int
+        Released items kept for reuse, of every kind. The rest are removed from the scene.
+    """
+    materialized = Signal(int, int)
+
+    def __init__(self, graph_widget, margin=0.5, max_nodes=5000, max_edges=20000, pool_size=5000):
+        super(QVirtualGraphScene, self).__init__(graph_widget)
+        self._logger = logging.getLogger("QNetworkxGraph.QVirtualGraphScene")
+        self._logger.setLevel(logging.CRITICAL)
+        self.graph_widget = graph_widget
+        self.margin = margin
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self.pool_size = pool_size
+        self.edge_labels = False
+        self.graph = None
+        self.labels = []
+        self._rows = {}
+        self.positions = np.zeros((0, 2))
+        self.edges = np.zeros((0, 2), dtype=np.intp)
+        self._tree = None
+        # Rows moved since the tree was built, they are checked one by one
+        self._moved = set()
+        self._incident_ptr = np.zeros(1, dtype=np.intp)
+        self._incident_edges = np.zeros(0, dtype=np.intp)
+        self._edge_lengths = np.zeros(0)
+        self._node_items = {}
+        self._edge_items = {}
+        self._node_pool = []
+        self._edge_pool = []
+        self.overview = None
+
+        self._update_timer = QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(0)
+        self._update_timer.timeout.connect(self.update_visible)
+        self.graph_widget.viewport_changed.connect(self._update_timer.start)
+        self.graph_widget.virtual_scene = self
+
+    def __len__(self):
+        return len(self.labels)
+
+    def set_graph(self, graph, positions, spacing=80.0):
+        """
+        Show graph with the nodes at the given positions.
+
+        Parameters
+        ----------
+        graph : networkx.Graph
+        positions : dict
+            Positions keyed by node, in any coordinates (like the ones of networkx layouts). They are
+            rescaled to a square where the mean distance between neighbour nodes is about spacing pixels.
+        spacing : float
+        """
+        self.clear()
+        self.graph = graph
+        self.labels = graph.nodes()
+        self._rows = index = dict((label, row) for row, label in enumerate(self.labels))
+        count = len(self.labels)
+        coordinates = np.array([positions[label] for label in self.labels], dtype=float).reshape(-1, 2)
+        if count:
+            coordinates -= coordinates.min(axis=0)
+            extent = coordinates.max()
+            side = spacing * np.sqrt(count)
+            if extent > 0:
+                coordinates *= side / extent
+            coordinates -= side / 2
+        self.positions = coordinates
+        self.edges = np.array([(index[u], index[v]) for u, v in graph.edges()], dtype=np.intp).reshape(-1, 2)
+
+        # Edges of every node, as a compressed sparse row structure
+        ends = np.concatenate((self.edges[:, 0], self.edges[:, 1]))
+        order = np.argsort(ends, kind='mergesort')
+        self._incident_edges = np.concatenate((np.arange(len(self.edges)), np.arange(len(self.edges))))[order]
+        self._incident_ptr = np.concatenate(([0], np.cumsum(np.bincount(ends, minlength=count))))
+        delta = self.positions[self.edges[:, 1]] - self.positions[self.edges[:, 0]]
+        self._edge_lengths = np.sqrt((delta * delta).sum(axis=1))
+        self._build_tree()
+        self._logger.debug("Virtual graph of %d nodes and %d edges" % (count, len(self.edges)))
+        self.update_visible()
+
+    def clear(self):
+        """
+        Release all the materialized elements and remove every item of the virtual scene from the scene.
+        """
+        self._update_timer.stop()
+        self._release_edges(list(self._edge_items.keys()))
+        self._release_nodes(list(self._node_items.keys()))
+        scene = self.graph_widget.scene
+        for item in self._edge_pool + self._node_pool:
+            if item.scene() is scene:
+                scene.removeItem(item)
+        self._edge_pool = []
+        self._node_pool = []
+        self._show_overview(False)
+        self.graph = None
+        self.labels = []
+        self._rows = {}
+        self.positions = np.zeros((0, 2))
+        self.edges = np.zeros((0, 2), dtype=np.intp)
+        self._tree = None
+        self._moved.clear()
+
+    def detach(self):
+        """
+        Clear the virtual scene and stop following the view of the widget, which can then show a graph
+        of its own.
+        """
+        self.clear()
+        self.graph_widget.viewport_changed.disconnect(self._update_timer.start)
+        if self.graph_widget.virtual_scene is self:
+            self.graph_widget.virtual_scene = None
+        self.deleteLater()
+
+    def node_position(self, label):
+        """
+        Current position of a node, materialized or not.
+        """
+        row = self._rows[label]
+        node = self._node_items.get(row)
+        if node is not None:
+            return node.pos().x(), node.pos().y()
+        return tuple(self.positions[row])
+
+    def materialized_nodes(self):
+        return [self.labels[row] for row in self._node_items]
+
+    def _build_tree(self):
+        self._tree = cKDTree(self.positions) if len(self.positions) else None
+        self._moved.clear()
+
+    def _sync_positions(self):
+        """
+        Copy the positions of the materialized nodes, that could have been dragged, to the array.
+        """
+        for row, item in self._node_items.items():
+            position = item.pos()
+            if position.x() != self.positions[row, 0] or position.y() != self.positions[row, 1]:
+                self.positions[row] = (position.x(), position.y())
+                self._moved.add(row)
+        if len(self._moved) > max(100, len(self.positions) // 100):
+            self._build_tree()
+
+    def region(self):
+        """
+        Scene rect of the viewport grown by margin on every side.
+        """
+        view = self.graph_widget
+        rect = view.mapToScene(view.viewport().rect()).boundingRect()
+        margin = max(rect.width(), rect.height()) * self.margin
+        return rect.adjusted(-margin, -margin, margin, margin)
+
+    def _extend_scene_rect(self):
+        """
+        Grow the scene rect to the whole graph, so the view can be scrolled over all of it.
+        """
+        scene = self.graph_widget.scene
+        lower = self.positions.min(axis=0)
+        upper = self.positions.max(axis=0)
+        bounds = QRectF(lower[0], lower[1], upper[0] - lower[0], upper[1] - lower[1]).adjusted(-100, -100, 100, 100)
+        if not scene.sceneRect().contains(bounds):
+            scene.setSceneRect(scene.sceneRect().united(bounds))
+
+    def _nodes_in(self, rect):
+        if self._tree is None:
+            return np.zeros(0, dtype=np.intp)
+        center = rect.center()
+        radius = np.hypot(rect.width(), rect.height()) / 2
+        rows = np.array(self._tree.query_ball_point((center.x(), center.y()), radius), dtype=np.intp)
+        if self._moved:
+            rows = np.union1d(rows, np.fromiter(self._moved, dtype=np.intp, count=len(self._moved)))
+        positions = self.positions[rows]
+        inside = (positions[:, 0] >= rect.left()) & (positions[:, 0] <= rect.right()) & \
+                 (positions[:, 1] >= rect.top()) & (positions[:, 1] <= rect.bottom())
+        return rows[inside]
+
+    def _estimated_nodes(self, rect):
+        """
+        Nodes expected in rect if they were spread evenly, to skip queries that would be over budget.
+        """
+        lower = self.positions.min(axis=0)
+        upper = self.positions.max(axis=0)
+        area = max(float(np.prod(upper - lower)), 1.0)
+        width = max(0.0, min(rect.right(), upper[0]) - max(rect.left(), lower[0]))
+        height = max(0.0, min(rect.bottom(), upper[1]) - max(rect.top(), lower[1]))
+        return len(self.positions) * width * height / area
+
+    def _edges_of(self, rows, rect):
+        """
+        Edges touching the rows nodes, plus the edges crossing rect without an end inside it.
+        """
+        starts = self._incident_ptr[rows]
+        lengths = self._incident_ptr[rows + 1] - starts
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        edges = self._incident_edges[np.repeat(starts, lengths) + offsets]
+        # An edge crossing the rect with both ends out of it is longer than the smallest side of the rect
+        long_edges = np.flatnonzero(self._edge_lengths > min(rect.width(), rect.height()) * 0.5)
+        if len(long_edges):
+            first = self.positions[self.edges[long_edges, 0]]
+            second = self.positions[self.edges[long_edges, 1]]
+            lower = np.minimum(first, second)
+            upper = np.maximum(first, second)
+            crossing = (lower[:, 0] <= rect.right()) & (upper[:, 0] >= rect.left()) & \
+                       (lower[:, 1] <= rect.bottom()) & (upper[:, 1] >= rect.top())
+            edges = np.concatenate((edges, long_edges[crossing]))
+        return np.unique(edges)
+
+    def update_visible(self):
+        """
+        Materialize the nodes and edges of the current region and release the ones out of it.
+        """
+        self._update_timer.stop()
+        if not len(self.labels):
+            return
+        self._sync_positions()
+        self._extend_scene_rect()
+        rect = self.region()
+        rows = edges = None
+        if self._estimated_nodes(rect) <= 4 * self.max_nodes:
+            rows = self._nodes_in(rect)
+            if len(rows) <= self.max_nodes:
+                edges = self._edges_of(rows, rect)
+                # The far ends of the edges are materialized too, so every edge has its two items
+                rows = np.union1d(rows, self.edges[edges].ravel())
+        if edges is None or len(rows) > self.max_nodes or len(edges) > self.max_edges:
+            self._logger.debug("Region over budget, showing the overview")
+            rows = edges = np.zeros(0, dtype=np.intp)
+        self._show_overview(not len(rows) and bool(len(self.labels)))
+
+        wanted_edges = set(edges.tolist())
+        wanted_nodes = set(rows.tolist())
+        self._release_edges([edge for edge in self._edge_items if edge not in wanted_edges])
+        self._release_nodes([row for row in self._node_items if row not in wanted_nodes])
+        self._acquire_nodes([row for row in rows.tolist() if row not in self._node_items])
+        self._acquire_edges([edge for edge in edges.tolist() if edge not in self._edge_items])
+        if self.graph_widget.node_layer is not None:
+            self.graph_widget.node_layer.invalidate_structure()
+        self.graph_widget.invalidate_layout()
+        self.materialized.emit(len(self._node_items), len(self._edge_items))
+
+    def _show_overview(self, visible):
+        scene = self.graph_widget.scene
+        if visible and self.overview is None:
+            self.overview = QVirtualOverviewItem(self)
+            scene.addItem(self.overview)
+            scene.sceneRectChanged.connect(self.overview.scene_rect_changed)
+        elif not visible and self.overview is not None:
+            scene.sceneRectChanged.disconnect(self.overview.scene_rect_changed)
+            scene.removeItem(self.overview)
+            self.overview = None
+
+    def _widget_label(self, row):
+        return self.graph_widget.node_label(self.labels[row])
+
+    def _acquire_nodes(self, rows):
+        from QNetworkxGraph import QNodeGraphicItem
+
+        widget = self.graph_widget
+        widget.batch_geometry_update = True
+        try:
+            for row in rows:
+                label = self._widget_label(row)
+                if self._node_pool:
+                    node = self._node_pool.pop()
+                    node.label.setPlainText(label)
+                    rect = node.label.boundingRect()
+                    node.label.setPos(-rect.width() / 2, -rect.height() / 2)
+                    node.edgeList = []
+                    node.setVisible(True)
+                else:
+                    node = QNodeGraphicItem(widget, label)
+                    node.label.setVisible(widget.labels_shown)
+                    if widget.node_layer is not None:
+                        node.setCacheMode(QGraphicsItem.NoCache)
+                    widget.scene.addItem(node)
+                node.setPos(self.positions[row, 0], self.positions[row, 1])
+                widget.nx_graph.add_node(label, item=node)
+                widget.register_node_item(label, node)
+                self._node_items[row] = node
+        finally:
+            widget.batch_geometry_update = False
+
+    def _release_nodes(self, rows):
+        widget = self.graph_widget
+        for row in rows:
+            node = self._node_items.pop(row)
+            position = node.pos()
+            self.positions[row] = (position.x(), position.y())
+            node.setSelected(False)
+            node.setVisible(False)
+            node.edgeList = []
+            label = self._widget_label(row)
+            widget.nx_graph.remove_node(label)
+            widget.unregister_node_item(label)
+            if len(self._node_pool) < self.pool_size:
+                self._node_pool.append(node)
+            else:
+                widget.scene.removeItem(node)
+
+    def _acquire_edges(self, edges):
+        from QNetworkxGraph import QEdgeGraphicItem
+
+        widget = self.graph_widget
+        for edge_row in edges:
+            first, second = self.edges[edge_row]
+            first_label, second_label = self._widget_label(first), self._widget_label(second)
+            source, dest = self._node_items[first], self._node_items[second]
+            if widget.edge_layer is not None and source is not dest:
+                edge = None
+                widget.edge_layer.add_edge((first_label, second_label), source, dest)
+            elif self._edge_pool:
+                edge = self._edge_pool.pop()
+                edge.source = source
+                edge.dest = dest
+                edge.label_text = u"%s - %s" % (first_label, second_label)
+                if edge._label is not None:
+                    edge._label.setPlainText(edge.label_text)
+                source.add_edge(edge)
+                dest.add_edge(edge)
+                edge.set_label_visible(self.edge_labels)
+                edge.setVisible(True)
+            else:
+                edge = QEdgeGraphicItem(first_node=source, second_node=dest, directed=widget.is_directed,
+                                        label_visible=self.edge_labels)
+                widget.scene.addItem(edge)
+            widget.nx_graph.add_edge(first_label, second_label, item=edge)
+            self._edge_items[edge_row] = edge
+
+    def _release_edges(self, edges):
+        widget = self.graph_widget
+        for edge_row in edges:
+            edge = self._edge_items.pop(edge_row)
+            first, second = self.edges[edge_row]
+            first_label, second_label = self._widget_label(first), self._widget_label(second)
+            if widget.nx_graph.has_edge(first_label, second_label):
+                # The edge could have been moved to or from the edge layer since it was materialized
+                edge = widget.nx_graph[first_label][second_label]['item']
+                widget.nx_graph.remove_edge(first_label, second_label)
+            if edge is None:
+                if widget.edge_layer is not None:
+                    # set_edge_layer keys the edges in the order nx_graph lists them
+                    widget.edge_layer.remove_edge((first_label, second_label))
+                    widget.edge_layer.remove_edge((second_label, first_label))
+                continue
+            for node in (edge.source, edge.dest):
+                if edge in node.edgeList:
+                    node.edgeList.remove(edge)
+            if edge.scene() is None:
+                continue
+            edge.setVisible(False)
+            edge.prepareGeometryChange()
+            edge.source = edge.dest = None
+            if len(self._edge_pool) < self.pool_size:
+                self._edge_pool.append(edge)
+            else:
+                widget.scene.removeItem(edge)
+
+
+def benchmark(side=300, pans=20):
+    """
+    Load time of a side x side grid graph in a virtualized widget, and time of every pan of the view.
+
+    Returns
+    -------
+    tuple
+        (load seconds, mean seconds per pan, materialized nodes, materialized edges)
+    """
+    import networkx as nx
+    from QNetworkxGraph import QNetworkxWidget
+
+    graph = nx.grid_2d_graph(side, side)
+    positions = dict((node, node) for node in graph.nodes())
+    widget = QNetworkxWidget()
+    widget.resize(800, 800)
+    widget.show()
+    virtual_scene = QVirtualGraphScene(widget)
+    start = time.time()
+    virtual_scene.set_graph(graph, positions)
+    load = time.time() - start
+    start = time.time()
+    for pan in range(pans):
+        widget.centerOn(pan * 200, pan * 120)
+        virtual_scene.update_visible()
+    pan_time = (time.time() - start) / pans
+    materialized = (len(virtual_scene._node_items), len(virtual_scene._edge_items))
+    virtual_scene.clear()
+    widget.close()
+    return (load, pan_time) + materialized
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    from QNetworkxGraph import QApplication
+
+    parser = argparse.ArgumentParser(description="Load and pan time of a virtualized grid graph")
+    parser.add_argument("--side", type=int, default=300)
+    parser.add_argument("--pans", type=int, default=20)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    load, pan_time, nodes, edges = benchmark(args.side, args.pans)
+    print "%d nodes: loaded in %.2fs, %.1fms per pan, %d nodes and %d edges materialized" % (
+        args.side * args.side, load, pan_time * 1000, nodes, edges)